@@ -587,7 +587,7 @@ async def chat(
             try:
                 session = await chat_service.session_repo.get(payload.session_id)
                 if session:
-                    metadata = dict(session.metadata or {})
+                    metadata = session.metadata or {}
                     is_registered = bool(metadata.get("is_registered", False))
                     safety_flags = list(metadata.get("safety_flags", []))
                     safety_flags.append(
@@ -598,9 +598,10 @@ async def chat(
                             "timestamp": flagged_at,
                         }
                     )
-                    metadata["safety_flags"] = safety_flags
-                    metadata["last_safety_flag_at"] = flagged_at
-                    await chat_service.session_repo.update_metadata(payload.session_id, metadata)
+                    await chat_service.session_repo.update_metadata_partial(
+                        payload.session_id,
+                        {"safety_flags": safety_flags, "last_safety_flag_at": flagged_at},
+                    )
             except Exception:
                 logger.warning(
                     "Failed to persist safety flag for session %s",
@@ -861,7 +862,7 @@ async def check_user_login(
                     session_metadata = session.metadata or {}
                     onboarding_state = session_metadata.get("onboarding", {})
                     is_complete = onboarding_state.get("complete", False)
-                    responses = onboarding_state.get("responses", {})
+                    responses = chat_service._profile_context(onboarding_state.get("responses", {}))
                     
                     # Check if conversation ended at medical_treatment (no recommendations generated)
                     medical_treatment_answered = responses.get("medical_treatment") is not None
@@ -1033,7 +1034,7 @@ async def check_user_login(
                                         normalized_products.append(product_obj)
                                         product_documents_by_title[product_obj.title] = product_doc
 
-                                    recommendation_message = await chat_service._format_product_recommendations(
+                                    recommendation_message, _ = await chat_service._format_product_recommendations(
                                         normalized_products,
                                         responses,
                                         product_documents_by_title,
@@ -1072,7 +1073,7 @@ async def check_user_login(
                                                 "productImage": product_image
                                             })
 
-                                        recommendation_message = await chat_service._format_product_recommendations(
+                                        recommendation_message, _ = await chat_service._format_product_recommendations(
                                             refreshed_products[:3],
                                             responses,
                                             refreshed_docs,
@@ -1107,6 +1108,23 @@ async def check_user_login(
                         )
                     else:
                         # No recommendation found in session
+                        if onboarding_state.get("recommendations_pending") or onboarding_state.get("recommendations_failed"):
+                            # Recommendations are still being generated in the background, or the last
+                            # attempt failed or was lost with a restart; a new run only starts when the
+                            # stored lease is stale or the last run failed
+                            await chat_service.schedule_recommendations(session.id, request.user_id, onboarding_state)
+                            login_data = {
+                                "isLogin": True,
+                                "showRecommendation": False,
+                                "recommendationsPending": True,
+                                "message": "Your personalized product recommendations are being prepared. Please check again in a moment.",
+                                "timestamp": datetime.now(timezone.utc).isoformat()
+                            }
+                            return UserLoginResponseCustom(
+                                success=True,
+                                message="Recommendations are being prepared",
+                                data=login_data
+                            )
                         if medical_treatment_answered:
                             # Conversation ended at medical_treatment, but recommendations should have been generated
                             # If not found, it might be an error or recommendations weren't generated
@@ -5,6 +5,13 @@ from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 
 from app.config.settings import settings
 
+# Fields ProductService.get_safety_warnings reads from a product document
+_SAFETY_FIELDS = {
+    "title": 1, "description": 1, "benefits": 1, "healthGoals": 1, "nutritionInfo": 1, "ingredients": 1,
+}
+# Case-insensitive equality (strength 2 ignores case but not accents)
+_CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
 
 class ProductRepository:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -99,6 +106,54 @@ class ProductRepository:
         
         return results
     
+    async def get_by_title_exact(self, title: str) -> dict[str, Any] | None:
+        """Fetch the active product whose title equals title (case-insensitive), safety fields only."""
+        if not title:
+            return None
+        filters: dict[str, Any] = {
+            "status": True,
+            "isDeleted": {"$ne": True},
+            "$or": [{"title.en": title}, {"title.nl": title}, {"title.de": title}, {"title": title}],
+        }
+        return await self.collection.find_one(filters, _SAFETY_FIELDS, collation=_CASE_INSENSITIVE)
+
+    async def get_by_titles(self, titles: list[str]) -> dict[str, dict[str, Any]]:
+        """
+        Fetch active products by exact title (case-insensitive) in one query, safety fields only.
+        Returns requested title -> document; titles without a match are left out.
+        """
+        requested: dict[str, list[str]] = {}
+        for title in titles:
+            if title:
+                requested.setdefault(title.lower(), []).append(title)
+        if not requested:
+            return {}
+        wanted = [title for group in requested.values() for title in group]
+        filters: dict[str, Any] = {
+            "status": True,
+            "isDeleted": {"$ne": True},
+            "$or": [
+                {"title.en": {"$in": wanted}},
+                {"title.nl": {"$in": wanted}},
+                {"title.de": {"$in": wanted}},
+                {"title": {"$in": wanted}},
+            ],
+        }
+        cursor = (
+            self.collection.find(filters, _SAFETY_FIELDS, collation=_CASE_INSENSITIVE)
+            .batch_size(len(wanted))
+        )
+        found: dict[str, dict[str, Any]] = {}
+        async for doc in cursor:
+            title_obj = doc.get("title")
+            names = title_obj.values() if isinstance(title_obj, dict) else (title_obj,)
+            for name in names:
+                if not isinstance(name, str):
+                    continue
+                for title in requested.get(name.lower(), ()):
+                    found.setdefault(title, doc)
+        return found
+
     async def get_products_by_titles(self, product_titles: list[str]) -> list[dict[str, Any]]:
         """Fetch products by their titles (case-insensitive partial match)."""
         if not product_titles:
@@ -13,6 +13,9 @@ from app.utils.error_handler import handle_database_errors
 
 logger = logging.getLogger(__name__)
 
+# Roles accepted by ChatMessage; stored messages with any other role are re-validated
+_MESSAGE_ROLES = frozenset(("user", "assistant", "system"))
+
 
 class SessionRepository:
     """
@@ -407,6 +410,85 @@ class SessionRepository:
             
             return None
 
+    @handle_database_errors
+    async def commit_turn(
+        self,
+        session_id: str,
+        messages: list[ChatMessage] | None = None,
+        metadata: dict | None = None,
+        user_id: str | None = None,
+        metadata_patch: dict | None = None,
+    ) -> Session | None:
+        """
+        Append messages and update metadata for a session in a single write.
+        metadata replaces the whole metadata dict; metadata_patch only sets the
+        given top-level keys. Any part may be omitted. Uses the nested format
+        when user_id is known (or can be found), otherwise the legacy format.
+        """
+        now = datetime.now(timezone.utc)
+        serialized = []
+        for msg in messages or []:
+            msg_dict = msg.model_dump()
+            if "created_at" not in msg_dict:
+                msg_dict["created_at"] = now
+            serialized.append(msg_dict)
+        
+        # If user_id not provided, try to find it by searching for the session
+        if not user_id:
+            user_doc = await self.collection.find_one(
+                {"sessions.session_id": session_id},
+                {"_id": 1}
+            )
+            if user_doc:
+                user_id = str(user_doc["_id"])
+        
+        if user_id:
+            # New format: push messages and set metadata within nested session
+            user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
+            update: dict = {
+                "$set": {
+                    "sessions.$.updated_at": now,
+                    "updated_at": now,
+                }
+            }
+            if metadata is not None:
+                update["$set"]["sessions.$.metadata"] = metadata
+            for key, value in (metadata_patch or {}).items():
+                update["$set"][f"sessions.$.metadata.{key}"] = value
+            if serialized:
+                update["$push"] = {"sessions.$.messages": {"$each": serialized}}
+            
+            updated = await self.collection.find_one_and_update(
+                {"_id": user_oid, "sessions.session_id": session_id},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if not updated:
+                return None
+            
+            for session in updated.get("sessions", []):
+                if session.get("session_id") == session_id:
+                    return self._nested_session_to_session(session, session_id)
+            return None
+        
+        # Legacy format: direct update
+        update = {"$set": {"updated_at": now}}
+        if metadata is not None:
+            update["$set"]["metadata"] = metadata
+        for key, value in (metadata_patch or {}).items():
+            update["$set"][f"metadata.{key}"] = value
+        if serialized:
+            update["$push"] = {"messages": {"$each": serialized}}
+        updated = await self.collection.find_one_and_update(
+            {"_id": session_id},
+            update,
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated:
+            return self._document_to_session(updated)
+        return None
+
     async def update_metadata(self, session_id: str, metadata: dict, user_id: str | None = None) -> Session | None:
         """
         Update session metadata.
@@ -487,15 +569,75 @@ class SessionRepository:
             
             return None
 
+    @handle_database_errors
+    async def update_metadata_partial(self, session_id: str, patch: dict, user_id: str | None = None) -> Session | None:
+        """
+        Set only the given top-level metadata keys (e.g. {"onboarding": {...}})
+        instead of rewriting the whole metadata dict.
+        """
+        return await self.commit_turn(session_id=session_id, user_id=user_id, metadata_patch=patch)
+
+    @handle_database_errors
+    async def claim_recommendations(
+        self, session_id: str, stale_before: datetime, user_id: str | None = None
+    ) -> bool:
+        """
+        Atomically take the lease for generating a session's recommendations.
+        Succeeds when no run has started, the last one started before stale_before,
+        or the last one failed; sets onboarding.recommendations_started_at to now.
+        """
+        now = datetime.now(timezone.utc)
+        claimable = [
+            {"metadata.onboarding.recommendations_started_at": None},
+            {"metadata.onboarding.recommendations_started_at": {"$lt": stale_before}},
+            {"metadata.onboarding.recommendations_failed": True},
+        ]
+        claim = {
+            "metadata.onboarding.recommendations_started_at": now,
+            "metadata.onboarding.recommendations_failed": False,
+        }
+
+        if not user_id:
+            user_doc = await self.collection.find_one({"sessions.session_id": session_id}, {"_id": 1})
+            if user_doc:
+                user_id = str(user_doc["_id"])
+
+        if user_id:
+            # New format: the $elemMatch makes "$" point at the claimable session
+            user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
+            result = await self.collection.update_one(
+                {"_id": user_oid, "sessions": {"$elemMatch": {"session_id": session_id, "$or": claimable}}},
+                {"$set": {f"sessions.$.{key}": value for key, value in claim.items()}},
+            )
+            return result.modified_count == 1
+
+        result = await self.collection.update_one({"_id": session_id, "$or": claimable}, {"$set": claim})
+        return result.modified_count == 1
+
+    @staticmethod
+    def _message_from_document(msg: dict, session_created_at: datetime | None) -> ChatMessage:
+        """Build a ChatMessage from a stored message, validating only when needed."""
+        if "created_at" not in msg:
+            # Backfilled from the session, which may itself lack a timestamp, so validate
+            msg["created_at"] = session_created_at
+            return ChatMessage(**msg)
+        content = msg.get("content")
+        if (
+            msg.get("role", "user") in _MESSAGE_ROLES
+            and isinstance(msg["created_at"], datetime)
+            and (content is None or isinstance(content, str))
+        ):
+            # Stored messages were validated when they were written; skip re-validating
+            # the whole history on every load
+            return ChatMessage.model_construct(**msg)
+        return ChatMessage(**msg)
+
     @staticmethod
     def _document_to_session(doc: dict) -> Session:
         """Convert legacy document format to Session model."""
         messages = []
         for msg in doc.get("messages", []):
-            # Ensure created_at exists
-            if "created_at" not in msg:
-                msg["created_at"] = doc.get("created_at")
-            messages.append(ChatMessage(**msg))
+            messages.append(SessionRepository._message_from_document(msg, doc.get("created_at")))
         
         return Session(
             id=doc["_id"],
@@ -611,10 +753,7 @@ class SessionRepository:
         """Convert nested session document to Session model."""
         messages = []
         for msg in session_doc.get("messages", []):
-            # Ensure created_at exists
-            if "created_at" not in msg:
-                msg["created_at"] = session_doc.get("created_at")
-            messages.append(ChatMessage(**msg))
+            messages.append(SessionRepository._message_from_document(msg, session_doc.get("created_at")))
         session_id_value = session_doc.get("session_id", session_id)
         if isinstance(session_id_value, ObjectId):
             session_id_value = str(session_id_value)
@@ -649,8 +788,6 @@ class SessionRepository:
             - role: The role of the message (user/assistant)
             - content: The message content containing the word
         """
-        from bson import ObjectId
-        
         user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
         
         # Get user document
@@ -742,6 +879,42 @@ class SessionRepository:
         
         return results
 
+    @handle_database_errors
+    async def get_previous_session_summary(self, user_id: str, exclude_session_id: str) -> dict:
+        """
+        Get the onboarding summary of the user's most recent completed session
+        (other than exclude_session_id) that has concerns recorded.
+        Only session ids and metadata are fetched; messages are not loaded.
+        Returns dict with concerns (raw), products and recommendation_text, or {}.
+        """
+        user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        user_doc = await self.collection.find_one(
+            {"_id": user_oid},
+            {"sessions.session_id": 1, "sessions.metadata": 1},
+        )
+        if not user_doc:
+            return {}
+        
+        exclude_id = self._session_id_to_str(exclude_session_id)
+        # Most recent session first
+        for session in reversed(user_doc.get("sessions", [])):
+            if session.get("session_id") is not None and self._session_id_to_str(session.get("session_id")) == exclude_id:
+                continue
+            metadata = session.get("metadata") or {}
+            onboarding = metadata.get("onboarding") or {}
+            responses = onboarding.get("responses") or {}
+            if not onboarding.get("complete") or not responses.get("concern"):
+                continue
+            # Product titles and text are stored at recommendation time;
+            # older sessions only carry the onboarding title list
+            products = metadata.get("last_products") or onboarding.get("recommended_product_titles") or []
+            return {
+                "concerns": responses.get("concern"),
+                "products": list(products)[:3],
+                "recommendation_text": metadata.get("last_recommendation_text", ""),
+            }
+        return {}
+
     @handle_database_errors
     async def get_sessions_for_user(self, user_id: str) -> list[dict] | None:
         """
@@ -782,6 +955,18 @@ class SessionRepository:
         normalized.sort(key=lambda s: parse_created_at(s.get("created_at")), reverse=True)
         return normalized
 
+    @staticmethod
+    def _token_usage_log_extra(session_id: str, user_id: str | None, usage: dict) -> dict:
+        """Structured fields for token usage log records, for aggregation without parsing messages."""
+        return {
+            "session_id": str(session_id),
+            "user_id": user_id,
+            "tokens_in": usage.get("input_tokens"),
+            "tokens_out": usage.get("output_tokens"),
+            "cost": usage.get("cost"),
+            "api_calls": usage.get("api_calls"),
+        }
+
     @handle_database_errors
     async def update_token_usage(
         self, session_id: str, usage_info: dict, user_id: str | None = None
@@ -795,8 +980,6 @@ class SessionRepository:
             usage_info: Dict with keys: input_tokens, output_tokens, total_tokens, cost, model
             user_id: Optional user ID for nested format
         """
-        from datetime import datetime, timezone
-        
         now = datetime.now(timezone.utc)
         session_id_variants = self._session_id_variants(session_id)
         session_id_str = self._session_id_to_str(session_id)
@@ -806,7 +989,9 @@ class SessionRepository:
             try:
                 user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
                 
-                logger.debug(f"Attempting to update token usage in nested format: user_id={user_id}, session_id={session_id}")
+                logger.debug(
+                    "Attempting to update token usage in nested format: user_id=%s, session_id=%s", user_id, session_id
+                )
                 
                 # Get current session to retrieve existing token usage
                 user_doc = await self.collection.find_one(
@@ -827,9 +1012,11 @@ class SessionRepository:
                     })
                     
                     logger.debug(
-                        f"Current token usage: {current_usage}, "
-                        f"New usage: input={usage_info.get('input_tokens')}, "
-                        f"output={usage_info.get('output_tokens')}, cost=${usage_info.get('cost', 0):.6f}"
+                        "Current token usage: %s, New usage: input=%s, output=%s, cost=$%.6f",
+                        current_usage,
+                        usage_info.get("input_tokens"),
+                        usage_info.get("output_tokens"),
+                        usage_info.get("cost", 0),
                     )
                     
                     # Accumulate token usage
@@ -843,16 +1030,15 @@ class SessionRepository:
                         "last_updated": now.isoformat()
                     }
                     
-                    logger.debug(f"Updated token usage will be: {updated_usage}")
-                    
-                    # Update metadata with accumulated token usage
-                    updated_metadata = {**current_metadata, "token_usage": updated_usage}
+                    logger.debug("Updated token usage will be: %s", updated_usage)
                     
+                    # Only the token_usage sub-document changes; setting it by path keeps
+                    # the write small and leaves concurrently written metadata intact.
                     updated = await self.collection.find_one_and_update(
                         {"_id": user_oid, "sessions.session_id": {"$in": session_id_variants}},
                         {
                             "$set": {
-                                "sessions.$.metadata": updated_metadata,
+                                "sessions.$.metadata.token_usage": updated_usage,
                                 "sessions.$.updated_at": now,
                                 "updated_at": now
                             }
@@ -864,38 +1050,53 @@ class SessionRepository:
                         for session in updated.get("sessions", []):
                             if self._session_id_to_str(session.get("session_id")) == session_id_str:
                                 logger.info(
-                                    f"✅ Token usage updated successfully for session {session_id} with user_id {user_id}: "
-                                    f"input={updated_usage['input_tokens']}, output={updated_usage['output_tokens']}, "
-                                    f"cost=${updated_usage['cost']:.6f}, api_calls={updated_usage['api_calls']}"
+                                    "✅ Token usage updated successfully for session %s with user_id %s: "
+                                    "input=%s, output=%s, cost=$%.6f, api_calls=%s",
+                                    session_id,
+                                    user_id,
+                                    updated_usage["input_tokens"],
+                                    updated_usage["output_tokens"],
+                                    updated_usage["cost"],
+                                    updated_usage["api_calls"],
+                                    extra=self._token_usage_log_extra(session_id, user_id, updated_usage),
                                 )
                                 return self._nested_session_to_session(session, session_id)
-                        logger.warning(f"find_one_and_update returned None for session {session_id} with user_id {user_id}")
+                        logger.warning("find_one_and_update returned None for session %s with user_id %s", session_id, user_id)
                     else:
-                        logger.warning(f"find_one_and_update returned None for session {session_id} with user_id {user_id}")
+                        logger.warning("find_one_and_update returned None for session %s with user_id %s", session_id, user_id)
                 else:
                     logger.warning(
-                        f"Session {session_id} not found in nested format for user_id {user_id}. "
-                        f"user_doc exists: {user_doc is not None}, sessions found: {user_doc.get('sessions') if user_doc else None}"
+                        "Session %s not found in nested format for user_id %s. user_doc exists: %s, sessions found: %s",
+                        session_id,
+                        user_id,
+                        user_doc is not None,
+                        user_doc.get("sessions") if user_doc else None,
                     )
             except Exception as e:
-                logger.error(f"Exception updating token usage in nested format for session {session_id} with user_id {user_id}: {e}", exc_info=True)
+                logger.error(
+                    "Exception updating token usage in nested format for session %s with user_id %s: %s",
+                    session_id,
+                    user_id,
+                    e,
+                    exc_info=True,
+                )
                 # Fall through to try legacy format or search
         
         # Try to find session in nested format by searching (if user_id wasn't provided or nested update failed)
         if not user_id:
-            logger.debug(f"user_id not provided, searching for session {session_id} in nested format")
+            logger.debug("user_id not provided, searching for session %s in nested format", session_id)
             user_doc = await self.collection.find_one(
                 {"sessions.session_id": {"$in": session_id_variants}},
                 {"_id": 1, "sessions.$": 1}
             )
             if user_doc and user_doc.get("sessions"):
                 user_id = str(user_doc["_id"])
-                logger.info(f"Found session {session_id} in nested format for user_id {user_id}, retrying update")
+                logger.info("Found session %s in nested format for user_id %s, retrying update", session_id, user_id)
                 # Retry with found user_id
                 return await self.update_token_usage(session_id, usage_info, user_id)
         
         # Try legacy format: update in flat document
-        logger.debug(f"Attempting to update token usage in legacy format for session {session_id}")
+        logger.debug("Attempting to update token usage in legacy format for session %s", session_id)
         try:
             session_doc = await self.collection.find_one({"_id": {"$in": session_id_variants}})
             if session_doc:
@@ -920,14 +1121,11 @@ class SessionRepository:
                     "last_updated": now.isoformat()
                 }
                 
-                # Update metadata with accumulated token usage
-                updated_metadata = {**current_metadata, "token_usage": updated_usage}
-                
                 updated = await self.collection.find_one_and_update(
                     {"_id": {"$in": session_id_variants}},
                     {
                         "$set": {
-                            "metadata": updated_metadata,
+                            "metadata.token_usage": updated_usage,
                             "updated_at": now
                         }
                     },
@@ -936,21 +1134,29 @@ class SessionRepository:
                 
                 if updated:
                     logger.info(
-                        f"✅ Token usage updated successfully for legacy session {session_id}: "
-                        f"input={updated_usage['input_tokens']}, output={updated_usage['output_tokens']}, "
-                        f"cost=${updated_usage['cost']:.6f}, api_calls={updated_usage['api_calls']}"
+                        "✅ Token usage updated successfully for legacy session %s: "
+                        "input=%s, output=%s, cost=$%.6f, api_calls=%s",
+                        session_id,
+                        updated_usage["input_tokens"],
+                        updated_usage["output_tokens"],
+                        updated_usage["cost"],
+                        updated_usage["api_calls"],
+                        extra=self._token_usage_log_extra(session_id, None, updated_usage),
                     )
                     return self._document_to_session(updated)
                 else:
-                    logger.warning(f"find_one_and_update returned None for legacy session {session_id}")
+                    logger.warning("find_one_and_update returned None for legacy session %s", session_id)
             else:
-                logger.warning(f"Legacy session document not found for session_id {session_id}")
+                logger.warning("Legacy session document not found for session_id %s", session_id)
         except Exception as e:
-            logger.error(f"Exception updating token usage in legacy format for session {session_id}: {e}", exc_info=True)
+            logger.error(
+                "Exception updating token usage in legacy format for session %s: %s", session_id, e, exc_info=True
+            )
         
         logger.error(
-            f"❌ Failed to update token usage: session {session_id} not found in any format. "
-            f"user_id was: {user_id}"
+            "❌ Failed to update token usage: session %s not found in any format. user_id was: %s",
+            session_id,
+            user_id,
         )
         return None
 
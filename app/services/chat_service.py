@@ -1,10 +1,20 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import re
-from typing import Any
+from collections import ChainMap
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
+from zlib import crc32
 
 import logging
 
+from bson import ObjectId
+
 from app.config.settings import settings
 from app.exceptions.errors import SessionNotFoundError
 from app.repositories.session_repository import SessionRepository
@@ -14,11 +24,793 @@ from app.schemas.session import Session
 from app.services.product_service import ProductService
 from app.services.openai_service import OpenAIChatService
 from app.utils.error_handler import log_error_with_context
+from app.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Accepted yes/no replies (matched against stripped, lowercased text)
+_YES_RE = re.compile(r"(?:ok(?:ay)?|y(?:es|ep|eah)?|sure|alright)")
+_NO_RE = re.compile(r"(?:no(?:pe)?|nah|n)")
+
+# Constant assistant replies. ChatMessage carries its own created_at, so only the
+# text is shared; a fresh message is built for each turn.
+_END_MESSAGE = (
+    "Thank you for completing the quiz! Your personalized recommendations have been provided above. "
+    "If you have any questions, please feel free to reach out to our support team. Have a great day! 😊"
+)
+_REGISTRATION_REDIRECT_MESSAGE = (
+    "Perfect! I'll redirect you to create a separate registration. "
+    "This will give your family member the best personalized experience! 🎯"
+)
+_PREV_CONCERN_TEMPLATE = (
+    "I notice you're still experiencing {concerns} concerns. "
+    "Having taken the previous recommended products{products}, has the issue been resolved? "
+    "Please answer yes or no."
+)
+_PREV_CONCERN_CHANGED_TEMPLATE = (
+    "I see you previously had concerns about {concerns}. "
+    "Have those issues been resolved? Please answer yes or no."
+)
+_REGISTRATION_CONFIRM_ERROR = "Please choose 'Yes' to redirect to registration or 'No' to continue here."
+_PREVIOUS_CONCERN_ERROR = "Please answer 'yes' or 'no'. Has the previous issue been resolved?"
+
+
+# Bits for the rarely-set onboarding flags, so the start of a turn can test them
+# with one integer check instead of a chain of dict lookups
+_FLAG_AWAITING_REGISTRATION = 1 << 0
+_FLAG_AWAITING_PREVIOUS_CONCERN = 1 << 1
+_FLAG_AWAITING_LOGIN_CHECK = 1 << 2
+_FLAG_COMPLETE = 1 << 3
+_FLAG_RECOMMENDATIONS_SHOWN = 1 << 4
+_FLAG_FOLLOWUP_CHECKED = 1 << 5
+_FLAG_COMPLETE_SHOWN = _FLAG_COMPLETE | _FLAG_RECOMMENDATIONS_SHOWN
+_ONBOARDING_FLAG_BITS = (
+    ("awaiting_registration_confirmation", _FLAG_AWAITING_REGISTRATION),
+    ("awaiting_previous_concern_response", _FLAG_AWAITING_PREVIOUS_CONCERN),
+    ("awaiting_login_check", _FLAG_AWAITING_LOGIN_CHECK),
+    ("complete", _FLAG_COMPLETE),
+    ("recommendations_shown", _FLAG_RECOMMENDATIONS_SHOWN),
+    ("previous_concern_followup_checked", _FLAG_FOLLOWUP_CHECKED),
+)
+
+# Previous-session lookups keyed by (user_id, current_session_id). Earlier sessions
+# are complete, so their concerns/products don't change while the current one runs.
+_PREVIOUS_SESSION_CACHE = TTLCache(ttl_seconds=300.0, max_entries=1024)
+
+# Free-form LLM replies keyed by (user or session, normalized message, context hash,
+# history hash). Rephrasings that only differ in case, punctuation or spacing share
+# an entry, and any change to the profile context (e.g. new onboarding answers) or to
+# the conversation the model sees changes the key, so "yes" or "tell me more" only
+# reuse a reply given after the same preceding turns.
+_REPLY_CACHE = TTLCache(ttl_seconds=600.0, max_entries=2048)
+_REPLY_KEY_PUNCT_RE = re.compile(r"[^\w\s]+")
+
+
+def _reply_cache_key(
+    scope: str, message: str, context: Mapping[str, Any], history: list[ChatMessage]
+) -> tuple[str, str, int, int]:
+    normalized = " ".join(_REPLY_KEY_PUNCT_RE.sub(" ", message.casefold()).split())
+    history_hash = hash(tuple((turn.role, turn.content) for turn in history))
+    return (str(scope), normalized, hash(repr(sorted(context.items()))), history_hash)
+
+
+
+# Formatted recommendation messages keyed by (profile context hash, product titles,
+# previous-concern state). Re-completing onboarding with the same answers yields the
+# same products, so the formatter's LLM call can be skipped.
+_RECOMMENDATION_CACHE = TTLCache(ttl_seconds=3600.0, max_entries=2000)
+
+
+# Searchable explanation text keyed by (product id, whether the Mongo document was
+# merged in). The same products are explained turn after turn; catalog edits are
+# picked up once an entry expires.
+_PRODUCT_TEXT_CACHE = TTLCache(ttl_seconds=3600.0, max_entries=512)
+
+
+# Second-person phrasing rewritten for family-member prompts. The patterns are
+# case-insensitive, so "Do you" and "do you" are both handled by one pattern.
+# One pass handles "do/are/have you", "your" and "you", so text that was just
+# substituted in (e.g. "your mother") is not rewritten a second time.
+_SECOND_PERSON_RE = re.compile(r"\b(?:(do|are|have) you|you(r)?)\b", re.IGNORECASE)
+_AUX_FOR_PERSON = MappingProxyType({"do": "Does", "are": "Is", "have": "Has"})
+# Verbs that take the third-person form once "you" has been replaced by a name
+_THIRD_PERSON_VERBS = MappingProxyType({
+    "eat": "eats",
+    "drink": "drinks",
+    "consume": "consumes",
+    "sit": "sits",
+    "smoke": "smokes",
+    "want": "wants",
+    "are": "is",
+    "have": "has",
+})
+
+
+@lru_cache(maxsize=256)
+def _person_verb_re(person: str) -> re.Pattern:
+    """Verb-agreement pattern for one person label ("have been" is left alone)."""
+    return re.compile(
+        rf"\b{re.escape(person)} (eat|drink|consume|sit|smoke|want|are|have(?!\s+been))\b",
+        re.IGNORECASE,
+    )
+
+
+# Pronoun implied by a family relation, when no gender was given
+_RELATION_PRONOUNS = MappingProxyType({
+    **dict.fromkeys(("son", "brother", "father", "dad", "husband", "boyfriend"), "he"),
+    **dict.fromkeys(("daughter", "sister", "mother", "mom", "wife", "girlfriend"), "she"),
+})
+# pronoun -> (object form, possessive form)
+_PRONOUN_FORMS = MappingProxyType({"he": ("him", "his"), "she": ("her", "her"), "they": ("them", "their")})
+
+
+@lru_cache(maxsize=256)
+def _family_refs(family_name: str | None, relation: str | None) -> tuple[str, str, str]:
+    """(reference, possessive, pronoun) for a family member in concern follow-up prompts."""
+    if family_name:
+        return family_name, f"{family_name}'s", "they"
+    if relation:
+        return f"your {relation}", f"your {relation}'s", _RELATION_PRONOUNS.get(relation.lower(), "they")
+    return "your family member", "your family member's", "they"
+
+
+# Concern follow-up prompts rewritten for a family member, applied in order. Like
+# the patterns above they are case-insensitive, so "When you" covers "when you".
+# {ref} is the reference ("Emma", "your son").
+_CONCERN_PROMPT_REWRITES = (
+    (re.compile(r"\bDo you\b", re.IGNORECASE), "Does {ref}"),
+    (re.compile(r"\bWhen you wake\b", re.IGNORECASE), "When {ref} wakes"),
+    (re.compile(r"\bWhen you\b", re.IGNORECASE), "When {ref}"),
+    (re.compile(r"\bHow would you\b", re.IGNORECASE), "How would {ref}"),
+    (re.compile(r"\bAre you\b", re.IGNORECASE), "Is {ref}"),
+    (re.compile(r"\bWhat would you\b", re.IGNORECASE), "What would {ref}"),
+)
+# "your skin" -> "Emma's skin" for the things the follow-up questions ask about,
+# all handled by one alternation
+_CONCERN_PROMPT_ATTRIBUTES = (
+    "skin", "hair", "nails", "bowel", "energy", "resistance", "libido", "cycle", "period", "mood",
+    "focus", "memory", "days", "life", "periods", "training", "exercise", "stomach", "digestion",
+)
+_CONCERN_ATTRIBUTE_RE = re.compile(rf"\byour ({'|'.join(_CONCERN_PROMPT_ATTRIBUTES)})\b", re.IGNORECASE)
+# Remaining "you <verb>"; "feel" takes the pronoun, the rest the reference
+_CONCERN_YOU_VERB_RE = re.compile(r"\byou (feel|usually|notice|experience|sleep|want)\b", re.IGNORECASE)
+_CONCERN_YOU_VERB_TEMPLATES = MappingProxyType({
+    "feel": "{pro} feel",
+    "usually": "{ref} usually",
+    "notice": "{ref} notice",
+    "experience": "{ref} experience",
+    "sleep": "{ref} sleeps",
+    "want": "{ref} wants",
+})
+
+
+@lru_cache(maxsize=512)
+def _family_concern_prompt(prompt: str, reference: str, possessive_ref: str, pronoun: str) -> str:
+    """A concern follow-up prompt addressed to a family member instead of "you"."""
+    lowered = prompt.lower()
+    # Every rewrite starts from "you"; most prompts only hit a few of them
+    if "you" not in lowered:
+        return prompt
+    for pattern, template in _CONCERN_PROMPT_REWRITES:
+        replacement = template.format(ref=reference)
+        prompt = pattern.sub(lambda _match: replacement, prompt)
+    if "your " in lowered:
+        prompt = _CONCERN_ATTRIBUTE_RE.sub(lambda match: f"{possessive_ref} {match.group(1).lower()}", prompt)
+    return _CONCERN_YOU_VERB_RE.sub(
+        lambda match: _CONCERN_YOU_VERB_TEMPLATES[match.group(1).lower()].format(ref=reference, pro=pronoun),
+        prompt,
+    )
+
+
+# Lifestyle questions; their prompts come straight from PROMPTS
+_LIFESTYLE_FIELDS = frozenset({
+    "lifestyle_status", "medical_conditions", "medical_conditions_details", "fruit_intake",
+    "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake",
+    "eating_habits", "meat_intake", "fish_intake", "drinks_alcohol",
+    "alcohol_daily", "alcohol_weekly", "coffee_intake", "smokes",
+    "allergies", "allergies_other_details", "dietary_preferences",
+    "sunlight_exposure", "iron_advised", "ayurveda_view", "new_product_attitude",
+    "new_product_request", "new_product_request_details", "medical_treatment",
+    "medical_treatment_details", "pre_recommendation_notes",
+})
+
+# Answer vocabularies used by _validate_response
+_FOR_WHOM_ALLOWED = MappingProxyType({
+    "me": "self",
+    "myself": "self",
+    "self": "self",
+    "for me": "self",
+    "no": "self",
+    "family": "family",
+    "family member": "family",
+    "for family": "family",
+    "for my family": "family",
+    "friend": "family",
+    "partner": "family",
+    "spouse": "family",
+    "yes": "family",
+})
+_KNOWLEDGE_ALLOWED = MappingProxyType({
+    "well informed": "well informed",
+    "well-informed": "well informed",
+    "informed": "well informed",
+    "curious": "curious",
+    "skeptical": "skeptical",
+    "sceptical": "skeptical",
+})
+_VITAMIN_COUNT_ALLOWED = MappingProxyType({
+    "no": "0",
+    "none": "0",
+    "0": "0",
+    "1": "1 to 3",
+    "2": "1 to 3",
+    "3": "1 to 3",
+    "1 to 3": "1 to 3",
+    "1-3": "1 to 3",
+    "4": "4+",
+    "4+": "4+",
+    "5": "4+",
+    "5+": "4+",
+    "many": "4+",
+})
+_GENDER_ALLOWED = MappingProxyType({
+    "male": "male",
+    "man": "male",
+    "m": "male",
+    "woman": "female",
+    "women": "female",
+    "female": "female",
+    "f": "female",
+    "gender neutral": "gender neutral",
+    "neutral": "gender neutral",
+    "non-binary": "gender neutral",
+    "nonbinary": "gender neutral",
+})
+# Stored "situation" answers that mean the person is pregnant right now
+_PREGNANT_SITUATIONS = frozenset({"pregnant", "i am pregnant now"})
+_SITUATION_ALLOWED = MappingProxyType({
+    "to get pregnant in the next 2 years": "planning (2 years)",
+    "planning": "planning (2 years)",
+    "next 2 years": "planning (2 years)",
+    "i am pregnant now": "pregnant",
+    "pregnant": "pregnant",
+    "breastfeeding": "breastfeeding",
+})
+_LIFESTYLE_STATUS_ALLOWED = MappingProxyType({
+    "been doing well for a long time": "been doing well for a long time",
+    "doing well": "been doing well for a long time",
+    "nice on the way": "nice on the way",
+    "on the way": "nice on the way",
+    "ready to start": "ready to start",
+    "starting": "ready to start",
+})
+_INTAKE_ALLOWED = MappingProxyType({
+    "hardly": "hardly",
+    "rarely": "hardly",
+    "seldom": "hardly",
+    "one time": "one time",
+    "once": "one time",
+    "1": "one time",
+    "twice or more": "twice or more",
+    "twice": "twice or more",
+    "2": "twice or more",
+    "more": "twice or more",
+    "multiple": "twice or more",
+})
+_EATING_HABITS_ALLOWED = MappingProxyType({
+    "no preference": "no preference",
+    "none": "no preference",
+    "flexitarian": "flexitarian",
+    "vegetarian": "vegetarian",
+    "veg": "vegetarian",
+    "vegan": "vegan",
+})
+_MEAT_FISH_ALLOWED = MappingProxyType({
+    "never": "never",
+    "no": "never",
+    "once or twice": "once or twice",
+    "once": "once or twice",
+    "twice": "once or twice",
+    "1-2": "once or twice",
+    "three times or more": "three times or more",
+    "three": "three times or more",
+    "3": "three times or more",
+    "more": "three times or more",
+})
+_ALLERGIES_ALLOWED = MappingProxyType({
+    "no": "no",
+    "none": "no",
+    "milk": "milk",
+    "egg": "egg",
+    "eggs": "egg",
+    "fish": "fish",
+    "shellfish and crustaceans": "shellfish and crustaceans",
+    "shellfish": "shellfish and crustaceans",
+    "crustaceans": "shellfish and crustaceans",
+    "peanut": "peanut",
+    "peanuts": "peanut",
+    "nuts": "nuts",
+    "soy": "soy",
+    "gluten": "gluten",
+    "wheat": "wheat",
+    "pollen": "pollen",
+    "others": "others",
+    "other": "others",
+})
+_DIETARY_PREFERENCES_ALLOWED = MappingProxyType({
+    "no preference": "no preference",
+    "none": "no preference",
+    "lactose-free": "lactose-free",
+    "lactose free": "lactose-free",
+    "gluten free": "gluten free",
+    "gluten-free": "gluten free",
+    "paleo": "paleo",
+})
+_AYURVEDA_VIEW_ALLOWED = MappingProxyType({
+    "i am convinced": "i am convinced",
+    "convinced": "i am convinced",
+    "we can learn a lot from ancient medicine": "we can learn a lot from ancient medicine",
+    "learn from ancient medicine": "we can learn a lot from ancient medicine",
+    "ancient medicine": "we can learn a lot from ancient medicine",
+    "i am open to it": "i am open to it",
+    "open to it": "i am open to it",
+    "open": "i am open to it",
+    "more information needed for an opinion": "more information needed for an opinion",
+    "need more information": "more information needed for an opinion",
+    "i am skeptical": "i am skeptical",
+    "skeptical": "i am skeptical",
+    "alternative medicine is nonsense": "alternative medicine is nonsense",
+    "nonsense": "alternative medicine is nonsense",
+})
+_NEW_PRODUCT_ATTITUDE_ALLOWED = MappingProxyType({
+    "to be the first": "to be the first",
+    "first": "to be the first",
+    "you are at the forefront of new products": "you are at the forefront of new products",
+    "forefront": "you are at the forefront of new products",
+    "learn more": "learn more",
+    "you are cautiously optimistic": "you are cautiously optimistic",
+    "cautiously optimistic": "you are cautiously optimistic",
+    "waiting for now": "waiting for now",
+    "waiting": "waiting for now",
+    "scientific research takes time": "scientific research takes time",
+    "research takes time": "scientific research takes time",
+})
+_PROTEIN_YES = frozenset({"yes", "y", "yeah", "yep", "sure", "taking", "i do"})
+_STRICT_YES = frozenset({"yes", "y", "yeah", "yep"})
+_STRICT_NO = frozenset({"no", "n", "nope", "nah"})
+_VALIDATOR_YES = frozenset({"yes", "y", "yeah", "yep", "sure"})
+_VALIDATOR_NO = frozenset({"no", "n", "nope", "nah", "not"})
+# Exact answers the empathetic acknowledgments treat as yes / no
+_ACK_YES = frozenset({"yes", "yep", "yeah"})
+_ACK_NO = frozenset({"no", "nope", "nah"})
+_ACK_NO_OR_NONE = _ACK_NO | {"none"}
+# Answers that branch the onboarding step list
+_FEMALE_BRANCH_GENDERS = frozenset({"woman", "female", "gender neutral"})
+_SELF_VALUES = frozenset({"me", "self"})
+_VITAMIN_TAKER_COUNTS = frozenset({"1 to 3", "4+"})
+_VEGETARIAN_HABITS = frozenset({"vegetarian", "vegan"})
+_INTAKE_FIELD_ORDER = ("fruit_intake", "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake")
+_INTAKE_FIELDS = frozenset(_INTAKE_FIELD_ORDER)
+_INTAKE_FIELD_INDEX = MappingProxyType({name: index for index, name in enumerate(_INTAKE_FIELD_ORDER)})
+_MEAT_FISH_FIELDS = frozenset({"meat_intake", "fish_intake"})
+# Questions answered with the shared Yes / No buttons
+_YES_NO_FIELDS = frozenset({
+    "protein", "conceive", "children", "drinks_alcohol", "alcohol_daily",
+    "alcohol_weekly", "coffee_intake", "smokes", "sunlight_exposure",
+    "iron_advised", "medical_treatment", "previous_concern_followup",
+    "new_product_request", "medical_conditions",
+})
+_YES_NO_VALIDATED_FIELDS = frozenset({
+    "drinks_alcohol", "alcohol_daily", "alcohol_weekly", "coffee_intake", "smokes", "sunlight_exposure",
+    "iron_advised", "medical_treatment", "previous_concern_followup", "new_product_request", "medical_conditions",
+})
+_DETAIL_FIELDS = frozenset({
+    "medical_conditions_details", "allergies_other_details", "medical_treatment_details", "pre_recommendation_notes",
+})
+
+def _options_entry(*labels: str) -> tuple[tuple[QuestionOption, ...], str]:
+    """Option buttons whose submitted value is the lowercased label."""
+    return tuple(QuestionOption(value=label.lower(), label=label) for label in labels), "options"
+
+
+# Options are never mutated after construction, so one pair is shared by every
+# response; ChatResponse accepts the tuple for its options list
+_YES_NO_OPTIONS = (QuestionOption(value="yes", label="Yes"), QuestionOption(value="no", label="No"))
+_YES_NO_ENTRY = (_YES_NO_OPTIONS, "yes_no")
+# Answer buttons per question field (concern follow-ups keyed "concern|<concern>|<question id>")
+_OPTIONS_TABLE: Mapping[str, tuple[tuple[QuestionOption, ...], str]] = MappingProxyType({
+    **dict.fromkeys(_YES_NO_FIELDS, _YES_NO_ENTRY),
+    "for_whom": _options_entry("Me", "Family"),
+    "gender": _options_entry("Male", "Woman", "Gender Neutral"),
+    "knowledge": _options_entry("Well informed", "Curious", "Skeptical"),
+    "vitamin_count": _options_entry("No", "1 to 3", "4+"),
+    "situation": _options_entry("To get pregnant in the next 2 years", "I am pregnant now", "Breastfeeding"),
+    "concern": (
+        tuple(QuestionOption(value=value, label=label) for value, label in (
+            ("sleep", "Sleep"),
+            ("stress", "Stress"),
+            ("energy", "Energy"),
+            ("stomach_intestines", "Stomach & Intestines"),
+            ("skin", "Skin"),
+            ("resistance", "Resistance"),
+            ("weight", "Weight"),
+            ("hormones", "Hormones"),
+            ("libido", "Libido"),
+            ("brain", "Brain"),
+            ("hair_nails", "Hair & Nails"),
+            ("fitness", "Fitness"),
+        )),
+        "options",
+    ),
+    "lifestyle_status": _options_entry("Been doing well for a long time", "Nice on the way", "Ready to start"),
+    **dict.fromkeys(_INTAKE_FIELD_ORDER, _options_entry("Hardly", "One time", "Twice or more")),
+    "eating_habits": _options_entry("No preference", "Flexitarian", "Vegetarian", "Vegan"),
+    **dict.fromkeys(_MEAT_FISH_FIELDS, _options_entry("Never", "Once or twice", "Three times or more")),
+    "allergies": _options_entry(
+        "No", "Milk", "Egg", "Fish", "Shellfish and crustaceans", "Peanut",
+        "Nuts", "Soy", "Gluten", "Wheat", "Pollen", "Others",
+    ),
+    "dietary_preferences": _options_entry("No preference", "Lactose-free", "Gluten free", "Paleo"),
+    "ayurveda_view": _options_entry(
+        "I am convinced",
+        "We can learn a lot from ancient medicine",
+        "I am open to it",
+        "More information needed for an opinion",
+        "I am skeptical",
+        "Alternative medicine is nonsense",
+    ),
+    "new_product_attitude": _options_entry(
+        "To be the first",
+        "You are at the forefront of new products",
+        "Learn more",
+        "You are cautiously optimistic",
+        "Waiting for now",
+        "Scientific research takes time",
+    ),
+    **dict.fromkeys((
+        "concern|sleep|fall_asleep", "concern|skin|dry", "concern|resistance|low",
+        "concern|resistance|intense_training", "concern|resistance|medical_care", "concern|weight|binge",
+        "concern|weight|sleep_hours", "concern|hormones|physical_changes", "concern|brain|mood",
+    ), _YES_NO_ENTRY),
+    "concern|sleep|refreshed": _options_entry("Refreshed", "Still tired"),
+    "concern|sleep|hours": _options_entry("7+ hours", "Less than 7", "Less than 5"),
+    "concern|stress|busy_level": _options_entry("Few things", "Normal", "A lot"),
+    "concern|stress|after_day": _options_entry("Energized", "Completely drained"),
+    "concern|stress|signals": _options_entry(
+        "Faster breathing", "Tense muscles", "Trouble sleeping", "Sensitive stomach",
+        "Head pressure", "Fast heartbeat", "None",
+    ),
+    "concern|energy|day_load": _options_entry("Very full", "Moderate", "Not very full"),
+    "concern|energy|end_day": _options_entry("Still there", "Totally gone"),
+    "concern|energy|body_signals": _options_entry("Tired", "Sleepy", "Low energy", "None"),
+    "concern|stomach_intestines|bowel": _options_entry("Less than once", "About once", "More than once", "Irregular"),
+    "concern|stomach_intestines|improve": _options_entry(
+        "Gas & bloating", "That 'balloon' feeling", "Letting go easily", "Overall digestion", "None",
+    ),
+    "concern|skin|most_days": _options_entry("Pulling", "Shiny", "Sensitive", "Dull", "Pretty good"),
+    "concern|skin|notices": _options_entry("Pimples", "Discoloration", "Lines", "Less elasticity", "Aging", "None"),
+    "concern|weight|challenge": _options_entry("Movement", "Exercise", "Nutrition", "Discipline", "Knowledge", "None"),
+    "concern|hormones|cycle": _options_entry("Regular", "Irregular", "Very irregular"),
+    "concern|hormones|emotions": _options_entry("Moody", "Irritable", "Sad", "Anxious", "Fine"),
+    "concern|libido|level": _options_entry("Low", "Average", "High"),
+    "concern|libido|sleep_quality": _options_entry("Excellent", "Good", "Fair", "Poor"),
+    "concern|libido|pressure": _options_entry("A lot", "Some", "Little", "None"),
+    "concern|brain|symptoms": _options_entry("Difficulty focusing", "Forgetfulness", "Trouble finding words", "None"),
+    "concern|brain|improve": _options_entry("Focus", "Memory", "Mental fitness", "Staying sharp"),
+    "concern|hair_nails|hair": _options_entry(
+        "Dry", "Thin", "Split ends", "Won't grow long", "Could be fuller", "None",
+    ),
+    "concern|hair_nails|nails": _options_entry("Strength", "Length", "Condition", "None"),
+    "concern|fitness|frequency": _options_entry("Daily", "3-5 times a week", "1-2 times a week", "Rarely", "Never"),
+    "concern|fitness|training": _options_entry("Strength", "Cardio", "HIIT", "Flexibility", "None"),
+    "concern|fitness|priority": _options_entry("Performance", "Sweating", "Muscle", "Health"),
+})
+# Problem-summary detail per concern: (follow-up answer, ((keywords, detail), ...)); first matching rule wins
+_CONCERN_DETAIL_RULES = MappingProxyType({
+    "brain": ("symptoms", (
+        (("difficulty focusing", "focus"), "difficulty with focus and concentration"),
+        (("forgetfulness", "memory"), "memory-related challenges"),
+        (("trouble finding words",), "cognitive challenges"),
+    )),
+    "sleep": ("fall_asleep", ((("yes", "hard"), "trouble falling asleep"),)),
+    "stress": ("busy_level", ((("a lot", "very"), "high levels of daily stress"),)),
+    "energy": ("end_day", ((("gone", "tired"), "low energy levels by end of day"),)),
+})
+
+
+
+# Comma-separated allergy answers, each token without surrounding whitespace
+_ALLERGY_TOKEN_RE = re.compile(r"[^,\s](?:[^,]*[^,\s])?")
+# Single-choice questions: field -> (answer vocabulary, error message with a {name} slot)
+_PROTEIN_ANSWERS = MappingProxyType({**dict.fromkeys(_PROTEIN_YES, "yes"), **dict.fromkeys(_VALIDATOR_NO, "no")})
+_STRICT_YES_NO_ANSWERS = MappingProxyType({**dict.fromkeys(_STRICT_YES, "yes"), **dict.fromkeys(_STRICT_NO, "no")})
+_YES_NO_ANSWERS = MappingProxyType({**dict.fromkeys(_VALIDATOR_YES, "yes"), **dict.fromkeys(_VALIDATOR_NO, "no")})
+_CHOICE_FIELDS = MappingProxyType({
+    "for_whom": (_FOR_WHOM_ALLOWED, "Is this for you or for a family member? Just say 'me' or 'family'."),
+    "protein": (_PROTEIN_ANSWERS, "{name}, just a quick yes or no, are you taking protein powder or shakes right now?"),
+    "knowledge": (_KNOWLEDGE_ALLOWED, "{name}, choose one: Well informed, Curious, or Skeptical."),
+    "vitamin_count": (_VITAMIN_COUNT_ALLOWED, "{name}, pick one: No, 1 to 3, or 4+."),
+    "gender": (_GENDER_ALLOWED, "{name}, choose one: male, woman, or gender neutral."),
+    "conceive": (_STRICT_YES_NO_ANSWERS, "{name}, a simple yes or no works, are you pregnant or breastfeeding?"),
+    "situation": (
+        _SITUATION_ALLOWED,
+        "{name}, pick one: To get pregnant in the next 2 years / I am pregnant now / Breastfeeding.",
+    ),
+    "children": (_STRICT_YES_NO_ANSWERS, "{name}, just a yes or no, planning for kids in the coming years?"),
+    "lifestyle_status": (
+        _LIFESTYLE_STATUS_ALLOWED,
+        "{name}, pick one: Been doing well for a long time / Nice on the way / Ready to start",
+    ),
+    **dict.fromkeys(_INTAKE_FIELDS, (_INTAKE_ALLOWED, "{name}, pick one: Hardly / One time / Twice or more")),
+    "eating_habits": (_EATING_HABITS_ALLOWED, "{name}, pick one: No preference / Flexitarian / Vegetarian / Vegan"),
+    **dict.fromkeys(
+        _MEAT_FISH_FIELDS, (_MEAT_FISH_ALLOWED, "{name}, pick one: Never / Once or twice / Three times or more")
+    ),
+    **dict.fromkeys(_YES_NO_VALIDATED_FIELDS, (_YES_NO_ANSWERS, "{name}, just a quick yes or no works here.")),
+    "dietary_preferences": (
+        _DIETARY_PREFERENCES_ALLOWED,
+        "{name}, pick one: No preference / Lactose-free / Gluten free / Paleo",
+    ),
+    "ayurveda_view": (
+        _AYURVEDA_VIEW_ALLOWED,
+        "{name}, pick one: I am convinced / We can learn a lot from ancient medicine / I am open to it / "
+        "More information needed for an opinion / I am skeptical / Alternative medicine is nonsense",
+    ),
+    "new_product_attitude": (
+        _NEW_PRODUCT_ATTITUDE_ALLOWED,
+        "{name}, pick one: To be the first / You are at the forefront of new products / Learn more / "
+        "You are cautiously optimistic / Waiting for now / Scientific research takes time",
+    ),
+})
+# Free-text questions: field -> (minimum length, error message)
+_MIN_LENGTH_FIELDS = MappingProxyType({
+    "name": (2, "I want to remember you, can you share a name with at least 2 letters? 😊"),
+    "family_name": (2, "Tell me their name with at least 2 letters so I can personalize it. 😊"),
+    "relation": (3, "How are you related? (e.g., spouse, parent, sibling, friend)"),
+    "vitamin_details": (3, "Please share the supplement names and dosage details if possible."),
+    **dict.fromkeys(_DETAIL_FIELDS, (3, "Please share a bit more detail so I can keep you safe.")),
+})
+
+
+def _choice_rule(allowed: Mapping[str, str], error_template: str) -> Callable[..., tuple[bool, Any, str]]:
+    """Validator for a single-choice field, shaped like the ChatService._validate_* methods."""
+    def validate(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        if lowered in allowed:
+            return True, allowed[lowered], ""
+        return False, val, error_template.format(name=name)
+    return validate
+
+
+def _min_length_rule(min_length: int, error_message: str) -> Callable[..., tuple[bool, Any, str]]:
+    """Validator for a free-text field that needs at least min_length characters."""
+    def validate(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        if len(val) < min_length:
+            return False, val, error_message
+        return True, val, ""
+    return validate
+
+
+def _keyword_re(*terms: str) -> re.Pattern:
+    """One pattern that matches wherever any of the terms occurs as a substring."""
+    return re.compile("|".join(map(re.escape, terms)))
+
+
+# Keyword bags for _get_empathetic_acknowledgment and _friendly_question, scanned in one pass
+_SEVERE_SLEEP_RE = _keyword_re("less than 5", "less than 7", "still tired", "tired", "exhausted", "drained")
+_LOW_ENERGY_RE = _keyword_re("totally gone", "gone", "sleepy", "tired", "exhausted", "drained", "low", "very low")
+_POSITIVE_HEALTH_RE = _keyword_re("good", "great", "excellent", "fine", "well")
+_SENSITIVE_FIELD_RE = _keyword_re("concern", "sleep", "energy", "stress", "medical")
+# Answers that get the generic acknowledgment when no field handler has anything to say
+_GENERIC_ACK_ANSWERS = frozenset({"yes", "yep", "yeah", "sure", "okay", "ok"})
+_SEVERE_ANSWER_TERMS = ("less than 5", "less than 7", "still tired", "totally gone", "gone", "exhausted", "drained", "sleepy")
+_SEVERE_ANSWER_RE = _keyword_re(*_SEVERE_ANSWER_TERMS)
+# _tone_from_answer keyword bags. Severe answers always get a supportive tone, then
+# positive ones a celebrating tone, then any other supportive keyword.
+_SEVERE_TONE_TERMS = (*_SEVERE_ANSWER_TERMS, "hardly")
+_POSITIVE_TONE_TERMS = (
+    "good", "great", "pretty good", "energized", "7+", "7 +", "high", "performance", "health", "fine",
+    "balanced", "strong", "clear", "better", "improving", "refreshed", "solid", "steady",
+)
+_SUPPORTIVE_TONE_TERMS = (
+    "no", "none", "nah", "nope", "not really", "yes", "yep", "yeah", "low", "little", "less", "tired",
+    "drained", "pimples", "dry", "sensitive", "bloating", "balloon", "irregular", "worried", "stress",
+    "cravings", "trouble", "hard", "difficulty", "struggle", "pain", "aching", "aging", "lines",
+    "breakouts", "fatigue", "bloated", "tight", "pressure", "tense", "poor", "very poor", "very high",
+    "high pressure", "sleepy", "still tired", "totally gone", "gone", "exhausted", "hardly",
+    "not", "never", "nothing", "nobody",
+)
+_TONE_KEYWORDS = MappingProxyType({
+    **dict.fromkeys(_SUPPORTIVE_TONE_TERMS, "supportive"),
+    **dict.fromkeys(_POSITIVE_TONE_TERMS, "positive"),
+    **dict.fromkeys(_SEVERE_TONE_TERMS, "severe"),
+})
+# Keywords only count as whole words ("no" is not found in "know"). Lookahead so
+# every position is tried; higher-priority bags come first in the alternation, so a
+# position where several keywords start reports the one that matters.
+_TONE_KEYWORD_RE = re.compile(
+    "(?<![a-z0-9])(?=("
+    + "|".join(map(re.escape, (*_SEVERE_TONE_TERMS, *_POSITIVE_TONE_TERMS, *_SUPPORTIVE_TONE_TERMS)))
+    + ")(?![a-z0-9]))"
+)
+# A positive keyword negated within the next couple of words ("not good", "don't feel
+# great", "never really fine") reads as a struggle, not a win
+_NEGATED_POSITIVE_RE = re.compile(
+    r"(?:(?<![a-z0-9])(?:not|no|never)|n't)\s+(?:[a-z']+\s+){0,2}?(?:"
+    + "|".join(map(re.escape, _POSITIVE_TONE_TERMS))
+    + ")(?![a-z0-9])"
+)
+_SENSITIVE_TONE_FIELD_RE = _keyword_re(
+    "weight", "sleep", "stress", "energy", "brain", "stomach", "intestines", "skin", "resistance", "libido",
+    "hormones", "hair", "nails", "fitness", "concern",
+)
+# A first word of 4+ characters ending in "s" but not "ss" is likely a third-person
+# verb ("promotes"); group 1 is the phrase up to its base form ("promote")
+_THIRD_PERSON_FIRST_WORD_RE = re.compile(r"^(\s*\S{2,}[^\ss])s(?!\S)")
+# Concern names that contain a separator word, joined up before the answer is split
+_CONCERN_PAIRS = MappingProxyType({
+    "stomach and intestines": "stomach & intestines",
+    "hair and nails": "hair & nails",
+    "hair nails": "hair & nails",
+})
+_CONCERN_PAIR_RE = re.compile("|".join(map(re.escape, _CONCERN_PAIRS)))
+# Separators between concern choices: ",", ";", "|", " / " and " and ". A " / "
+# takes precedence over an " and " that shares its whitespace.
+_CONCERN_SPLIT_RE = re.compile(r"\s+/+\s*|[,;|]|\s+and\s+(?!\s*/)")
+# Concern acknowledgment categories, in priority order, and the keywords that select them
+_CONCERN_CATEGORY_ORDER = ("sleep", "energy", "stress", "skin", "weight")
+_CONCERN_CATEGORY_KEYWORDS = MappingProxyType({
+    "sleep": "sleep",
+    **dict.fromkeys(("energy", "tired", "fatigue", "exhausted", "drained"), "energy"),
+    **dict.fromkeys(("stress", "anxiety", "worried", "overwhelmed"), "stress"),
+    **dict.fromkeys(("skin", "acne", "pimples", "dry", "sensitive"), "skin"),
+    **dict.fromkeys(("weight", "fitness", "health", "wellness"), "weight"),
+})
+# Zero-width lookahead so overlapping keywords are all reported in a single scan
+_CONCERN_CATEGORY_RE = re.compile("(?=(" + "|".join(map(re.escape, _CONCERN_CATEGORY_KEYWORDS)) + "))")
+# category -> (acknowledgment for the user, format_map template for a family member or None)
+_CONCERN_ACK_TEMPLATES = MappingProxyType({
+    "sleep": (
+        "I completely understand how challenging lack of sleep can be. No worries, we'll handle this together and find solutions that work for you. You're taking the right step by addressing this! 🌙",
+        "I completely understand how challenging lack of sleep can be for {person}. No worries, we'll handle this together and find solutions that work for {pronoun_obj}. {person_title}'s taking the right step by addressing this! 🌙",
+    ),
+    "energy": (
+        "I hear you on the energy front. Let's get you feeling more energized and vibrant! We'll find the right support to boost your vitality. You've got this! ⚡",
+        "I hear you on the energy front for {person}. Let's get {pronoun_obj} feeling more energized and vibrant! We'll find the right support to boost {pronoun_possessive} vitality. {person_title}'s got this! ⚡",
+    ),
+    "stress": (
+        "Stress and anxiety can be really tough to deal with. You're not alone in this, and I'm here to help you find natural ways to feel more calm and balanced. We'll work through this together. 💙",
+        "Stress and anxiety can be really tough to deal with. {person_title} is not alone in this, and I'm here to help {pronoun_obj} find natural ways to feel more calm and balanced. We'll work through this together. 💙",
+    ),
+    "skin": (
+        "I understand skin concerns can affect your confidence. Let's work together to find products that will help your skin glow and feel its best. You deserve to feel great in your own skin! ✨",
+        None,
+    ),
+    "weight": (
+        "That's fantastic that you're focused on your health goals! I'm excited to help you on this journey. Together, we'll find the perfect supplements to support your wellness. Let's do this! 💪",
+        None,
+    ),
+})
+_PLANT_BASED_FAMILY_ACK = "That's wonderful! I respect {person}'s dietary choices completely. I'll make sure all recommendations align perfectly with {pronoun_possessive} values. Let's find the best plant-based support for {pronoun_obj}! 🌱"
+
+
+@dataclass(frozen=True, slots=True)
+class _AckInput:
+    """What an acknowledgment handler may read about the answer and the person."""
+
+    field: str
+    answer: str
+    answer_lower: str
+    is_pregnant: bool
+    concerns_text: str | None
+    is_family: bool
+    person: str
+    pronoun_obj: str
+    pronoun_possessive: str
+
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks: set[asyncio.Task] = set()
+# Sessions whose recommendations are being generated by a task in this process
+_MATERIALIZING_SESSIONS: set[str] = set()
+# A recommendation run that started longer ago than this is presumed lost (e.g. the
+# worker restarted) and may be claimed again; across workers the lease is in Mongo
+_RECOMMENDATION_LEASE_SECONDS = 300.0
+
+
+# Explanation sentence pieces per variant: (before concerns, before ingredient, before benefits)
+_MATCHED_EXPLANATION_TEMPLATES = (
+    ("This product may help address your ", " through ", ", which "),
+    ("Based on your ", ", ", " in this product can "),
+    ("For your ", ", this product offers ", " that "),
+)
+_FIRST_BENEFIT_EXPLANATION_TEMPLATES = (
+    ("This product may support your ", " with ", " that "),
+    ("For your ", ", this product contains ", " which "),
+    ("Addressing your ", ", this product includes ", " that "),
+)
+
+
+@lru_cache(maxsize=1024)
+def _explain(
+    product_title: str, concerns_phrase: str, ingredient_name: str, benefits_phrase: str, benefits_matched: bool
+) -> str:
+    """
+    Explanation sentence for a product whose text matched the user's concerns.
+    benefits_matched says whether benefits_phrase came from concern-matching
+    benefits or is just the product's first benefit.
+    """
+    # Pick the variant from a checksum of the product name; unlike hash() it is
+    # the same in every process, so a product always reads the same way
+    variant_idx = crc32(product_title.encode("utf-8")) % 3
+    if benefits_matched:
+        lead, before_ingredient, before_benefits = _MATCHED_EXPLANATION_TEMPLATES[variant_idx]
+        if variant_idx == 1:
+            # Fix grammar: "can" needs the base form (e.g., "promotes" -> "promote")
+            benefits_phrase = _THIRD_PERSON_FIRST_WORD_RE.sub(r"\1", benefits_phrase, count=1)
+    else:
+        lead, before_ingredient, before_benefits = _FIRST_BENEFIT_EXPLANATION_TEMPLATES[variant_idx]
+    return "".join((lead, concerns_phrase, before_ingredient, ingredient_name, before_benefits, benefits_phrase, "."))
+
+
+def _join_labels(labels: list[str]) -> str:
+    """Readable list of labels: "a", "a and b", "a, b and c"."""
+    if len(labels) <= 2:
+        return " and ".join(labels)
+    return f"{', '.join(labels[:-1])} and {labels[-1]}"
+
+
+def _pick_lang(values: dict, lang: str = "en") -> Any:
+    """Translation for lang from a multilingual field, else the first one stored."""
+    value = values.get(lang)
+    if value is not None:
+        return value
+    return values[next(iter(values))] if values else ""
+
+
+def _run_in_background(coro) -> asyncio.Task:
+    """Schedule a coroutine without awaiting it."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@dataclass
+class TurnContext:
+    """
+    Session writes collected while handling one chat turn. They are flushed
+    with a single SessionRepository.commit_turn call.
+    """
+    session_id: str | None = None
+    user_id: str | None = None
+    messages: list[ChatMessage] = field(default_factory=list)
+    metadata_patch: dict = field(default_factory=dict)
+
+    def add_messages(self, *messages: ChatMessage) -> None:
+        for message in messages:
+            # The same message object can be queued from two branches of one turn
+            if not any(message is queued for queued in self.messages):
+                self.messages.append(message)
+
+    def patch_metadata(self, patch: dict) -> None:
+        self.metadata_patch.update(patch)
+
+    async def flush(self, session_repo: SessionRepository) -> None:
+        if self.session_id is None or not (self.messages or self.metadata_patch):
+            return
+        messages, metadata_patch = self.messages, self.metadata_patch
+        self.messages, self.metadata_patch = [], {}
+        await session_repo.commit_turn(
+            session_id=self.session_id,
+            messages=messages,
+            metadata_patch=metadata_patch,
+            user_id=self.user_id,
+        )
+
 
 class ChatService:
+    __slots__ = ("session_repo", "ai_service", "product_service", "user_repo", "quiz_session_repo")
+
     PROMPTS = {
         "name": "Hey! I'm Viteezy. What should I call you?",
         "for_whom": "Hey friend! 😊 Is this quiz for you or for a family member? (me/family)",
@@ -77,6 +869,11 @@ class ChatService:
         "medical_treatment_details": "What medical treatment are you currently undergoing? Please brief it.",
         "pre_recommendation_notes": "Is there anything you would like to share before product recommendation to us apart from the details asked in the quiz?",
     }
+
+    # The name prompt already opens with a greeting, so _friendly_question
+    # returns it unchanged for a fresh session.
+    DEFAULT_FIRST_QUESTION = PROMPTS["name"]
+
     CONCERN_SYNONYMS = {
         "sleep": "sleep",
         "stress": "stress",
@@ -103,6 +900,12 @@ class ChatService:
         "hormones": "hormones",
         "hormone": "hormones",
     }
+    # Any synonym as a whole word, longest first so "hair & nails" wins over "hair".
+    # Built once, so CONCERN_SYNONYMS must not be changed at runtime. Only literal
+    # alternatives and no quantifiers, so the scan stays linear in the answer length.
+    _CONCERN_TOKEN_RE = re.compile(
+        r"\b(" + "|".join(map(re.escape, sorted(CONCERN_SYNONYMS, key=len, reverse=True))) + r")\b"
+    )
     CONCERN_QUESTIONS = {
         "sleep": {
             "label": "Sleep",
@@ -254,6 +1057,77 @@ class ChatService:
         },
     }
 
+    # Question prefixes per answer tone; _friendly_question picks one by step number
+    _TONE_BUCKETS = MappingProxyType({
+        "celebrate": (
+            "Love that! 🎉",
+            "Nice, that's great to hear!",
+            "Awesome vibes, let's keep it going:",
+            "Sweet, thanks for sharing!",
+            "Great choice, here's another quick one:",
+            "That's solid, let's keep the momentum:",
+            "Great energy, rolling on:",
+            "You're crushing it, next bit:",
+            "Brilliant, tell me this:",
+            "Fantastic! Quick follow-up:",
+            "High five on that! One more:",
+            "Sounds great, here comes the next one:",
+        ),
+        "supportive": (
+            "I hear you, and I'm here to help you through this. Let's work together:",
+            "Got it, and we'll sort this out together. You're not alone:",
+            "Thanks for being real about that. I appreciate your honesty:",
+            "Totally understand, let's dial this in. We've got this:",
+            "Noted, and I'm here to support you. Let's make this better:",
+            "We'll tackle this together, next question to help:",
+            "I'm on your side, tell me a bit more so I can help you better:",
+            "Let's figure this out together, one more question:",
+            "Thanks for sharing, this helps me help you. Let's continue:",
+            "We've got this, quick follow-up:",
+            "Let's get you feeling better, next up:",
+            "Appreciate the honesty, another quick one:",
+            "I'm here with you, let's fine-tune things:",
+            "We'll solve this step by step, next one:",
+            "You're not alone in this, tell me more:",
+            "Let's smooth this out, here's another:",
+            "I get it, let's make a plan together:",
+            "We'll adjust as we go, quick follow-up:",
+            "Let's make this easier for you, next question:",
+            "Thanks for trusting me with that, one more:",
+            "We'll keep it gentle, share a bit more:",
+            "Let's take it one step at a time, next up:",
+            "I've got you, help me with this one:",
+        ),
+        "neutral": (
+            "Hey friend! 😊",
+            "Great! Let's keep moving forward together:",
+            "Thanks for that, I appreciate you sharing. Another quick one:",
+            "You're doing great! Here we go:",
+            "Appreciate it, this helps me understand you better. Tell me this:",
+            "Let's keep the flow going, next question:",
+            "I'm here to help you, here's one more:",
+            "Thanks for being open with me, answer this:",
+            "On we go together, give me your take:",
+            "You're making great progress, what about this:",
+            "Still with me? I'm here for you. Here's the next one:",
+            "Let's continue this journey together, tell me this:",
+        ),
+    })
+    # Prefixes used instead of the supportive bucket after a severe answer
+    _SEVERE_SUPPORTIVE_PREFIXES = (
+        "I understand this is challenging. Let's work through this together:",
+        "I hear you, and I'm here to help. Let's take the next step:",
+        "This must be really tough. We'll find solutions together:",
+        "I appreciate you sharing this with me. Let's continue:",
+        "You're not alone in this. Let's keep moving forward:",
+    )
+
+    # Lowercase display label per concern key
+    _CONCERN_LABELS = {
+        key: (info.get("label") or key.replace("_", " ").title()).lower()
+        for key, info in CONCERN_QUESTIONS.items()
+    }
+
     def __init__(
         self,
         session_repo: SessionRepository,
@@ -268,6 +1142,20 @@ class ChatService:
         self.user_repo = user_repo
         self.quiz_session_repo = quiz_session_repo
 
+    @staticmethod
+    def _parse_yes_no(text: str) -> bool | None:
+        """Return True/False for a yes/no style reply, None when it is neither."""
+        return ChatService._yes_no_from_normalized(text.strip().lower())
+
+    @staticmethod
+    def _yes_no_from_normalized(answer: str) -> bool | None:
+        """Same as _parse_yes_no for text that is already stripped and lowercased."""
+        if _YES_RE.fullmatch(answer):
+            return True
+        if _NO_RE.fullmatch(answer):
+            return False
+        return None
+
     def _get_user_id_from_session(self, session: Session) -> str | None:
         """Extract user_id from session metadata."""
         return (session.metadata or {}).get("user_id")
@@ -292,31 +1180,33 @@ class ChatService:
         Returns:
             True if update was successful, False otherwise
         """
-        print(f"[_update_session_token_usage] Called with session_id={session_id}, user_id={user_id}")
-        print(f"[_update_session_token_usage] usage_info: {usage_info}")
         try:
             logger.debug(
-                f"Calling update_token_usage: session_id={session_id}, "
-                f"user_id={user_id}, usage_info={usage_info}"
+                "Calling update_token_usage: session_id=%s, user_id=%s, usage_info=%r",
+                session_id,
+                user_id,
+                usage_info,
             )
-            print(f"[_update_session_token_usage] Calling session_repo.update_token_usage...")
             result = await self.session_repo.update_token_usage(session_id, usage_info, user_id)
-            print(f"[_update_session_token_usage] session_repo.update_token_usage returned: {result}")
             if result:
-                success_msg = f"Token usage updated successfully for session {session_id}"
-                print(f"[_update_session_token_usage] SUCCESS: {success_msg}")
-                logger.info(success_msg)
+                logger.info(
+                    "Token usage updated for session %s: input=%s output=%s cost=%.6f",
+                    session_id,
+                    usage_info.get("input_tokens"),
+                    usage_info.get("output_tokens"),
+                    usage_info.get("cost", 0),
+                    extra={
+                        "session_id": session_id,
+                        "user_id": user_id,
+                        "tokens_in": usage_info.get("input_tokens"),
+                        "tokens_out": usage_info.get("output_tokens"),
+                        "cost": usage_info.get("cost", 0),
+                    },
+                )
                 return True
-            else:
-                warning_msg = f"update_token_usage returned None for session {session_id}, user_id: {user_id}"
-                print(f"[_update_session_token_usage] WARNING: {warning_msg}")
-                logger.warning(warning_msg)
-                return False
+            logger.warning("update_token_usage returned None for session %s, user_id: %s", session_id, user_id)
+            return False
         except Exception as e:
-            error_msg = f"Exception in _update_session_token_usage: {e}"
-            print(f"[_update_session_token_usage] EXCEPTION: {error_msg}")
-            import traceback
-            print(f"[_update_session_token_usage] Traceback: {traceback.format_exc()}")
             log_error_with_context(
                 e,
                 context={
@@ -327,7 +1217,6 @@ class ChatService:
                 },
                 level=logging.ERROR
             )
-            logger.error(error_msg, exc_info=True)
             return False
 
     async def _get_previous_session_data(self, user_id: str) -> dict:
@@ -339,7 +1228,6 @@ class ChatService:
             return {}
         
         try:
-            from bson import ObjectId
             user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
             
             # Get user document with all sessions
@@ -383,81 +1271,38 @@ class ChatService:
         """
         Get previous session's concerns and product recommendations.
         Returns dict with previous_concerns, previous_products, and previous_messages.
+        Results are cached briefly per (user_id, current_session_id).
         """
         if not user_id:
             return {}
         
+        cache_key = (str(user_id), str(current_session_id))
+        cached = _PREVIOUS_SESSION_CACHE.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        previous_session_data = await self._load_previous_session_concerns_and_products(user_id, current_session_id)
+        _PREVIOUS_SESSION_CACHE.put(cache_key, previous_session_data)
+        return dict(previous_session_data)
+
+    async def _load_previous_session_concerns_and_products(self, user_id: str, current_session_id: str) -> dict:
+        """Read the most recent completed session with mapped concerns from the database."""
         try:
-            from bson import ObjectId
-            user_oid = ObjectId(user_id) if isinstance(user_id, str) else user_id
-            
-            # Get user document with all sessions
-            user_doc = await self.session_repo.collection.find_one({"_id": user_oid})
+            summary = await self.session_repo.get_previous_session_summary(user_id, current_session_id)
             
-            if not user_doc:
+            # Extract concerns - only consider sessions where concerns are actually mapped
+            previous_concerns = self._normalize_concerns(summary.get("concerns", []))
+            if not previous_concerns:
                 return {}
             
-            # Find the most recent completed session (excluding current session)
-            sessions = user_doc.get("sessions", [])
-            previous_session_data = {}
-            
-            # Look through sessions in reverse order (most recent first)
-            for session in reversed(sessions):
-                session_id_raw = session.get("session_id")
-                session_id = str(session_id_raw) if session_id_raw is not None else None
-                # Skip current session
-                if session_id == str(current_session_id):
-                    continue
-                
-                session_metadata = session.get("metadata", {})
-                onboarding = session_metadata.get("onboarding", {})
-                responses = onboarding.get("responses", {})
-                messages = session.get("messages", [])
-                
-                # If this session has completed onboarding, extract concerns and products
-                # Check for sessions where major concerns are mapped (concern field exists and is not empty)
-                if onboarding.get("complete") and responses:
-                    # Extract concerns - only consider sessions where concerns are actually mapped
-                    previous_concerns = self._normalize_concerns(responses.get("concern", []))
-                    
-                    # Only process if this session has major concerns mapped
-                    if previous_concerns:
-                        # Extract product recommendations from messages
-                        previous_products = []
-                        recommendation_text = ""
-                        
-                        # Look for product recommendation messages (usually the last assistant message)
-                        for msg in reversed(messages):
-                            if msg.get("role") == "assistant":
-                                content = msg.get("content", "")
-                                # Check if this message contains product recommendations
-                                # Product recommendations typically mention product names
-                                if any(keyword in content.lower() for keyword in ["recommend", "suggest", "product", "supplement"]):
-                                    recommendation_text = content
-                                    # Try to extract product names (they're usually in the message)
-                                    # This is a simple extraction - product names are typically at the start of each recommendation
-                                    lines = content.split("\n")
-                                    for line in lines:
-                                        line = line.strip()
-                                        if line and not line.startswith(("IMPORTANT", "Note:", "⚠️", "Since you", "STRONG MEDICAL")):
-                                            # Likely a product name or title
-                                            if len(line) < 100 and not line.startswith("Since"):
-                                                product_name = line.split(":")[0].strip()
-                                                if product_name and product_name not in previous_products:
-                                                    previous_products.append(product_name)
-                                    break
-                        
-                        previous_session_data = {
-                            "previous_concerns": previous_concerns,
-                            "previous_products": previous_products[:3],  # Limit to 3 products
-                            "previous_recommendation_text": recommendation_text,
-                        }
-                        break  # Found the most recent completed session with major concerns
-            
-            return previous_session_data
+            return {
+                "previous_concerns": previous_concerns,
+                "previous_products": summary.get("products", []),
+                "previous_recommendation_text": summary.get("recommendation_text", ""),
+                "major_concern": previous_concerns[0],
+            }
         except Exception as e:
-            import logging
-            logging.error(f"Error getting previous session concerns: {e}")
+            logger.exception("Error getting previous session concerns: %s", e)
             return {}
 
     async def _check_if_major_concern_same(self, user_id: str, current_session_id: str, current_concerns: list[str]) -> bool:
@@ -482,20 +1327,13 @@ class ChatService:
         
         try:
             # Get previous session data
+            # Shares the cached previous-session summary with the returning-user checks
             previous_data = await self._get_previous_session_concerns_and_products(user_id, current_session_id)
-            previous_concerns = previous_data.get("previous_concerns", [])
-            
-            if not previous_concerns:
-                return False
             
-            # Get the major concern from previous session (first concern)
-            previous_major_concern = previous_concerns[0] if previous_concerns else None
-            
-            # Compare major concerns
-            return previous_major_concern == current_major_concern
+            # Compare major concerns (first concern of each session)
+            return previous_data.get("major_concern") == current_major_concern
         except Exception as e:
-            import logging
-            logging.error(f"Error checking if major concern is same: {e}")
+            logger.exception("Error checking if major concern is same: %s", e)
             return False
 
     async def create_session(self, metadata: dict | None = None, user_id: str | None = None) -> Session:
@@ -530,12 +1368,10 @@ class ChatService:
                     "complete": False,
                     "awaiting_answer": False,
                 }
-                # Update session metadata with pre-populated data
-                session_metadata = session.metadata or {}
-                session_metadata["onboarding"] = onboarding_state
-                session = await self.session_repo.update_metadata(
+                # Update session metadata with pre-populated data (only the onboarding key)
+                session = await self.session_repo.update_metadata_partial(
                     session_id=session.id,
-                    metadata=session_metadata,
+                    patch={"onboarding": onboarding_state},
                     user_id=user_id,
                 )
         
@@ -552,6 +1388,22 @@ class ChatService:
         return session
 
     async def handle_message(self, payload: ChatRequest) -> ChatResponse:
+        turn = TurnContext()
+        try:
+            response = await self._handle_turn(payload, turn)
+        except BaseException:
+            # Still persist what the turn queued, but never let a failed write replace
+            # the error that ended the turn
+            try:
+                await turn.flush(self.session_repo)
+            except Exception:
+                logger.exception("Failed to persist turn for session %s", turn.session_id)
+            raise
+        # Persist everything the turn queued in one write
+        await turn.flush(self.session_repo)
+        return response
+
+    async def _handle_turn(self, payload: ChatRequest, turn: TurnContext) -> ChatResponse:
         # Try to get user_id from session metadata if available
         # First try without user_id (legacy format), then with user_id if found
         session = await self.session_repo.get(payload.session_id)
@@ -560,13 +1412,20 @@ class ChatService:
         
         # Extract user_id from session metadata for subsequent operations
         user_id = self._get_user_id_from_session(session)
+        turn.session_id = session.id
+        turn.user_id = user_id
         
         # Get isRegistered status for all responses
         is_registered = self._get_is_registered_from_session(session)
 
         user_message = ChatMessage(role="user", content=payload.message)
+        msg_stripped = payload.message.strip()
+        msg_lower = msg_stripped.casefold()
 
         onboarding_state = self._get_onboarding_state(session)
+        # Snapshot of the flags as loaded; only used by the checks below that run
+        # before this turn changes any of them
+        flags = self._onboarding_flags(onboarding_state)
         
         # Check if this is the very first message (session has no messages)
         # If so, automatically start onboarding by asking the first question
@@ -574,31 +1433,32 @@ class ChatService:
         is_first_message = len(session.messages) == 0
         first_question_already_shown = onboarding_state.get("first_question_shown", False)
         
-        if is_first_message and not onboarding_state.get("complete") and not first_question_already_shown:
+        if is_first_message and not flags & _FLAG_COMPLETE and not first_question_already_shown:
             # Initialize onboarding state if not already initialized
             if onboarding_state.get("step", 0) == 0 and not onboarding_state.get("awaiting_answer"):
                 # Get the first question
                 has_previous_sessions = (session.metadata or {}).get("has_previous_sessions", False)
-                ordered_steps = self._ordered_steps(onboarding_state["responses"], has_previous_sessions=has_previous_sessions)
+                if not has_previous_sessions and not onboarding_state["responses"]:
+                    # Fresh session: the first question is always the name prompt
+                    ordered_steps = ["name"]
+                    first_field = "name"
+                    question_content = self.DEFAULT_FIRST_QUESTION
+                else:
+                    ordered_steps = self._ordered_steps(onboarding_state["responses"], has_previous_sessions=has_previous_sessions)
+                    if ordered_steps:
+                        first_field = ordered_steps[0]
+                        first_prompt = self._build_prompt(field=first_field, responses=onboarding_state["responses"])
+                        
+                        # Build the first question with friendly greeting
+                        question_content = self._friendly_question(
+                            prompt=first_prompt,
+                            step=0,
+                            prev_answer=None,
+                            prev_field=None,
+                            responses=onboarding_state.get("responses", {}),
+                        )
                 
                 if ordered_steps:
-                    first_field = ordered_steps[0]
-                    first_prompt = self._build_prompt(field=first_field, responses=onboarding_state["responses"])
-                    
-                    # Build the first question with friendly greeting
-                    question_content = self._friendly_question(
-                        prompt=first_prompt,
-                        step=0,
-                        prev_answer=None,
-                        prev_field=None,
-                        responses=onboarding_state.get("responses", {}),
-                    )
-                    
-                    # Save the user's trigger message (even though we ignore its content)
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message], user_id=user_id
-                    )
-                    
                     # Create the first question reply
                     first_reply = ChatMessage(role="assistant", content=question_content)
                     
@@ -608,112 +1468,68 @@ class ChatService:
                     # Update onboarding state
                     onboarding_state["step"] = 0
                     onboarding_state["awaiting_answer"] = True
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[first_reply], user_id=user_id
-                    )
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
-                    
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=first_reply,
+                    # Save the user's trigger message (even though we ignore its content)
+                    # together with the first question
+                    return self._respond(
+                        turn, user_message, first_reply,
+                        onboarding_state=onboarding_state,
                         options=options,
                         question_type=question_type,
-                        isRegistered=is_registered,
+                        is_registered=is_registered,
                     )
 
         # Check if onboarding is complete and recommendations have been shown
         # If so, prevent further conversation
-        if onboarding_state.get("complete") and onboarding_state.get("recommendations_shown"):
-            end_message = ChatMessage(
-                role="assistant",
-                content="Thank you for completing the quiz! Your personalized recommendations have been provided above. If you have any questions, please feel free to reach out to our support team. Have a great day! 😊"
-            )
-            await self.session_repo.append_messages(
-                session_id=session.id, messages=[user_message, end_message], user_id=user_id
-            )
-            return ChatResponse(
-                session_id=session.id,
-                reply=end_message,
-                options=None,
-                question_type=None,
-                isRegistered=is_registered,
+        if flags & _FLAG_COMPLETE_SHOWN == _FLAG_COMPLETE_SHOWN:
+            end_message = ChatMessage(role="assistant", content=_END_MESSAGE)
+            return self._respond(
+                turn, user_message, end_message,
+                is_registered=is_registered,
             )
 
         # Check if user has previous sessions (for returning users)
         has_previous_sessions = (session.metadata or {}).get("has_previous_sessions", False)
 
-        ordered_steps = self._ordered_steps(onboarding_state["responses"], has_previous_sessions=has_previous_sessions)
+        ordered_steps = self._ordered_steps(
+            onboarding_state["responses"],
+            has_previous_sessions=has_previous_sessions,
+            should_ask_previous_concern_followup=onboarding_state["should_ask_previous_concern_followup"],
+        )
         acknowledgment: str | None = None
 
         # Check if we're waiting for registration confirmation (this should be checked first, before normal field validation)
-        if onboarding_state.get("awaiting_registration_confirmation"):
-            user_response_lower = payload.message.strip().lower()
-            if user_response_lower in ["okay", "ok", "yes", "yep", "yeah", "sure", "alright", "y"]:
+        if flags & _FLAG_AWAITING_REGISTRATION:
+            answer = self._yes_no_from_normalized(msg_lower)
+            if answer is True:
                 # Redirect to registration
-                redirect_message = (
-                    "Perfect! I'll redirect you to create a separate registration. "
-                    "This will give your family member the best personalized experience! 🎯"
-                )
-                reply = ChatMessage(role="assistant", content=redirect_message)
+                reply = ChatMessage(role="assistant", content=_REGISTRATION_REDIRECT_MESSAGE)
                 
-                await self.session_repo.append_messages(
-                    session_id=session.id, messages=[user_message, reply], user_id=user_id
-                )
                 onboarding_state["awaiting_registration_confirmation"] = False
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
-                return ChatResponse(
-                    session_id=session.id,
-                    reply=reply,
+                return self._respond(
+                    turn, user_message, reply,
+                    onboarding_state=onboarding_state,
                     redirect_url="https://viteezy.nl/login",
-                    isRegistered=is_registered,
+                    is_registered=is_registered,
                 )
-            elif user_response_lower in ["no", "nope", "nah", "n"]:
+            elif answer is False:
                 # User wants to continue here, proceed with family flow
                 onboarding_state["awaiting_registration_confirmation"] = False
                 onboarding_state["step"] += 1  # Move to next step (family_name)
                 onboarding_state["awaiting_answer"] = False
                 acknowledgment = "No problem! Let's continue with the quiz for your family member here. 😊"
-                await self.session_repo.append_messages(
-                    session_id=session.id, messages=[user_message], user_id=user_id
-                )
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
+                turn.add_messages(user_message)
+                turn.patch_metadata({"onboarding": onboarding_state})
                 # Continue to show next question below
             else:
                 # Invalid response, ask again
-                error_reply = ChatMessage(
-                    role="assistant",
-                    content="Please choose 'Yes' to redirect to registration or 'No' to continue here."
-                )
-                options = [
-                    QuestionOption(value="yes", label="Yes"),
-                    QuestionOption(value="no", label="No"),
-                ]
-                await self.session_repo.append_messages(
-                    session_id=session.id, messages=[user_message, error_reply], user_id=user_id
-                )
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
-                return ChatResponse(
-                    session_id=session.id,
-                    reply=error_reply,
+                error_reply = ChatMessage(role="assistant", content=_REGISTRATION_CONFIRM_ERROR)
+                options = _YES_NO_OPTIONS
+                return self._respond(
+                    turn, user_message, error_reply,
+                    onboarding_state=onboarding_state,
                     options=options,
                     question_type="yes_no",
-                    isRegistered=is_registered,
+                    is_registered=is_registered,
                 )
 
         if onboarding_state["step"] < len(ordered_steps):
@@ -721,28 +1537,21 @@ class ChatService:
                 current_field = ordered_steps[onboarding_state["step"]]
                 is_valid, normalized, error_reply = self._validate_response(
                     field=current_field,
-                    raw_value=payload.message.strip(),
+                    raw_value=msg_stripped,
                     responses=onboarding_state["responses"],
+                    lowered=msg_lower,
                 )
                 if not is_valid:
                     reply = ChatMessage(role="assistant", content=error_reply)
                     # Get options for the current question to show again
                     options, question_type = self._get_question_options(current_field)
                     
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message, reply], user_id=user_id
-                    )
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=reply,
+                    return self._respond(
+                        turn, user_message, reply,
+                        onboarding_state=onboarding_state,
                         options=options,
                         question_type=question_type,
-                        isRegistered=is_registered,
+                        is_registered=is_registered,
                     )
 
                 self._save_response(
@@ -769,24 +1578,14 @@ class ChatService:
                     # Don't increment step yet - wait for their response
                     
                     # Provide yes/no options for frontend
-                    options = [
-                        QuestionOption(value="yes", label="Yes"),
-                        QuestionOption(value="no", label="No"),
-                    ]
+                    options = _YES_NO_OPTIONS
                     
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message, reply], user_id=user_id
-                    )
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=reply,
+                    return self._respond(
+                        turn, user_message, reply,
+                        onboarding_state=onboarding_state,
                         options=options,
                         question_type="yes_no",
+                        is_registered=is_registered,
                     )
                 
                 # Normal flow - increment step and get acknowledgment
@@ -814,11 +1613,7 @@ class ChatService:
                         onboarding_state["previous_concerns"] = previous_data.get("previous_concerns", [])
                         onboarding_state["previous_products"] = previous_data.get("previous_products", [])
                     # Continue to next question (medical_treatment)
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
+                    turn.patch_metadata({"onboarding": onboarding_state})
                     # Don't return here - continue to show next question
                 
                 # Check if this was the final question - if so, generate recommendations but end conversation
@@ -826,87 +1621,29 @@ class ChatService:
                     # Mark onboarding as complete
                     onboarding_state["complete"] = True
                     
-                    # Save the user's response first
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message], user_id=user_id
-                    )
-                    
-                    # Generate product recommendations even though conversation ends
-                    # This allows /useridLogin to retrieve them later
-                    profile_context = onboarding_state.get("responses", {})
-                    previous_products = onboarding_state.get("previous_products", [])
-                    previous_concern_resolved = onboarding_state.get("previous_concern_resolved")
-                    previous_concerns = onboarding_state.get("previous_concerns", [])
-                    
-                    try:
-                        recommended_products, product_documents = await self.product_service.find_relevant_products(
-                            message=None,
-                            context=profile_context,
-                            limit=10,
-                            exclude_product_titles=previous_products if previous_concern_resolved is False else [],
-                        )
-                        
-                        if not recommended_products and previous_products and previous_concern_resolved is False:
-                            recommended_products, product_documents = await self.product_service.find_relevant_products(
-                                message=None,
-                                context=profile_context,
-                                limit=3,
-                                include_product_titles=previous_products,
-                            )
-                        
-                        if not recommended_products:
-                            recommended_products, product_documents = await self.product_service.find_relevant_products(
-                                message=None,
-                                context=profile_context,
-                                limit=3,
-                            )
-                    except Exception as e:
-                        import logging
-                        logging.error(f"Error finding products for medical_treatment: {e}")
-                        recommended_products = []
-                        product_documents = {}
-                    
-                    # Generate recommendation message and save to session (but don't return it)
-                    if recommended_products:
-                        recommendation_message = await self._format_product_recommendations(
-                            recommended_products,
-                            profile_context,
-                            product_documents,
-                            previous_concern_resolved=previous_concern_resolved,
-                            previous_concerns=previous_concerns,
-                            previous_products=previous_products if previous_concern_resolved is False else [],
-                        )
-                        recommendation_reply = ChatMessage(role="assistant", content=recommendation_message)
-                        await self.session_repo.append_messages(
-                            session_id=session.id, messages=[recommendation_reply], user_id=user_id
-                        )
-                    
-                    # Mark recommendations as shown and store product titles
-                    product_titles = [product.title for product in recommended_products] if recommended_products else []
-                    onboarding_state["recommendations_shown"] = True
-                    onboarding_state["recommended_product_titles"] = product_titles
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
+                    # Generate product recommendations in the background even though the
+                    # conversation ends; /useridLogin reads them once they are stored
+                    onboarding_state["recommendations_pending"] = True
+                    turn.add_messages(user_message)
+                    turn.patch_metadata({"onboarding": onboarding_state})
+                    # Flush now so the user message is stored before the recommendation
+                    await turn.flush(self.session_repo)
+                    await self.schedule_recommendations(session.id, user_id, onboarding_state)
                     
-                    # End conversation immediately - return with content: null (but recommendations are saved)
-                    is_registered = self._get_is_registered_from_session(session)
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=None,  # No message/content in response
-                        options=None,
-                        question_type=None,
-                        isRegistered=is_registered,
-                    )
+                    # End conversation immediately - return with content: null (recommendations are saved later)
+                    return self._respond(turn, None, None, is_registered=is_registered)
 
             # Check if we should ask previous_concern_followup question
             # This should be asked if: user_id exists, has_previous_sessions, and major concern is the same
             # Only check once when concerns are available and we haven't checked before
             should_ask_previous_concern_followup = onboarding_state.get("should_ask_previous_concern_followup", False)
-            if user_id and has_previous_sessions and not onboarding_state.get("previous_concern_followup_checked"):
-                current_concerns = self._normalize_concerns(onboarding_state.get("responses", {}).get("concern", []))
+            if (
+                user_id
+                and has_previous_sessions
+                and not onboarding_state.get("previous_concern_followup_checked")
+                and not onboarding_state.get("_major_concern_checked")
+            ):
+                current_concerns = self._current_concerns(onboarding_state.get("responses", {}))
                 if current_concerns:
                     # Check if major concern is the same as previous session
                     should_ask_previous_concern_followup = await self._check_if_major_concern_same(
@@ -914,6 +1651,7 @@ class ChatService:
                     )
                     # Store this in onboarding state to avoid re-checking
                     onboarding_state["should_ask_previous_concern_followup"] = should_ask_previous_concern_followup
+                    onboarding_state["_major_concern_checked"] = True
 
             ordered_steps = self._ordered_steps(
                 onboarding_state["responses"], 
@@ -949,77 +1687,55 @@ class ChatService:
                 # Get options for this question
                 options, question_type = self._get_question_options(next_field)
                 
-                await self.session_repo.append_messages(
-                    session_id=session.id, messages=[user_message, reply], user_id=user_id
-                )
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
-                return ChatResponse(
-                    session_id=session.id,
-                    reply=reply,
+                if next_field == "medical_treatment":
+                    # Concerns are settled by now, so the final product search can start
+                    # while the user answers the last questions.
+                    self.product_service.prefetch_products(onboarding_state["responses"], limit=10)
+                
+                return self._respond(
+                    turn, user_message, reply,
+                    onboarding_state=onboarding_state,
                     options=options,
                     question_type=question_type,
-                    isRegistered=is_registered,
+                    is_registered=is_registered,
                 )
             
-            # Onboarding is complete - check if we're waiting for login
+            # Onboarding is complete - check if we're waiting for login. Every exit below
+            # queues the onboarding state, so it is written once at the end of the turn.
             onboarding_state["complete"] = True
-            await self.session_repo.update_metadata(
-                session_id=session.id,
-                metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                user_id=user_id,
-            )
             
             # Check if we're waiting for login check (set after medical_treatment)
             # The frontend should call /useridLogin endpoint to check if user exists
             # If user exists, products will be shown automatically
-            session_metadata = session.metadata or {}
-            user_id = session_metadata.get("user_id")
             
             # If awaiting_login_check, continue to show products (login check happens via /useridLogin)
             if onboarding_state.get("awaiting_login_check"):
                 # Clear the flag and continue to product recommendations
                 onboarding_state["awaiting_login_check"] = False
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
             
             # Check if we need to ask about previous concerns (for returning users)
-            has_previous_sessions = session_metadata.get("has_previous_sessions", False)
             if has_previous_sessions and user_id and not onboarding_state.get("previous_concern_checked"):
                 # Get previous session's concerns and products
                 previous_data = await self._get_previous_session_concerns_and_products(user_id, session.id)
                 previous_concerns = previous_data.get("previous_concerns", [])
-                current_concerns = self._normalize_concerns(onboarding_state.get("responses", {}).get("concern", []))
+                current_concerns = self._current_concerns(onboarding_state.get("responses", {}))
                 
                 # Check if there's overlap between previous and current concerns
                 if previous_concerns and current_concerns:
-                    concerns_overlap = set(previous_concerns) & set(current_concerns)
+                    concerns_overlap = frozenset(current_concerns).intersection(previous_concerns)
                     if concerns_overlap:
                         # Same concerns are being repeated - ask if previous products helped
                         # Format concerns properly for display
-                        concern_labels = []
-                        for c in concerns_overlap:
-                            # Get proper label from CONCERN_QUESTIONS if available
-                            concern_info = self.CONCERN_QUESTIONS.get(c, {})
-                            label = concern_info.get("label", c.replace("_", " ").title())
-                            concern_labels.append(label.lower())
-                        
-                        concerns_text = ", ".join(concern_labels)
+                        concerns_text = ", ".join(
+                            self._CONCERN_LABELS.get(c, c.replace("_", " ").lower()) for c in concerns_overlap
+                        )
                         previous_products = previous_data.get("previous_products", [])
-                        products_text = ""
-                        if previous_products:
-                            products_text = f" (including {', '.join(previous_products[:2])})"
+                        products_text = (
+                            f" (including {', '.join(islice(previous_products, 2))})" if previous_products else ""
+                        )
                         
-                        question_message = (
-                            f"I notice you're still experiencing {concerns_text} concerns. "
-                            f"Having taken the previous recommended products{products_text}, has the issue been resolved? "
-                            f"Please answer yes or no."
+                        question_message = _PREV_CONCERN_TEMPLATE.format_map(
+                            {"concerns": concerns_text, "products": products_text}
                         )
                         
                         onboarding_state["previous_concern_checked"] = True
@@ -1027,69 +1743,37 @@ class ChatService:
                         onboarding_state["previous_concerns"] = list(concerns_overlap)
                         onboarding_state["previous_products"] = previous_products
                         
-                        await self.session_repo.update_metadata(
-                            session_id=session.id,
-                            metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                            user_id=user_id,
-                        )
-                        
                         question_reply = ChatMessage(role="assistant", content=question_message)
-                        options = [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ]
-                        
-                        await self.session_repo.append_messages(
-                            session_id=session.id, messages=[user_message, question_reply], user_id=user_id
-                        )
+                        options = _YES_NO_OPTIONS
                         
-                        return ChatResponse(
-                            session_id=session.id,
-                            reply=question_reply,
+                        return self._respond(
+                            turn, user_message, question_reply,
+                            onboarding_state=onboarding_state,
                             options=options,
                             question_type="yes_no",
-                            isRegistered=is_registered,
+                            is_registered=is_registered,
                         )
                 elif previous_concerns:
                     # User has previous concerns but current concerns are different - still ask
                     # Format concerns properly for display
-                    concern_labels = []
-                    for c in previous_concerns:
-                        concern_info = self.CONCERN_QUESTIONS.get(c, {})
-                        label = concern_info.get("label", c.replace("_", " ").title())
-                        concern_labels.append(label.lower())
-                    concerns_text = ", ".join(concern_labels)
-                    question_message = (
-                        f"I see you previously had concerns about {concerns_text}. "
-                        f"Have those issues been resolved? Please answer yes or no."
+                    concerns_text = ", ".join(
+                        self._CONCERN_LABELS.get(c, c.replace("_", " ").lower()) for c in previous_concerns
                     )
+                    question_message = _PREV_CONCERN_CHANGED_TEMPLATE.format_map({"concerns": concerns_text})
                     
                     onboarding_state["previous_concern_checked"] = True
                     onboarding_state["awaiting_previous_concern_response"] = True
                     onboarding_state["previous_concerns"] = previous_concerns
                     
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
-                    
                     question_reply = ChatMessage(role="assistant", content=question_message)
-                    options = [
-                        QuestionOption(value="yes", label="Yes"),
-                        QuestionOption(value="no", label="No"),
-                    ]
-                    
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message, question_reply], user_id=user_id
-                    )
+                    options = _YES_NO_OPTIONS
                     
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=question_reply,
+                    return self._respond(
+                        turn, user_message, question_reply,
+                        onboarding_state=onboarding_state,
                         options=options,
                         question_type="yes_no",
-                        isRegistered=is_registered,
+                        is_registered=is_registered,
                     )
                 else:
                     # No previous concerns found, mark as checked and proceed
@@ -1097,54 +1781,33 @@ class ChatService:
             
             # Check if we're waiting for response about previous concerns
             if onboarding_state.get("awaiting_previous_concern_response"):
-                user_response_lower = payload.message.strip().lower()
-                if user_response_lower in ["yes", "yep", "yeah", "y"]:
+                answer = self._yes_no_from_normalized(msg_lower)
+                if answer is True:
                     # Issue has been resolved - proceed normally
                     onboarding_state["previous_concern_resolved"] = True
                     onboarding_state["awaiting_previous_concern_response"] = False
-                elif user_response_lower in ["no", "nope", "nah", "n"]:
+                elif answer is False:
                     # Issue has NOT been resolved - store response and proceed with strong doctor recommendation
                     onboarding_state["previous_concern_resolved"] = False
                     onboarding_state["awaiting_previous_concern_response"] = False
                 else:
                     # Invalid response, ask again
-                    error_reply = ChatMessage(
-                        role="assistant",
-                        content="Please answer 'yes' or 'no'. Has the previous issue been resolved?"
-                    )
-                    options = [
-                        QuestionOption(value="yes", label="Yes"),
-                        QuestionOption(value="no", label="No"),
-                    ]
-                    await self.session_repo.append_messages(
-                        session_id=session.id, messages=[user_message, error_reply], user_id=user_id
-                    )
-                    await self.session_repo.update_metadata(
-                        session_id=session.id,
-                        metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                        user_id=user_id,
-                    )
-                    return ChatResponse(
-                        session_id=session.id,
-                        reply=error_reply,
+                    error_reply = ChatMessage(role="assistant", content=_PREVIOUS_CONCERN_ERROR)
+                    options = _YES_NO_OPTIONS
+                    return self._respond(
+                        turn, user_message, error_reply,
+                        onboarding_state=onboarding_state,
                         options=options,
                         question_type="yes_no",
-                        isRegistered=is_registered,
+                        is_registered=is_registered,
                     )
                 
-                # Update metadata with response and store user message
-                await self.session_repo.append_messages(
-                    session_id=session.id, messages=[user_message], user_id=user_id
-                )
-                await self.session_repo.update_metadata(
-                    session_id=session.id,
-                    metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                    user_id=user_id,
-                )
+                # Store the user message; the response is saved with the recommendation below
+                turn.add_messages(user_message)
                 # Continue to product recommendations below - DO NOT return here
             
             # Get product recommendations based on all onboarding responses
-            profile_context = onboarding_state.get("responses", {})
+            profile_context = self._profile_context(onboarding_state.get("responses", {}))
             
             # Get previous products to exclude them initially (but include with caution if no others found)
             previous_products = onboarding_state.get("previous_products", [])
@@ -1152,41 +1815,18 @@ class ChatService:
             previous_concerns = onboarding_state.get("previous_concerns", [])
             
             try:
-                # First, try to find products excluding previous ones (only if issue not resolved)
-                recommended_products, product_documents = await self.product_service.find_relevant_products(
-                    message=None,
-                    context=profile_context,
-                    limit=10,  # Get more products to filter from
-                    exclude_product_titles=previous_products if previous_concern_resolved is False else [],
+                recommended_products, product_documents = await self._find_recommended_products(
+                    profile_context, previous_products, previous_concern_resolved
                 )
-                
-                # If no products found and we have previous products, include them with caution
-                if not recommended_products and previous_products and previous_concern_resolved is False:
-                    # Get previous products with caution - search specifically for them
-                    recommended_products, product_documents = await self.product_service.find_relevant_products(
-                        message=None,
-                        context=profile_context,
-                        limit=3,
-                        include_product_titles=previous_products,  # Only get these specific products
-                    )
-                
-                # Always ensure we have products - if still none, get any products
-                if not recommended_products:
-                    recommended_products, product_documents = await self.product_service.find_relevant_products(
-                        message=None,
-                        context=profile_context,
-                        limit=3,
-                    )
             except Exception as e:
-                import logging
-                logging.error(f"Error finding products: {e}")
+                logger.exception("Error finding products: %s", e)
                 # Fallback if product search fails
                 recommended_products = []
                 product_documents = {}
             
             # Generate clinical, direct recommendation message
             # Pass previous concern info to add doctor recommendation if needed
-            recommendation_message = await self._format_product_recommendations(
+            recommendation_message, product_titles = await self._format_product_recommendations(
                 recommended_products,
                 profile_context,
                 product_documents,
@@ -1196,36 +1836,36 @@ class ChatService:
             )
             
             recommendation_reply = ChatMessage(role="assistant", content=recommendation_message)
-            await self.session_repo.append_messages(
-                session_id=session.id, messages=[recommendation_reply], user_id=user_id
-            )
             
             # Mark onboarding as complete and recommendations as shown
             # Store product titles in metadata for later retrieval
-            product_titles = [product.title for product in recommended_products]
             onboarding_state["complete"] = True
             onboarding_state["recommendations_shown"] = True
             onboarding_state["recommended_product_titles"] = product_titles
-            await self.session_repo.update_metadata(
-                session_id=session.id,
-                metadata={**(session.metadata or {}), "onboarding": onboarding_state},
-                user_id=user_id,
-            )
+            turn.patch_metadata({
+                "onboarding": onboarding_state,
+                "last_products": product_titles[:3],
+                "last_recommendation_text": recommendation_message,
+            })
             
-            return ChatResponse(
-                session_id=session.id,
-                reply=recommendation_reply,
-                options=None,
-                question_type=None,
-                isRegistered=is_registered,
-            )
+            return self._respond(turn, None, recommendation_reply, is_registered=is_registered)
 
-        profile_context = onboarding_state.get("responses", {})
-        combined_context = {**profile_context}
-        if payload.context:
-            combined_context.update(payload.context)
+        profile_context = self._profile_context(onboarding_state.get("responses", {}))
+        # Layer the request context over the profile without copying it; most turns
+        # carry no request context and use the profile as-is
+        combined_context = ChainMap(payload.context, profile_context) if payload.context else profile_context
 
-        trimmed_history = session.messages[-settings.max_history_turns * 2 :]
+        # Bounded window of recent turns; a limit of 0 means no history (a bare [-0:]
+        # slice would copy the whole conversation)
+        history_limit = settings.max_history_turns * 2
+        trimmed_history = session.messages[-history_limit:] if history_limit > 0 else []
+
+        # Same question with the same context and history: reuse the earlier reply and skip the LLM
+        reply_cache_key = _reply_cache_key(user_id or session.id, payload.message, combined_context, trimmed_history)
+        cached_reply = _REPLY_CACHE.get(reply_cache_key)
+        if cached_reply is not None:
+            assistant_message = ChatMessage(role="assistant", content=cached_reply)
+            return self._respond(turn, user_message, assistant_message, is_registered=is_registered)
 
         products, product_docs = await self.product_service.find_relevant_products(
             message=payload.message,
@@ -1239,7 +1879,8 @@ class ChatService:
                 system_prompt=settings.system_prompt,
                 history=trimmed_history,
                 user_message=payload.message,
-                context=combined_context,
+                # The prompt renders the context with str(), so hand over a plain dict
+                context=combined_context if isinstance(combined_context, dict) else dict(combined_context),
                 products=product_snippets,
             )
         except Exception as e:
@@ -1264,6 +1905,33 @@ class ChatService:
             raise
 
         assistant_message = ChatMessage(role="assistant", content=reply_text)
+        _REPLY_CACHE.put(reply_cache_key, reply_text)
+
+        # Update token usage in session metadata
+        if not usage_info or not isinstance(usage_info, dict):
+            logger.error("Invalid usage_info for session %s: %r", session.id, usage_info)
+        elif usage_info.get("input_tokens", 0) == 0 and usage_info.get("output_tokens", 0) == 0:
+            logger.warning(
+                "usage_info has zero tokens for session %s: %r. "
+                "This might indicate the OpenAI API didn't return usage data.",
+                session.id,
+                usage_info,
+            )
+        else:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Updating token usage for session %s, user_id: %s: input=%s output=%s total=%s cost=%.6f model=%s",
+                    session.id,
+                    user_id,
+                    usage_info.get("input_tokens"),
+                    usage_info.get("output_tokens"),
+                    usage_info.get("total_tokens"),
+                    usage_info.get("cost", 0),
+                    usage_info.get("model", "unknown"),
+                )
+            # The reply doesn't depend on the usage write, so it runs after the response is
+            # sent; _update_session_token_usage logs its own success or failure
+            _run_in_background(self._update_session_token_usage(session.id, usage_info, user_id))
 
         try:
             await self.session_repo.append_messages(
@@ -1279,73 +1947,7 @@ class ChatService:
                 }
             )
             # Log but don't fail the request - message was already generated
-            logger.warning(f"Failed to save messages to database: {e}")
-        
-        # Update token usage in session metadata (non-blocking)
-        # Always log to ensure we can see what's happening
-        print(f"[TOKEN_USAGE] Starting update for session {session.id}, user_id: {user_id}")
-        print(f"[TOKEN_USAGE] usage_info type: {type(usage_info)}, value: {usage_info}")
-        
-        # Validate usage_info has required fields
-        if not usage_info or not isinstance(usage_info, dict):
-            error_msg = f"Invalid usage_info for session {session.id}: {usage_info}"
-            print(f"[TOKEN_USAGE] ERROR: {error_msg}")
-            logger.error(error_msg)
-        elif usage_info.get("input_tokens", 0) == 0 and usage_info.get("output_tokens", 0) == 0:
-            warning_msg = (
-                f"usage_info has zero tokens for session {session.id}: {usage_info}. "
-                f"This might indicate the OpenAI API didn't return usage data."
-            )
-            print(f"[TOKEN_USAGE] WARNING: {warning_msg}")
-            logger.warning(warning_msg)
-        else:
-            info_msg = (
-                f"Updating token usage for session {session.id}, user_id: {user_id}, "
-                f"usage_info: input={usage_info.get('input_tokens')}, "
-                f"output={usage_info.get('output_tokens')}, "
-                f"total={usage_info.get('total_tokens')}, "
-                f"cost=${usage_info.get('cost', 0):.6f}, "
-                f"model={usage_info.get('model', 'unknown')}"
-            )
-            print(f"[TOKEN_USAGE] {info_msg}")
-            logger.info(info_msg)
-            try:
-                print(f"[TOKEN_USAGE] Calling _update_session_token_usage...")
-                result = await self._update_session_token_usage(session.id, usage_info, user_id)
-                print(f"[TOKEN_USAGE] _update_session_token_usage returned: {result}")
-                if result:
-                    success_msg = (
-                        f"✅ Successfully updated token usage for session {session.id}: "
-                        f"input={usage_info.get('input_tokens')}, "
-                        f"output={usage_info.get('output_tokens')}, "
-                        f"cost=${usage_info.get('cost', 0):.6f}"
-                    )
-                    print(f"[TOKEN_USAGE] SUCCESS: {success_msg}")
-                    logger.info(success_msg)
-                else:
-                    warning_msg = (
-                        f"⚠️ Token usage update returned False/None for session {session.id}, user_id: {user_id}. "
-                        f"Check logs above for details."
-                    )
-                    print(f"[TOKEN_USAGE] WARNING: {warning_msg}")
-                    logger.warning(warning_msg)
-            except Exception as e:
-                error_msg = f"❌ Failed to update token usage for session {session.id}: {e}"
-                print(f"[TOKEN_USAGE] EXCEPTION: {error_msg}")
-                print(f"[TOKEN_USAGE] Exception details: {type(e).__name__}: {str(e)}")
-                import traceback
-                print(f"[TOKEN_USAGE] Traceback: {traceback.format_exc()}")
-                log_error_with_context(
-                    e,
-                    context={
-                        "session_id": session.id,
-                        "user_id": user_id,
-                        "operation": "update_token_usage",
-                        "usage_info": usage_info,
-                    }
-                )
-                # Log but don't fail the request
-                logger.error(error_msg, exc_info=True)
+            logger.warning("Failed to save messages to database: %s", e)
 
         return ChatResponse(
             session_id=session.id,
@@ -1368,8 +1970,44 @@ class ChatService:
             "last_answer": state.get("last_answer"),
             "last_field": state.get("last_field"),
             "first_question_shown": bool(state.get("first_question_shown", False)),
+            "should_ask_previous_concern_followup": bool(state.get("should_ask_previous_concern_followup", False)),
+            "_major_concern_checked": bool(state.get("_major_concern_checked", False)),
         }
 
+    @staticmethod
+    def _respond(
+        turn: TurnContext,
+        user_message: ChatMessage | None,
+        reply: ChatMessage | None,
+        *,
+        onboarding_state: dict | None = None,
+        options: list[QuestionOption] | None = None,
+        question_type: str | None = None,
+        redirect_url: str | None = None,
+        is_registered: bool = False,
+    ) -> ChatResponse:
+        """Queue the turn's messages and onboarding state, then build the response."""
+        turn.add_messages(*(msg for msg in (user_message, reply) if msg is not None))
+        if onboarding_state is not None:
+            turn.patch_metadata({"onboarding": onboarding_state})
+        return ChatResponse(
+            session_id=turn.session_id,
+            reply=reply,
+            options=options,
+            question_type=question_type,
+            redirect_url=redirect_url,
+            isRegistered=is_registered,
+        )
+
+    @staticmethod
+    def _onboarding_flags(onboarding_state: dict) -> int:
+        """Pack the onboarding boolean flags into a bitmask."""
+        flags = 0
+        for key, bit in _ONBOARDING_FLAG_BITS:
+            if onboarding_state.get(key):
+                flags |= bit
+        return flags
+
     def _ordered_steps(self, responses: dict, has_previous_sessions: bool = False, 
                       should_ask_previous_concern_followup: bool = False) -> list[str]:
         """
@@ -1380,6 +2018,52 @@ class ChatService:
             has_previous_sessions: If True, skip name, email, gender for returning users (but always ask age)
             should_ask_previous_concern_followup: If True, add previous_concern_followup question before medical_treatment
         """
+        # Reduce responses to the few answers that branch the flow so the
+        # step list can be memoized on a small hashable signature.
+        for_whom = responses.get("for_whom") or ""
+        gender = (responses.get("gender") or "").lower()
+        if gender in _FEMALE_BRANCH_GENDERS:
+            gender_branch = "female"
+        elif gender == "male":
+            gender_branch = "male"
+        else:
+            gender_branch = ""
+        return list(self._compute_ordered_steps(
+            bool(has_previous_sessions),
+            bool(should_ask_previous_concern_followup),
+            for_whom == "family",
+            for_whom in _SELF_VALUES,
+            (responses.get("vitamin_count") or "").lower() in _VITAMIN_TAKER_COUNTS,
+            gender_branch,
+            (responses.get("conceive") or "").lower() == "yes",
+            tuple(self._current_concerns(responses)),
+            (responses.get("medical_conditions") or "").lower() in _STRICT_YES,
+            (responses.get("eating_habits") or "").lower() in _VEGETARIAN_HABITS,
+            (responses.get("drinks_alcohol") or "").lower() in _STRICT_YES,
+            "others" in (responses.get("allergies") or "").lower(),
+            (responses.get("new_product_request") or "").lower() == "yes",
+            (responses.get("medical_treatment") or "").lower() in _STRICT_YES,
+        ))
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _compute_ordered_steps(
+        has_previous_sessions: bool,
+        should_ask_previous_concern_followup: bool,
+        is_family: bool,
+        is_self: bool,
+        has_vitamins: bool,
+        gender_branch: str,
+        wants_to_conceive: bool,
+        concerns: tuple[str, ...],
+        has_medical_conditions: bool,
+        is_vegetarian: bool,
+        drinks_alcohol: bool,
+        has_other_allergies: bool,
+        wants_new_product: bool,
+        has_medical_treatment: bool,
+    ) -> tuple[str, ...]:
+        """Build the step sequence for a given set of branching answers."""
         steps = []
         
         # Skip name, email, gender for returning users (but always ask age)
@@ -1388,7 +2072,7 @@ class ChatService:
         
         steps.append("for_whom")
 
-        if (responses.get("for_whom") or "") == "family":
+        if is_family:
             steps.extend(["family_name", "relation"])
 
         # Age is always asked (even for returning users)
@@ -1396,33 +2080,30 @@ class ChatService:
 
         # For returning users who select "me", skip name, email, gender, knowledge, vitamin_count
         # and go directly to protein (after age)
-        if has_previous_sessions and (responses.get("for_whom") or "") in {"me", "self"}:
+        if has_previous_sessions and is_self:
             # Skip directly to protein question (age already added above)
             steps.append("protein")
         else:
             # For new users or family members, include all questions
             if not has_previous_sessions:
                 steps.extend(["email", "knowledge", "vitamin_count"])
-                if (responses.get("vitamin_count") or "").lower() in {"1 to 3", "4+"}:
+                if has_vitamins:
                     steps.append("vitamin_details")
             steps.append("protein")
             if not has_previous_sessions:
                 steps.append("gender")
         
-        # Get gender (either from current responses or pre-populated from previous session)
-        gender = (responses.get("gender") or "").lower()
-
-        if gender in {"woman", "female", "gender neutral"}:
+        # Gender comes from current responses or is pre-populated from a previous session
+        if gender_branch == "female":
             steps.append("conceive")
-            if (responses.get("conceive") or "").lower() == "yes":
+            if wants_to_conceive:
                 steps.append("situation")
-        elif gender == "male":
+        elif gender_branch == "male":
             steps.append("children")
 
         steps.append("concern")
-        concerns = self._normalize_concerns(responses.get("concern"))
-        if concerns:
-            steps.extend(self._concern_followup_steps(concerns))
+        # Follow-up questions are only expanded on a cache miss
+        steps.extend(ChatService._concern_followup_steps_cached(concerns))
         
         # Add lifestyle questions after concern questions
         steps.extend([
@@ -1430,7 +2111,7 @@ class ChatService:
             "medical_conditions",
         ])
         
-        if (responses.get("medical_conditions") or "").lower() in {"yes", "y", "yeah", "yep"}:
+        if has_medical_conditions:
             steps.append("medical_conditions_details")
         
         steps.extend([
@@ -1443,16 +2124,14 @@ class ChatService:
         ])
         
         # Conditional: meat and fish questions only if not vegetarian/vegan
-        eating_habits = (responses.get("eating_habits") or "").lower()
-        if eating_habits not in {"vegetarian", "vegan"}:
+        if not is_vegetarian:
             steps.extend(["meat_intake", "fish_intake"])
         
         # Alcohol filter question
         steps.append("drinks_alcohol")
         
         # Conditional: detailed alcohol questions only if drinks alcohol
-        drinks_alcohol = (responses.get("drinks_alcohol") or "").lower()
-        if drinks_alcohol in {"yes", "y", "yeah", "yep"}:
+        if drinks_alcohol:
             steps.extend(["alcohol_daily", "alcohol_weekly"])
         
         # Coffee and smoking
@@ -1460,7 +2139,7 @@ class ChatService:
         
         # Allergies, dietary preferences, and other questions
         steps.append("allergies")
-        if "others" in (responses.get("allergies") or "").lower():
+        if has_other_allergies:
             steps.append("allergies_other_details")
         
         steps.extend([
@@ -1472,7 +2151,7 @@ class ChatService:
             "new_product_request",
         ])
 
-        if (responses.get("new_product_request") or "").lower() == "yes":
+        if wants_new_product:
             steps.append("new_product_request_details")
         
         # Add previous_concern_followup question before medical_treatment if needed
@@ -1480,12 +2159,12 @@ class ChatService:
             steps.append("previous_concern_followup")
         
         steps.append("medical_treatment")
-        if (responses.get("medical_treatment") or "").lower() in {"yes", "y", "yeah", "yep"}:
+        if has_medical_treatment:
             steps.append("medical_treatment_details")
         steps.append("pre_recommendation_notes")
         # Final question before recommendations
         
-        return steps
+        return tuple(steps)
 
     def _build_prompt(self, field: str, responses: dict) -> str:
         labels = self._person_labels(responses)
@@ -1589,84 +2268,47 @@ class ChatService:
             return self.PROMPTS["previous_concern_followup"]
 
         # Handle lifestyle questions
-        lifestyle_fields = {
-            "lifestyle_status", "medical_conditions", "medical_conditions_details", "fruit_intake",
-            "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake",
-            "eating_habits", "meat_intake", "fish_intake", "drinks_alcohol",
-            "alcohol_daily", "alcohol_weekly", "coffee_intake", "smokes",
-            "allergies", "allergies_other_details", "dietary_preferences",
-            "sunlight_exposure", "iron_advised", "ayurveda_view", "new_product_attitude",
-            "new_product_request", "new_product_request_details", "medical_treatment",
-            "medical_treatment_details", "pre_recommendation_notes",
-        }
-        if field in lifestyle_fields:
+        if field in _LIFESTYLE_FIELDS:
             prompt_template = self.PROMPTS[field]
             # Format with name for personalized questions
             if "{name}" in prompt_template:
                 return prompt_template.format(name=name)
             # For family members, adjust the prompt with proper verb agreement
-            if is_family and field in {"lifestyle_status", "fruit_intake", "vegetable_intake", 
-                                       "medical_conditions", "medical_conditions_details",
-                                       "dairy_intake", "fiber_intake", "protein_intake",
-                                       "eating_habits", "meat_intake", "fish_intake",
-                                       "drinks_alcohol", "alcohol_daily", "alcohol_weekly",
-                                       "coffee_intake", "smokes", "allergies", 
-                                       "allergies_other_details", "dietary_preferences",
-                                       "sunlight_exposure", "iron_advised", "ayurveda_view",
-                                       "new_product_attitude", "new_product_request",
-                                       "new_product_request_details", "medical_treatment",
-                                       "medical_treatment_details", "pre_recommendation_notes"}:
-                import re
-                prompt = prompt_template
-                pronoun = labels.get("pronoun", "they")
-                
-                # Fix verb agreement: "do you" → "does {person}", "are you" → "is {person}"
-                prompt = re.sub(r'\bDo you\b', f'Does {person}', prompt, flags=re.IGNORECASE)
-                prompt = re.sub(r'\bdo you\b', f'does {person}', prompt, flags=re.IGNORECASE)
-                prompt = re.sub(r'\bAre you\b', f'Is {person}', prompt, flags=re.IGNORECASE)
-                prompt = re.sub(r'\bare you\b', f'is {person}', prompt, flags=re.IGNORECASE)
-                prompt = re.sub(r'\bHave you\b', f'Has {person}', prompt, flags=re.IGNORECASE)
-                prompt = re.sub(r'\bhave you\b', f'has {person}', prompt, flags=re.IGNORECASE)
-                
-                # Replace "your" with possessive first (before replacing "you")
-                prompt = re.sub(r'\byour\b', possessive, prompt, flags=re.IGNORECASE)
-                
-                # Replace "you" with person (but not if it's part of "your" which we already replaced)
-                prompt = re.sub(r'\byou\b', person, prompt, flags=re.IGNORECASE)
-                
-                # Fix verb forms after person name: "{person} eat" → "{person} eats"
-                verb_fixes = [
-                    (r'\beat\b', 'eats'),
-                    (r'\bdrink\b', 'drinks'),
-                    (r'\bconsume\b', 'consumes'),
-                    (r'\bsit\b', 'sits'),
-                    (r'\bsmoke\b', 'smokes'),
-                    (r'\bwant\b', 'wants'),
-                ]
-                for pattern, replacement in verb_fixes:
-                    # Replace verb after person name
-                    prompt = re.sub(rf'({re.escape(person)} {pattern})', f'{person} {replacement}', prompt, flags=re.IGNORECASE)
-                
-                # Special case: "{person} are" → "{person} is"
-                prompt = re.sub(rf'\b{re.escape(person)} are\b', f'{person} is', prompt, flags=re.IGNORECASE)
-                
-                # Fix "have" → "has" when it's the main verb (not "has been")
-                prompt = re.sub(rf'\b{re.escape(person)} have\b(?!\s+been)', f'{person} has', prompt, flags=re.IGNORECASE)
+            if is_family:
+                # "do you" → "Does {person}", "your" → possessive, "you" → person
+                def _second_person(match: re.Match) -> str:
+                    if match.group(1):
+                        return f"{_AUX_FOR_PERSON[match.group(1).lower()]} {person}"
+                    return possessive if match.group(2) else person
+
+                prompt = _SECOND_PERSON_RE.sub(_second_person, prompt_template)
                 
-                return prompt
+                # Fix verb forms after person name: "{person} eat" → "{person} eats",
+                # "{person} are" → "{person} is", "{person} have" → "{person} has"
+                return _person_verb_re(person).sub(
+                    lambda match: f"{person} {_THIRD_PERSON_VERBS[match.group(1).lower()]}", prompt
+                )
             return prompt_template
 
         prompt_template = self.PROMPTS[field]
         return prompt_template.format(name=name, hormones=hormones, family_name=person)
 
     @staticmethod
-    def _person_labels(responses: dict) -> dict:
-        name = responses.get("name") or "friend"
-        for_whom = responses.get("for_whom") or "self"
-        family_name = responses.get("family_name")
-        relation = responses.get("relation") or "family member"
-        gender = (responses.get("gender") or "").lower()
+    def _person_labels(responses: dict) -> MappingProxyType:
+        return ChatService._person_labels_cached(
+            responses.get("name") or "friend",
+            responses.get("for_whom") or "self",
+            responses.get("family_name"),
+            responses.get("relation") or "family member",
+            (responses.get("gender") or "").lower(),
+        )
 
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _person_labels_cached(
+        name: str, for_whom: str, family_name: str | None, relation: str, gender: str
+    ) -> MappingProxyType:
+        """Labels for addressing the quiz subject. Read-only, since the result is shared."""
         if for_whom == "family":
             is_family = True
             # Capitalize family name if provided
@@ -1691,19 +2333,8 @@ class ChatService:
                 pronoun_possessive = "his"
             else:
                 # Try to infer from relation
-                relation_lower = relation.lower() if relation else ""
-                if relation_lower in ["son", "brother", "father", "dad", "husband", "boyfriend"]:
-                    pronoun = "he"
-                    pronoun_obj = "him"
-                    pronoun_possessive = "his"
-                elif relation_lower in ["daughter", "sister", "mother", "mom", "wife", "girlfriend"]:
-                    pronoun = "she"
-                    pronoun_obj = "her"
-                    pronoun_possessive = "her"
-                else:
-                    pronoun = "they"
-                    pronoun_obj = "them"
-                    pronoun_possessive = "their"
+                pronoun = _RELATION_PRONOUNS.get(relation.lower() if relation else "", "they")
+                pronoun_obj, pronoun_possessive = _PRONOUN_FORMS[pronoun]
         else:
             person = "you"
             possessive = "your"
@@ -1713,7 +2344,7 @@ class ChatService:
             pronoun_obj = "you"
             pronoun_possessive = "your"
 
-        return {
+        return MappingProxyType({
             "name": name,
             "person": person,
             "possessive": possessive,
@@ -1724,367 +2355,74 @@ class ChatService:
             "pronoun_possessive": pronoun_possessive,
             "relation": relation,
             "family_name": family_name,
-        }
+        })
+
+    def _validate_age(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        if not val.isdigit():
+            return False, val, f"{name}, can you share your age as a number (e.g., 27)?"
+        age = int(val)
+        if age <= 0 or age > 100:
+            return False, val, f"{name}, that age feels off. Mind giving me a real number between 1 and 100?"
+        return True, str(age), ""
+
+    def _validate_email(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        if "@" in val and "." in val.split("@")[-1] and len(val) > 5:
+            return True, val, ""
+        return False, val, f"{name}, could you share a real email like youremail@example.com? Promise I’ll keep it safe."
+
+    def _validate_concern(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        parsed = self._parse_concerns(val)
+        if parsed:
+            return True, parsed, ""
+        return False, val, (
+            f"{name}, pick one or a few from: Sleep / Stress / Energy / Stomach & Intestines / "
+            "Skin / Resistance / Weight / Libido / Brain / Hair & nails / Fitness (Hormones if relevant). "
+            "You can separate choices with commas."
+        )
 
-    def _validate_response(self, field: str, raw_value: str, responses: dict) -> tuple[bool, Any, str]:
-        """Validate onboarding answers. Returns (valid, normalized_value, error_message)."""
+    def _validate_allergies(self, val: str, lowered: str, name: str, responses: dict) -> tuple[bool, Any, str]:
+        # Allow multiple allergies separated by commas; repeats collapse in order
+        mapped = [
+            _ALLERGIES_ALLOWED[token] for token in _ALLERGY_TOKEN_RE.findall(lowered) if token in _ALLERGIES_ALLOWED
+        ]
+        if mapped:
+            return True, ", ".join(dict.fromkeys(mapped)), ""
+        return False, val, f"{name}, pick from: No / Milk / Egg / Fish / Shellfish and crustaceans / Peanut / Nuts / Soy / Gluten / Wheat / Pollen / Others"
+
+    # One validator per field, built at import; the choice and length tables take precedence
+    _FIELD_VALIDATORS = MappingProxyType({
+        "age": _validate_age,
+        "email": _validate_email,
+        "concern": _validate_concern,
+        "allergies": _validate_allergies,
+        **{field: _min_length_rule(*rule) for field, rule in _MIN_LENGTH_FIELDS.items()},
+        **{field: _choice_rule(*choice) for field, choice in _CHOICE_FIELDS.items()},
+    })
+
+    def _validate_response(
+        self, field: str, raw_value: str, responses: dict, lowered: str | None = None
+    ) -> tuple[bool, Any, str]:
+        """
+        Validate onboarding answers. Returns (valid, normalized_value, error_message).
+        Callers that already casefolded the stripped answer pass it as `lowered`.
+        """
         val = raw_value.strip()
+        if lowered is None:
+            lowered = val.casefold()
         name = responses.get("name") or "friend"
 
-        if field == "name":
-            if len(val) < 2:
-                return False, val, "I want to remember you, can you share a name with at least 2 letters? 😊"
-            return True, val, ""
-
-        if field == "for_whom":
-            normalized = val.lower()
-            allowed = {
-                "me": "self",
-                "myself": "self",
-                "self": "self",
-                "for me": "self",
-                "no": "self",
-                "family": "family",
-                "family member": "family",
-                "for family": "family",
-                "for my family": "family",
-                "friend": "family",
-                "partner": "family",
-                "spouse": "family",
-                "yes": "family",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, "Is this for you or for a family member? Just say 'me' or 'family'."
-
-        if field == "family_name":
-            if len(val) < 2:
-                return False, val, "Tell me their name with at least 2 letters so I can personalize it. 😊"
-            return True, val, ""
-
-        if field == "relation":
-            if len(val) < 3:
-                return False, val, "How are you related? (e.g., spouse, parent, sibling, friend)"
-            return True, val, ""
-
-        if field == "age":
-            if not val.isdigit():
-                return False, val, f"{name}, can you share your age as a number (e.g., 27)?"
-            age = int(val)
-            if age <= 0 or age > 100:
-                return False, val, f"{name}, that age feels off. Mind giving me a real number between 1 and 100?"
-            return True, str(age), ""
-
-        if field == "protein":
-            normalized = val.lower()
-            yes_set = {"yes", "y", "yeah", "yep", "sure", "taking", "i do"}
-            no_set = {"no", "n", "nope", "nah", "not"}
-            if normalized in yes_set:
-                return True, "yes", ""
-            if normalized in no_set:
-                return True, "no", ""
-            return False, val, f"{name}, just a quick yes or no, are you taking protein powder or shakes right now?"
-
-        if field == "knowledge":
-            normalized = val.lower()
-            allowed = {
-                "well informed": "well informed",
-                "well-informed": "well informed",
-                "informed": "well informed",
-                "curious": "curious",
-                "skeptical": "skeptical",
-                "sceptical": "skeptical",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, choose one: Well informed, Curious, or Skeptical."
-
-        if field == "vitamin_count":
-            normalized = val.lower()
-            allowed = {
-                "no": "0",
-                "none": "0",
-                "0": "0",
-                "1": "1 to 3",
-                "2": "1 to 3",
-                "3": "1 to 3",
-                "1 to 3": "1 to 3",
-                "1-3": "1 to 3",
-                "4": "4+",
-                "4+": "4+",
-                "5": "4+",
-                "5+": "4+",
-                "many": "4+",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: No, 1 to 3, or 4+."
-        
-        if field == "vitamin_details":
-            if len(val) < 3:
-                return False, val, "Please share the supplement names and dosage details if possible."
-            return True, val, ""
-
-        if field == "gender":
-            normalized = val.lower()
-            allowed = {
-                "male": "male",
-                "man": "male",
-                "m": "male",
-                "woman": "female",
-                "women": "female",
-                "female": "female",
-                "f": "female",
-                "gender neutral": "gender neutral",
-                "neutral": "gender neutral",
-                "non-binary": "gender neutral",
-                "nonbinary": "gender neutral",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, choose one: male, woman, or gender neutral."
-
-        if field == "conceive":
-            normalized = val.lower()
-            if normalized in {"yes", "y", "yeah", "yep"}:
-                return True, "yes", ""
-            if normalized in {"no", "n", "nope", "nah"}:
-                return True, "no", ""
-            return False, val, f"{name}, a simple yes or no works, are you pregnant or breastfeeding?"
-
-        if field == "situation":
-            normalized = val.lower()
-            allowed = {
-                "to get pregnant in the next 2 years": "planning (2 years)",
-                "planning": "planning (2 years)",
-                "next 2 years": "planning (2 years)",
-                "i am pregnant now": "pregnant",
-                "pregnant": "pregnant",
-                "breastfeeding": "breastfeeding",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: To get pregnant in the next 2 years / I am pregnant now / Breastfeeding."
-
-        if field == "children":
-            normalized = val.lower()
-            if normalized in {"yes", "y", "yeah", "yep"}:
-                return True, "yes", ""
-            if normalized in {"no", "n", "nope", "nah"}:
-                return True, "no", ""
-            return False, val, f"{name}, just a yes or no, planning for kids in the coming years?"
-
-        if field == "email":
-            if "@" in val and "." in val.split("@")[-1] and len(val) > 5:
-                return True, val, ""
-            return False, val, f"{name}, could you share a real email like youremail@example.com? Promise I’ll keep it safe."
-
-        if field == "concern":
-            options = {
-                "sleep",
-                "stress",
-                "energy",
-                "stomach & intestines",
-                "stomach",
-                "intestines",
-                "skin",
-                "resistance",
-                "weight",
-                "libido",
-                "brain",
-                "hair & nails",
-                "hair",
-                "nails",
-                "fitness",
-                "hormones",
-            }
-            parsed = self._parse_concerns(val)
-            if parsed:
-                return True, parsed, ""
-            return False, val, (
-                f"{name}, pick one or a few from: Sleep / Stress / Energy / Stomach & Intestines / "
-                "Skin / Resistance / Weight / Libido / Brain / Hair & nails / Fitness (Hormones if relevant). "
-                "You can separate choices with commas."
-            )
+        validator = self._FIELD_VALIDATORS.get(field)
+        if validator is not None:
+            return validator(self, val, lowered, name, responses)
 
         parsed_concern_question = self._parse_concern_field(field)
         if parsed_concern_question:
+            if val:
+                return True, val, ""
             concern_key, question_id = parsed_concern_question
             question = self._question_by_key(concern_key, question_id, responses)
             label = self.CONCERN_QUESTIONS.get(concern_key, {}).get("label", concern_key.title())
-            if not val:
-                return False, val, f"Quick one about {label}: {question or 'can you share a short answer?'}"
-            return True, val, ""
-
-        # Lifestyle question validations
-        if field == "lifestyle_status":
-            normalized = val.lower()
-            allowed = {
-                "been doing well for a long time": "been doing well for a long time",
-                "doing well": "been doing well for a long time",
-                "nice on the way": "nice on the way",
-                "on the way": "nice on the way",
-                "ready to start": "ready to start",
-                "starting": "ready to start",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: Been doing well for a long time / Nice on the way / Ready to start"
-
-        if field in {"fruit_intake", "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake"}:
-            normalized = val.lower()
-            allowed = {
-                "hardly": "hardly",
-                "rarely": "hardly",
-                "seldom": "hardly",
-                "one time": "one time",
-                "once": "one time",
-                "1": "one time",
-                "twice or more": "twice or more",
-                "twice": "twice or more",
-                "2": "twice or more",
-                "more": "twice or more",
-                "multiple": "twice or more",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: Hardly / One time / Twice or more"
-
-        if field == "eating_habits":
-            normalized = val.lower()
-            allowed = {
-                "no preference": "no preference",
-                "none": "no preference",
-                "flexitarian": "flexitarian",
-                "vegetarian": "vegetarian",
-                "veg": "vegetarian",
-                "vegan": "vegan",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: No preference / Flexitarian / Vegetarian / Vegan"
-
-        if field in {"meat_intake", "fish_intake"}:
-            normalized = val.lower()
-            allowed = {
-                "never": "never",
-                "no": "never",
-                "once or twice": "once or twice",
-                "once": "once or twice",
-                "twice": "once or twice",
-                "1-2": "once or twice",
-                "three times or more": "three times or more",
-                "three": "three times or more",
-                "3": "three times or more",
-                "more": "three times or more",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: Never / Once or twice / Three times or more"
-
-        if field in {"drinks_alcohol", "alcohol_daily", "alcohol_weekly", "coffee_intake", "smokes", "sunlight_exposure", "iron_advised", "medical_treatment", "previous_concern_followup", "new_product_request", "medical_conditions"}:
-            normalized = val.lower()
-            if normalized in {"yes", "y", "yeah", "yep", "sure"}:
-                return True, "yes", ""
-            if normalized in {"no", "n", "nope", "nah", "not"}:
-                return True, "no", ""
-            return False, val, f"{name}, just a quick yes or no works here."
-
-        if field == "allergies":
-            normalized = val.lower()
-            allowed = {
-                "no": "no",
-                "none": "no",
-                "milk": "milk",
-                "egg": "egg",
-                "eggs": "egg",
-                "fish": "fish",
-                "shellfish and crustaceans": "shellfish and crustaceans",
-                "shellfish": "shellfish and crustaceans",
-                "crustaceans": "shellfish and crustaceans",
-                "peanut": "peanut",
-                "peanuts": "peanut",
-                "nuts": "nuts",
-                "soy": "soy",
-                "gluten": "gluten",
-                "wheat": "wheat",
-                "pollen": "pollen",
-                "others": "others",
-                "other": "others",
-            }
-            # Allow multiple allergies separated by commas
-            if "," in normalized:
-                parts = [part.strip() for part in normalized.split(",")]
-                valid_parts = []
-                for part in parts:
-                    if part in allowed:
-                        valid_parts.append(allowed[part])
-                if valid_parts:
-                    return True, ", ".join(valid_parts), ""
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick from: No / Milk / Egg / Fish / Shellfish and crustaceans / Peanut / Nuts / Soy / Gluten / Wheat / Pollen / Others"
-
-        if field in {"medical_conditions_details", "allergies_other_details", "medical_treatment_details", "pre_recommendation_notes"}:
-            if len(val) < 3:
-                return False, val, "Please share a bit more detail so I can keep you safe."
-            return True, val, ""
-
-        if field == "dietary_preferences":
-            normalized = val.lower()
-            allowed = {
-                "no preference": "no preference",
-                "none": "no preference",
-                "lactose-free": "lactose-free",
-                "lactose free": "lactose-free",
-                "gluten free": "gluten free",
-                "gluten-free": "gluten free",
-                "paleo": "paleo",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: No preference / Lactose-free / Gluten free / Paleo"
-
-        if field == "ayurveda_view":
-            normalized = val.lower()
-            allowed = {
-                "i am convinced": "i am convinced",
-                "convinced": "i am convinced",
-                "we can learn a lot from ancient medicine": "we can learn a lot from ancient medicine",
-                "learn from ancient medicine": "we can learn a lot from ancient medicine",
-                "ancient medicine": "we can learn a lot from ancient medicine",
-                "i am open to it": "i am open to it",
-                "open to it": "i am open to it",
-                "open": "i am open to it",
-                "more information needed for an opinion": "more information needed for an opinion",
-                "need more information": "more information needed for an opinion",
-                "i am skeptical": "i am skeptical",
-                "skeptical": "i am skeptical",
-                "alternative medicine is nonsense": "alternative medicine is nonsense",
-                "nonsense": "alternative medicine is nonsense",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: I am convinced / We can learn a lot from ancient medicine / I am open to it / More information needed for an opinion / I am skeptical / Alternative medicine is nonsense"
-
-        if field == "new_product_attitude":
-            normalized = val.lower()
-            allowed = {
-                "to be the first": "to be the first",
-                "first": "to be the first",
-                "you are at the forefront of new products": "you are at the forefront of new products",
-                "forefront": "you are at the forefront of new products",
-                "learn more": "learn more",
-                "you are cautiously optimistic": "you are cautiously optimistic",
-                "cautiously optimistic": "you are cautiously optimistic",
-                "waiting for now": "waiting for now",
-                "waiting": "waiting for now",
-                "scientific research takes time": "scientific research takes time",
-                "research takes time": "scientific research takes time",
-            }
-            if normalized in allowed:
-                return True, allowed[normalized], ""
-            return False, val, f"{name}, pick one: To be the first / You are at the forefront of new products / Learn more / You are cautiously optimistic / Waiting for now / Scientific research takes time"
+            return False, val, f"Quick one about {label}: {question or 'can you share a short answer?'}"
 
         return True, val, ""
 
@@ -2097,407 +2435,348 @@ class ChatService:
         Analyzes the context and severity to provide appropriate responses.
         Personalizes for family members when applicable.
         """
-        answer_lower = str(answer).lower()
+        answer = str(answer)
+        # Fields without a handler can only get the generic "yes" reply
+        if (
+            field not in self._ACK_HANDLERS
+            and not field.startswith("concern|")
+            and answer.lower() not in _GENERIC_ACK_ANSWERS
+        ):
+            return None
         labels = self._person_labels(responses)
-        is_family = labels.get("is_family", False)
-        person = labels.get("person", "you")
-        pronoun = labels.get("pronoun", "you")
-        pronoun_obj = labels.get("pronoun_obj", "you")
-        pronoun_possessive = labels.get("pronoun_possessive", "your")
-        reference = labels.get("reference", "you")
-        
-        # Check if this is a concern detail question (e.g., "concern|sleep|fall_asleep")
-        concern_detail = self._parse_concern_field(field)
-        if concern_detail:
-            concern_key, question_id = concern_detail
-            
-            # Sleep-related concern details
-            if concern_key == "sleep":
-                # Severe sleep issues
-                if any(term in answer_lower for term in ["less than 5", "less than 7", "still tired", "tired", "exhausted", "drained"]):
-                    is_pregnant = responses.get("situation", "").lower() in ["pregnant", "i am pregnant now"]
-                    if is_pregnant:
-                        return "I understand how difficult this must be, especially during pregnancy. Sleep is so important for both you and your baby. Let's find safe, natural solutions to help you get the rest you need. You're doing the right thing by addressing this! 🌙💕"
-                    return "I completely understand how challenging this is. Getting enough quality sleep is crucial for your wellbeing. Let's work together to find solutions that will help you feel more rested and refreshed. You're taking an important step! 🌙"
-                
-                # Difficulty falling asleep
-                if question_id == "fall_asleep" and answer_lower in ["yes", "yep", "yeah"]:
-                    return "I know how frustrating it can be when sleep doesn't come easily. We'll find ways to help you relax and drift off more naturally. You're not alone in this! 😴"
-                
-                # Not feeling refreshed
-                if question_id == "wake_refreshed" and "tired" in answer_lower:
-                    return "Waking up still tired can really affect your whole day. Let's find solutions to help you get more restorative sleep so you wake up feeling refreshed and ready. We'll get there! ☀️"
-            
-            # Energy-related concern details
-            if concern_key == "energy":
-                # Severe energy issues
-                if any(term in answer_lower for term in ["totally gone", "gone", "sleepy", "tired", "exhausted", "drained", "low", "very low"]):
-                    is_pregnant = responses.get("situation", "").lower() in ["pregnant", "i am pregnant now"]
-                    if is_pregnant:
-                        return "I know energy can be really challenging during pregnancy. Your body is doing amazing work, and it's completely normal to feel drained. Let's find safe, natural ways to support your energy levels. You're doing great! ⚡💕"
-                    return "I hear you on the energy front. Feeling drained can make everything harder. Let's find natural ways to boost your vitality and help you feel more energized throughout the day. We'll work on this together! ⚡"
-                
-                # Energy completely gone
-                if "totally gone" in answer_lower or "gone" in answer_lower:
-                    return "I understand how exhausting that must feel. When your energy is completely depleted, it affects everything. Let's find solutions to help restore your natural energy and vitality. You've got this! 💪"
-        
-        # Name - warm welcome
-        if field == "name":
-            return f"Nice to meet you, {answer}! I'm so glad you're here. I'm excited to help you on your wellness journey. Let's get started! 😊"
-        
-        # Pregnancy - congratulations regardless of gender (supporting partner/family)
-        # Check "situation" field for detailed pregnancy status (this is where we show specific messages)
-        if field == "situation":
-            if "pregnant" in answer_lower or answer_lower == "i am pregnant now":
-                return "Congratulations in advance! That's such wonderful news. I'm here to help you find the best supplements to support your journey. Let's make sure everything is perfect for you! 💕"
-            elif "planning" in answer_lower or "2 years" in answer_lower or "to get pregnant" in answer_lower:
-                return "That's exciting that you're planning for this journey! I'm here to help you prepare your body with the right supplements. Let's get you ready for this beautiful chapter! 🌟"
-            elif "breastfeeding" in answer_lower:
-                return "That's amazing! Breastfeeding is such a special time. I'll help you find supplements that are safe and beneficial for both you and your little one. You're doing great! 💕"
-        
-        # For "conceive" field (initial yes/no), just acknowledge without congratulating yet
-        # We'll congratulate after they specify their situation
-        if field == "conceive" and answer_lower in ["yes", "yep", "yeah"]:
-            return "Thanks for sharing that with me. I'll help you find the right supplements for your situation. Let's continue! 😊"
-        
-        # Legacy "pregnant" field support
-        if field == "pregnant":
-            if "pregnant" in answer_lower or answer_lower in ["yes", "yep", "yeah", "i am pregnant now"]:
-                return "Congratulations in advance! That's such wonderful news. I'm here to help you find the best supplements to support your journey. Let's make sure everything is perfect for you! 💕"
-            elif "planning" in answer_lower or "2 years" in answer_lower:
-                return "That's exciting that you're planning for this journey! I'm here to help you prepare your body with the right supplements. Let's get you ready for this beautiful chapter! 🌟"
-            elif "breastfeeding" in answer_lower:
-                return "That's amazing! Breastfeeding is such a special time. I'll help you find supplements that are safe and beneficial for both you and your little one. You're doing great! 💕"
-        
-        # Sleep issues - supportive and reassuring (check both string and list)
+        concerns_text: str | None = ""
         if field == "concern":
-            concerns_list = responses.get("concern", [])
-            if isinstance(concerns_list, str):
-                concerns_list = [concerns_list]
-            concerns_text = " ".join(concerns_list).lower() if isinstance(concerns_list, list) else answer_lower
-            
-            if "sleep" in concerns_text or "sleep" in answer_lower:
-                if is_family:
-                    return f"I completely understand how challenging lack of sleep can be for {person}. No worries, we'll handle this together and find solutions that work for {pronoun_obj}. {person.title()}'s taking the right step by addressing this! 🌙"
-                return "I completely understand how challenging lack of sleep can be. No worries, we'll handle this together and find solutions that work for you. You're taking the right step by addressing this! 🌙"
-            
-            # Energy issues - motivating
-            if any(term in concerns_text or term in answer_lower for term in ["energy", "tired", "fatigue", "exhausted", "drained"]):
-                if is_family:
-                    return f"I hear you on the energy front for {person}. Let's get {pronoun_obj} feeling more energized and vibrant! We'll find the right support to boost {pronoun_possessive} vitality. {person.title()}'s got this! ⚡"
-                return "I hear you on the energy front. Let's get you feeling more energized and vibrant! We'll find the right support to boost your vitality. You've got this! ⚡"
-            
-            # Stress/Anxiety - supportive
-            if any(term in concerns_text or term in answer_lower for term in ["stress", "anxiety", "worried", "overwhelmed"]):
-                if is_family:
-                    return f"Stress and anxiety can be really tough to deal with. {person.title()} is not alone in this, and I'm here to help {pronoun_obj} find natural ways to feel more calm and balanced. We'll work through this together. 💙"
-                return "Stress and anxiety can be really tough to deal with. You're not alone in this, and I'm here to help you find natural ways to feel more calm and balanced. We'll work through this together. 💙"
+            concern_value = responses.get("concern", [])
+            if isinstance(concern_value, str):
+                concerns_text = concern_value.lower()
+            elif isinstance(concern_value, list):
+                concerns_text = " ".join(concern_value).lower()
+            else:
+                concerns_text = None
+        return self._ack_core(
+            field,
+            answer,
+            (responses.get("situation") or "").lower() in _PREGNANT_SITUATIONS,
+            concerns_text,
+            labels.get("is_family", False),
+            labels.get("person", "you"),
+            labels.get("pronoun_obj", "you"),
+            labels.get("pronoun_possessive", "your"),
+        )
+
+    @staticmethod
+    def _family_slots(person: str, pronoun_obj: str, pronoun_possessive: str) -> dict[str, str]:
+        """Values for the family acknowledgment templates."""
+        return {
+            "person": person,
+            "person_title": person.title(),
+            "pronoun_obj": pronoun_obj,
+            "pronoun_possessive": pronoun_possessive,
+        }
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _ack_core(
+        field: str,
+        answer: str,
+        is_pregnant: bool,
+        concerns_text: str | None,
+        is_family: bool,
+        person: str,
+        pronoun_obj: str,
+        pronoun_possessive: str,
+    ) -> str | None:
+        """
+        Acknowledgment for an answer, keyed only on the profile values it reads.
+        concerns_text is the lowercased stored concern answer (None if it is
+        neither a string nor a list) and is only filled in for the "concern" field.
+        """
+        answer_lower = answer.lower()
+        if field.startswith("concern|"):
+            handler = ChatService._ack_concern_detail
+        else:
+            handler = ChatService._ACK_HANDLERS.get(field)
+        if handler is not None:
+            acknowledgment = handler(
+                _AckInput(
+                    field, answer, answer_lower, is_pregnant, concerns_text,
+                    is_family, person, pronoun_obj, pronoun_possessive,
+                )
+            )
+            if acknowledgment is not None:
+                return acknowledgment
+
+        if answer_lower in _GENERIC_ACK_ANSWERS:
+            # Don't use generic "yes" acknowledgment for concerning health questions
+            if field and _SENSITIVE_FIELD_RE.search(field.lower()):
+                return None  # Let more specific acknowledgments handle these
+            return "Perfect! Thanks for sharing that with me. I'm here to help you every step of the way. Let's continue! 😊"
+        
+        # General acknowledgment for any answer (fallback)
+        return None
+
+    @staticmethod
+    def _ack_concern_detail(ack: _AckInput) -> str | None:
+        """Concern follow-up questions, e.g. "concern|sleep|fall_asleep"."""
+        field = ack.field
+        answer_lower = ack.answer_lower
+        is_pregnant = ack.is_pregnant
+        concern_detail = ChatService._parse_concern_field(field)
+        if not concern_detail:
+            return None
+        concern_key, question_id = concern_detail
+        
+        # Sleep-related concern details
+        if concern_key == "sleep":
+            # Severe sleep issues
+            if _SEVERE_SLEEP_RE.search(answer_lower):
+                if is_pregnant:
+                    return "I understand how difficult this must be, especially during pregnancy. Sleep is so important for both you and your baby. Let's find safe, natural solutions to help you get the rest you need. You're doing the right thing by addressing this! 🌙💕"
+                return "I completely understand how challenging this is. Getting enough quality sleep is crucial for your wellbeing. Let's work together to find solutions that will help you feel more rested and refreshed. You're taking an important step! 🌙"
             
-            # Skin concerns - encouraging
-            if any(term in concerns_text or term in answer_lower for term in ["skin", "acne", "pimples", "dry", "sensitive"]):
-                return "I understand skin concerns can affect your confidence. Let's work together to find products that will help your skin glow and feel its best. You deserve to feel great in your own skin! ✨"
+            # Difficulty falling asleep
+            if question_id == "fall_asleep" and answer_lower in _ACK_YES:
+                return "I know how frustrating it can be when sleep doesn't come easily. We'll find ways to help you relax and drift off more naturally. You're not alone in this! 😴"
             
-            # Weight/Health goals - motivating
-            if any(term in concerns_text or term in answer_lower for term in ["weight", "fitness", "health", "wellness"]):
-                return "That's fantastic that you're focused on your health goals! I'm excited to help you on this journey. Together, we'll find the perfect supplements to support your wellness. Let's do this! 💪"
+            # Not feeling refreshed
+            if question_id == "wake_refreshed" and "tired" in answer_lower:
+                return "Waking up still tired can really affect your whole day. Let's find solutions to help you get more restorative sleep so you wake up feeling refreshed and ready. We'll get there! ☀️"
+        
+        # Energy-related concern details
+        if concern_key == "energy":
+            # Severe energy issues
+            if _LOW_ENERGY_RE.search(answer_lower):
+                if is_pregnant:
+                    return "I know energy can be really challenging during pregnancy. Your body is doing amazing work, and it's completely normal to feel drained. Let's find safe, natural ways to support your energy levels. You're doing great! ⚡💕"
+                return "I hear you on the energy front. Feeling drained can make everything harder. Let's find natural ways to boost your vitality and help you feel more energized throughout the day. We'll work on this together! ⚡"
             
-            # General concern acknowledgment if no specific match
-            if concerns_list or answer_lower not in ["no", "none", "nope", "nah"]:
-                return "I understand your concerns, and I'm here to help you address them. Let's work together to find the right solutions for you. You're taking a great step towards better health! 💚"
-        
-        # Medical treatment - supportive and careful (especially important if pregnant)
-        if field == "medical_treatment" and answer_lower in ["yes", "yep", "yeah"]:
-            is_pregnant = responses.get("situation", "").lower() in ["pregnant", "i am pregnant now"]
-            if is_pregnant:
-                return "Thank you for sharing that with me. I really appreciate your honesty, especially during this special time. We'll be extra careful with recommendations and make sure everything is safe for both you and your baby. Your health is our top priority. 🏥💕"
-            return "Thank you for sharing that with me. I really appreciate your honesty. We'll be extra careful with recommendations and make sure everything is safe for you. Your health is our top priority. 🏥"
-        
-        # Allergies - reassuring
-        if field == "allergies" and answer_lower not in ["no", "none", "nope", "nah"]:
-            return "Thanks for letting me know about your allergies. I'll make absolutely sure to recommend only products that are completely safe for you. Your safety comes first, always! 🛡️"
-        
-        # Dietary preferences - positive
-        if field == "eating_habits" and answer_lower in ["vegetarian", "vegan"]:
-            if is_family:
-                return f"That's wonderful! I respect {person}'s dietary choices completely. I'll make sure all recommendations align perfectly with {pronoun_possessive} values. Let's find the best plant-based support for {pronoun_obj}! 🌱"
-            return "That's wonderful! I respect your dietary choices completely. I'll make sure all recommendations align perfectly with your values. Let's find the best plant-based support for you! 🌱"
-        
-        # Gender - welcoming and inclusive
-        if field == "gender":
-            return "Perfect! Thanks for sharing that with me. This helps me personalize recommendations just for you. Let's continue! 😊"
+            # Energy completely gone
+            if "totally gone" in answer_lower or "gone" in answer_lower:
+                return "I understand how exhausting that must feel. When your energy is completely depleted, it affects everything. Let's find solutions to help restore your natural energy and vitality. You've got this! 💪"
+        return None
+
+    @staticmethod
+    def _ack_name(ack: _AckInput) -> str | None:
+        answer = ack.answer
+        return f"Nice to meet you, {answer}! I'm so glad you're here. I'm excited to help you on your wellness journey. Let's get started! 😊"
+
+    @staticmethod
+    def _ack_situation(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        if "pregnant" in answer_lower or answer_lower == "i am pregnant now":
+            return "Congratulations in advance! That's such wonderful news. I'm here to help you find the best supplements to support your journey. Let's make sure everything is perfect for you! 💕"
+        elif "planning" in answer_lower or "2 years" in answer_lower or "to get pregnant" in answer_lower:
+            return "That's exciting that you're planning for this journey! I'm here to help you prepare your body with the right supplements. Let's get you ready for this beautiful chapter! 🌟"
+        elif "breastfeeding" in answer_lower:
+            return "That's amazing! Breastfeeding is such a special time. I'll help you find supplements that are safe and beneficial for both you and your little one. You're doing great! 💕"
+        return None
+
+    @staticmethod
+    def _ack_conceive(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        # Just acknowledge without congratulating yet; that happens once they specify their situation
+        if answer_lower in _ACK_YES:
+            return "Thanks for sharing that with me. I'll help you find the right supplements for your situation. Let's continue! 😊"
+        return None
+
+    @staticmethod
+    def _ack_pregnant(ack: _AckInput) -> str | None:
+        """Legacy "pregnant" field support."""
+        answer_lower = ack.answer_lower
+        if "pregnant" in answer_lower or answer_lower in _ACK_YES:
+            return "Congratulations in advance! That's such wonderful news. I'm here to help you find the best supplements to support your journey. Let's make sure everything is perfect for you! 💕"
+        elif "planning" in answer_lower or "2 years" in answer_lower:
+            return "That's exciting that you're planning for this journey! I'm here to help you prepare your body with the right supplements. Let's get you ready for this beautiful chapter! 🌟"
+        elif "breastfeeding" in answer_lower:
+            return "That's amazing! Breastfeeding is such a special time. I'll help you find supplements that are safe and beneficial for both you and your little one. You're doing great! 💕"
+        return None
+
+    @staticmethod
+    def _ack_concern(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        concerns_text = ack.concerns_text
+        is_family = ack.is_family
+        person = ack.person
+        pronoun_obj = ack.pronoun_obj
+        pronoun_possessive = ack.pronoun_possessive
+        scanned_text = concerns_text if concerns_text is not None else answer_lower
+        # One scan over both texts; no keyword spans the newline between them
+        hits = {
+            _CONCERN_CATEGORY_KEYWORDS[match.group(1)]
+            for match in _CONCERN_CATEGORY_RE.finditer(f"{scanned_text}\n{answer_lower}")
+        }
+        category = next((name for name in _CONCERN_CATEGORY_ORDER if name in hits), None)
         
-        # Age-related concerns - supportive
-        if field == "age":
-            try:
-                age = int(answer)
-                if age < 18:
-                    return "Thanks for sharing your age! I'll make sure all recommendations are age-appropriate and safe for you. Let's find the perfect supplements for your stage of life! 🌟"
-                elif age >= 50:
-                    return "I appreciate you sharing your age. This helps me recommend products that are specifically beneficial for your life stage. Let's focus on keeping you healthy and vibrant! 💫"
-                else:
-                    return "Thanks for sharing! This helps me tailor recommendations that are perfect for your age group. Let's continue! 😊"
-            except (ValueError, TypeError):
-                pass
+        if category is not None:
+            own_text, family_template = _CONCERN_ACK_TEMPLATES[category]
+            if is_family and family_template:
+                return family_template.format_map(
+                    ChatService._family_slots(person, pronoun_obj, pronoun_possessive)
+                )
+            return own_text
         
-        # Positive health status - celebrating
-        if field == "health_status" and any(term in answer_lower for term in ["good", "great", "excellent", "fine", "well"]):
+        # General concern acknowledgment if no specific match
+        if concerns_text or answer_lower not in _ACK_NO_OR_NONE:
+            return "I understand your concerns, and I'm here to help you address them. Let's work together to find the right solutions for you. You're taking a great step towards better health! 💚"
+        return None
+
+    @staticmethod
+    def _ack_medical_treatment(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        is_pregnant = ack.is_pregnant
+        if answer_lower not in _ACK_YES:
+            return None
+        if is_pregnant:
+            return "Thank you for sharing that with me. I really appreciate your honesty, especially during this special time. We'll be extra careful with recommendations and make sure everything is safe for both you and your baby. Your health is our top priority. 🏥💕"
+        return "Thank you for sharing that with me. I really appreciate your honesty. We'll be extra careful with recommendations and make sure everything is safe for you. Your health is our top priority. 🏥"
+
+    @staticmethod
+    def _ack_allergies(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        if answer_lower not in _ACK_NO_OR_NONE:
+            return "Thanks for letting me know about your allergies. I'll make absolutely sure to recommend only products that are completely safe for you. Your safety comes first, always! 🛡️"
+        return None
+
+    @staticmethod
+    def _ack_eating_habits(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        is_family = ack.is_family
+        person = ack.person
+        pronoun_obj = ack.pronoun_obj
+        pronoun_possessive = ack.pronoun_possessive
+        if answer_lower not in _VEGETARIAN_HABITS:
+            return None
+        if is_family:
+            return _PLANT_BASED_FAMILY_ACK.format_map(
+                ChatService._family_slots(person, pronoun_obj, pronoun_possessive)
+            )
+        return "That's wonderful! I respect your dietary choices completely. I'll make sure all recommendations align perfectly with your values. Let's find the best plant-based support for you! 🌱"
+
+    @staticmethod
+    def _ack_gender(ack: _AckInput) -> str | None:
+        return "Perfect! Thanks for sharing that with me. This helps me personalize recommendations just for you. Let's continue! 😊"
+
+    @staticmethod
+    def _ack_age(ack: _AckInput) -> str | None:
+        answer = ack.answer
+        try:
+            age = int(answer)
+            if age < 18:
+                return "Thanks for sharing your age! I'll make sure all recommendations are age-appropriate and safe for you. Let's find the perfect supplements for your stage of life! 🌟"
+            elif age >= 50:
+                return "I appreciate you sharing your age. This helps me recommend products that are specifically beneficial for your life stage. Let's focus on keeping you healthy and vibrant! 💫"
+            else:
+                return "Thanks for sharing! This helps me tailor recommendations that are perfect for your age group. Let's continue! 😊"
+        except (ValueError, TypeError):
+            pass
+        return None
+
+    @staticmethod
+    def _ack_health_status(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        if _POSITIVE_HEALTH_RE.search(answer_lower):
             return "That's wonderful to hear! It's great that you're feeling good. Let's keep that momentum going and find supplements that will help you maintain and even enhance your wellness! 🎉"
-        
-        # Exercise - encouraging
-        if field == "exercise" and answer_lower in ["yes", "yep", "yeah"]:
+        return None
+
+    @staticmethod
+    def _ack_exercise(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        if answer_lower in _ACK_YES:
             return "That's awesome that you're staying active! Exercise combined with the right supplements can really amplify your results. Let's find products that support your active lifestyle! 🏃‍♀️"
-        
-        # No exercise - non-judgmental support
-        if field == "exercise" and answer_lower in ["no", "nope", "nah"]:
+        if answer_lower in _ACK_NO:
             return "No judgment here at all! Everyone's journey is different. Let's find supplements that work for your lifestyle and help you feel your best, regardless of your activity level. You're doing great! 💚"
-        
-        # Lifestyle questions - acknowledge concerning patterns (vary responses to avoid repetition)
-        lifestyle_fields = ["fruit_intake", "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake"]
-        if field in lifestyle_fields:
-            if answer_lower == "hardly":
-                return "I appreciate your honesty. Nutrition is important, and supplements can help fill in the gaps. Let's make sure you're getting all the nutrients you need! 💚"
-            elif answer_lower == "one time":
-                # Vary the acknowledgment to avoid repetition
-                acknowledgments = [
-                    "Good to know! Supplements can help ensure you're getting all the nutrients you need. Let's continue! 🌟",
-                    "Thanks for sharing! Every bit of nutrition counts. Let's keep going! 💪",
-                    "Got it! Supplements can complement your diet nicely. Next question:",
-                ]
-                # Use field name to create a consistent but varied response
-                field_index = lifestyle_fields.index(field) if field in lifestyle_fields else 0
-                return acknowledgments[field_index % len(acknowledgments)]
-            elif answer_lower == "twice or more":
-                return "That's great! You're doing well with your nutrition. Supplements can still help optimize your intake. Let's continue! 🌟"
-        
-        # Lifestyle status - acknowledge progress
-        if field == "lifestyle_status":
-            if "ready to start" in answer_lower:
-                return "That's wonderful that you're ready to make positive changes! I'm here to support you every step of the way. Let's build a plan that works for you! 💪"
-            elif "nice on the way" in answer_lower:
-                return "That's great that you're already on the path! Keep up the momentum, and let's find supplements that will support your continued progress! 🌟"
-            elif "been doing well" in answer_lower:
-                return "That's fantastic! It's wonderful that you've been maintaining a healthy lifestyle. Let's find supplements that will help you maintain and enhance your wellness! 🎉"
-        
-        # General positive acknowledgment for any "yes" answer (but not for concerning contexts)
-        if answer_lower in ["yes", "yep", "yeah", "sure", "okay", "ok"]:
-            # Don't use generic "yes" acknowledgment for concerning health questions
-            if field and any(term in field.lower() for term in ["concern", "sleep", "energy", "stress", "medical"]):
-                return None  # Let more specific acknowledgments handle these
-            return "Perfect! Thanks for sharing that with me. I'm here to help you every step of the way. Let's continue! 😊"
-        
-        # General acknowledgment for any answer (fallback)
         return None
 
+    @staticmethod
+    def _ack_intake(ack: _AckInput) -> str | None:
+        """Fruit, vegetable, dairy, fiber and protein intake."""
+        field = ack.field
+        answer_lower = ack.answer_lower
+        if answer_lower == "hardly":
+            return "I appreciate your honesty. Nutrition is important, and supplements can help fill in the gaps. Let's make sure you're getting all the nutrients you need! 💚"
+        elif answer_lower == "one time":
+            # Vary the acknowledgment to avoid repetition
+            acknowledgments = [
+                "Good to know! Supplements can help ensure you're getting all the nutrients you need. Let's continue! 🌟",
+                "Thanks for sharing! Every bit of nutrition counts. Let's keep going! 💪",
+                "Got it! Supplements can complement your diet nicely. Next question:",
+            ]
+            # Use field name to create a consistent but varied response
+            field_index = _INTAKE_FIELD_INDEX.get(field, 0)
+            return acknowledgments[field_index % len(acknowledgments)]
+        elif answer_lower == "twice or more":
+            return "That's great! You're doing well with your nutrition. Supplements can still help optimize your intake. Let's continue! 🌟"
+        return None
+
+    @staticmethod
+    def _ack_lifestyle_status(ack: _AckInput) -> str | None:
+        answer_lower = ack.answer_lower
+        if "ready to start" in answer_lower:
+            return "That's wonderful that you're ready to make positive changes! I'm here to support you every step of the way. Let's build a plan that works for you! 💪"
+        elif "nice on the way" in answer_lower:
+            return "That's great that you're already on the path! Keep up the momentum, and let's find supplements that will support your continued progress! 🌟"
+        elif "been doing well" in answer_lower:
+            return "That's fantastic! It's wonderful that you've been maintaining a healthy lifestyle. Let's find supplements that will help you maintain and enhance your wellness! 🎉"
+        return None
+
+    # Field-specific acknowledgment handlers; a None result falls back to the generic "yes" reply
+    _ACK_HANDLERS = MappingProxyType({
+        "name": _ack_name,
+        "situation": _ack_situation,
+        "conceive": _ack_conceive,
+        "pregnant": _ack_pregnant,
+        "concern": _ack_concern,
+        "medical_treatment": _ack_medical_treatment,
+        "allergies": _ack_allergies,
+        "eating_habits": _ack_eating_habits,
+        "gender": _ack_gender,
+        "age": _ack_age,
+        "health_status": _ack_health_status,
+        "exercise": _ack_exercise,
+        **dict.fromkeys(_INTAKE_FIELDS, _ack_intake),
+        "lifestyle_status": _ack_lifestyle_status,
+    })
+
     def _friendly_question(
         self, prompt: str, step: int, prev_answer: Any | None = None, prev_field: str | None = None, responses: dict | None = None
     ) -> str:
-        tone = self._tone_from_answer(prev_answer, prev_field)
-        
-        # Get family member info if available
-        is_family = False
-        if responses:
-            labels = self._person_labels(responses)
-            is_family = labels.get("is_family", False)
-        
-        # Check for severe concerns to use more empathetic prefixes
-        is_severe_concern = False
-        if prev_answer:
-            answer_text = str(prev_answer).lower()
-            severe_indicators = ["less than 5", "less than 7", "still tired", "totally gone", "gone", "exhausted", "drained", "sleepy"]
-            is_severe_concern = any(indicator in answer_text for indicator in severe_indicators)
-        
-        buckets = {
-            "celebrate": [
-                "Love that! 🎉",
-                "Nice, that's great to hear!",
-                "Awesome vibes, let's keep it going:",
-                "Sweet, thanks for sharing!",
-                "Great choice, here's another quick one:",
-                "That's solid, let's keep the momentum:",
-                "Great energy, rolling on:",
-                "You're crushing it, next bit:",
-                "Brilliant, tell me this:",
-                "Fantastic! Quick follow-up:",
-                "High five on that! One more:",
-                "Sounds great, here comes the next one:",
-            ],
-            "supportive": [
-                "I hear you, and I'm here to help you through this. Let's work together:",
-                "Got it, and we'll sort this out together. You're not alone:",
-                "Thanks for being real about that. I appreciate your honesty:",
-                "Totally understand, let's dial this in. We've got this:",
-                "Noted, and I'm here to support you. Let's make this better:",
-                "We'll tackle this together, next question to help:",
-                "I'm on your side, tell me a bit more so I can help you better:",
-                "Let's figure this out together, one more question:",
-                "Thanks for sharing, this helps me help you. Let's continue:",
-                "We've got this, quick follow-up:",
-                "Let's get you feeling better, next up:",
-                "Appreciate the honesty, another quick one:",
-                "I'm here with you, let's fine-tune things:",
-                "We'll solve this step by step, next one:",
-                "You're not alone in this, tell me more:",
-                "Let's smooth this out, here's another:",
-                "I get it, let's make a plan together:",
-                "We'll adjust as we go, quick follow-up:",
-                "Let's make this easier for you, next question:",
-                "Thanks for trusting me with that, one more:",
-                "We'll keep it gentle, share a bit more:",
-                "Let's take it one step at a time, next up:",
-                "I've got you, help me with this one:",
-            ],
-            "neutral": [
-                "Hey friend! 😊",
-                "Great! Let's keep moving forward together:",
-                "Thanks for that, I appreciate you sharing. Another quick one:",
-                "You're doing great! Here we go:",
-                "Appreciate it, this helps me understand you better. Tell me this:",
-                "Let's keep the flow going, next question:",
-                "I'm here to help you, here's one more:",
-                "Thanks for being open with me, answer this:",
-                "On we go together, give me your take:",
-                "You're making great progress, what about this:",
-                "Still with me? I'm here for you. Here's the next one:",
-                "Let's continue this journey together, tell me this:",
-            ],
-        }
-        
-        # For severe concerns, prioritize more empathetic supportive prefixes
-        if is_severe_concern and tone == "supportive":
-            severe_supportive = [
-                "I understand this is challenging. Let's work through this together:",
-                "I hear you, and I'm here to help. Let's take the next step:",
-                "This must be really tough. We'll find solutions together:",
-                "I appreciate you sharing this with me. Let's continue:",
-                "You're not alone in this. Let's keep moving forward:",
-            ]
-            choices = severe_supportive
-        else:
-            choices = buckets.get(tone, buckets["neutral"])
-        
-        prefix = choices[step % len(choices)]
-        
         # If prompt already starts with "Hey" (personalized greeting), don't add prefix
         if prompt.strip().startswith("Hey"):
             return prompt
         
-        return f"{prefix} {prompt}"
+        tone = self._tone_from_answer(prev_answer, prev_field)
+        
+        # For severe concerns, prioritize more empathetic supportive prefixes. Only a
+        # supportive tone can come from a severe answer, so other tones skip the scan.
+        if tone == "supportive" and _SEVERE_ANSWER_RE.search(str(prev_answer).lower()):
+            choices = self._SEVERE_SUPPORTIVE_PREFIXES
+        else:
+            choices = self._TONE_BUCKETS.get(tone, self._TONE_BUCKETS["neutral"])
+        
+        return f"{choices[step % len(choices)]} {prompt}"
 
     def _tone_from_answer(self, answer: Any | None, field: str | None = None) -> str:
         if answer is None:
             return "neutral"
         text = str(answer).lower()
+        hits = {_TONE_KEYWORDS[match.group(1)] for match in _TONE_KEYWORD_RE.finditer(text)}
         
-        # Check for severe concerning answers that need extra support
-        severe_concerns = {
-            "less than 5",
-            "less than 7",
-            "still tired",
-            "totally gone",
-            "gone",
-            "exhausted",
-            "drained",
-            "sleepy",
-            "hardly",
-        }
-        if any(concern in text for concern in severe_concerns):
+        # Severe concerning answers need extra support
+        if "severe" in hits:
             return "supportive"
         
-        positive = {
-            "good",
-            "great",
-            "pretty good",
-            "energized",
-            "7+",
-            "7 +",
-            "high",
-            "performance",
-            "health",
-            "fine",
-            "balanced",
-            "strong",
-            "clear",
-            "better",
-            "improving",
-            "refreshed",
-            "solid",
-            "steady",
-        }
-        supportive = {
-            "no",
-            "none",
-            "nah",
-            "nope",
-            "not really",
-            "yes",
-            "yep",
-            "yeah",
-            "low",
-            "little",
-            "less",
-            "tired",
-            "drained",
-            "pimples",
-            "dry",
-            "sensitive",
-            "bloating",
-            "balloon",
-            "irregular",
-            "worried",
-            "stress",
-            "cravings",
-            "trouble",
-            "hard",
-            "difficulty",
-            "struggle",
-            "pain",
-            "aching",
-            "aging",
-            "lines",
-            "breakouts",
-            "fatigue",
-            "bloated",
-            "tight",
-            "pressure",
-            "tense",
-            "poor",
-            "very poor",
-            "very high",
-            "high pressure",
-            "sleepy",
-            "still tired",
-            "totally gone",
-            "gone",
-            "exhausted",
-            "hardly",
-        }
-        sensitive_fields = {
-            "weight",
-            "sleep",
-            "stress",
-            "energy",
-            "brain",
-            "stomach",
-            "intestines",
-            "skin",
-            "resistance",
-            "libido",
-            "hormones",
-            "hair",
-            "nails",
-            "fitness",
-            "concern",
-        }
-        is_sensitive = any(key in (field or "") for key in sensitive_fields)
+        is_sensitive = _SENSITIVE_TONE_FIELD_RE.search(field or "") is not None
 
-        # Strong positives
-        if any(token in text for token in positive):
-            if is_sensitive and text.strip() in {"yes", "yeah", "yep", "y"}:
+        # Strong positives, unless negated
+        if "positive" in hits:
+            if _NEGATED_POSITIVE_RE.search(text):
+                return "supportive"
+            if is_sensitive and text.strip() in _STRICT_YES:
                 return "supportive"
             return "celebrate"
 
         # Explicit negatives or challenges
-        if any(token in text for token in supportive):
+        if "supportive" in hits:
             return "supportive"
 
         # When unsure on sensitive topics, err on supportive
@@ -2510,78 +2789,76 @@ class ChatService:
         """Parse a concern string into a list of canonical concern keys."""
         if not raw:
             return []
-        normalized = raw.lower()
-        normalized = normalized.replace("stomach and intestines", "stomach & intestines")
-        normalized = normalized.replace("hair and nails", "hair & nails")
-        normalized = normalized.replace("hair nails", "hair & nails")
-        normalized = re.sub(r"\s+/+\s*", ",", normalized)
-        normalized = normalized.replace(";", ",")
-        normalized = normalized.replace("|", ",")
-        normalized = re.sub(r"\s+and\s+", ",", normalized)
-        parts = [part.strip() for part in normalized.split(",") if part.strip()]
-
-        selections: list[str] = []
+        normalized = _CONCERN_PAIR_RE.sub(lambda match: _CONCERN_PAIRS[match.group()], raw.lower())
+        parts = [part.strip() for part in _CONCERN_SPLIT_RE.split(normalized) if part.strip()]
+
+        # Insertion-ordered dict as an ordered set
+        selections: dict[str, None] = {}
         for part in parts:
-            if part in self.CONCERN_SYNONYMS:
-                canonical = self.CONCERN_SYNONYMS[part]
-                if canonical not in selections:
-                    selections.append(canonical)
+            canonical = self.CONCERN_SYNONYMS.get(part)
+            if canonical is not None:
+                selections[canonical] = None
                 continue
             # Fallback: match known synonyms inside the part
-            matches = self._extract_concern_tokens(part)
-            for token in matches:
-                if token not in selections:
-                    selections.append(token)
+            selections.update(dict.fromkeys(self._extract_concern_tokens(part)))
 
         if not selections:
-            selections = self._extract_concern_tokens(normalized)
-        return selections
+            return self._extract_concern_tokens(normalized)
+        return list(selections)
 
     def _extract_concern_tokens(self, text: str) -> list[str]:
         """Find concern tokens inside text in order of appearance."""
         if not text:
             return []
-        pattern = r"\b(" + "|".join(
-            re.escape(key) for key in sorted(self.CONCERN_SYNONYMS.keys(), key=lambda k: len(k), reverse=True)
-        ) + r")\b"
-        matches = []
-        for match in re.finditer(pattern, text):
-            key = match.group(1)
-            canonical = self.CONCERN_SYNONYMS.get(key)
-            if canonical and canonical not in matches:
-                matches.append(canonical)
-        return matches
-
-    def _normalize_concerns(self, raw_value) -> list[str]:
+        synonyms = self.CONCERN_SYNONYMS
+        return list(dict.fromkeys(synonyms[match.group(1)] for match in self._CONCERN_TOKEN_RE.finditer(text)))
+
+    def _current_concerns(self, responses: dict) -> list[str]:
+        """Normalized concerns from responses."""
+        return self._normalize_concerns(responses.get("concern", []))
+
+    @staticmethod
+    def _profile_context(responses: dict) -> dict:
+        """
+        Onboarding responses as user context for product search and the LLM. Drops
+        underscore-prefixed bookkeeping keys (older sessions stored cached concern
+        normalizations under them).
+        """
+        if any(key.startswith("_") for key in responses):
+            return {key: value for key, value in responses.items() if not key.startswith("_")}
+        return responses
+
+    def _normalize_concerns(self, raw_value: Any) -> list[str]:
         if isinstance(raw_value, list):
-            normalized = []
+            normalized: list[str] = []
             for item in raw_value:
                 normalized.extend(self._parse_concerns(str(item)))
             # Preserve order but dedupe
-            seen = set()
-            ordered = []
-            for item in normalized:
-                if item not in seen:
-                    seen.add(item)
-                    ordered.append(item)
-            return ordered
+            return list(dict.fromkeys(normalized))
         if isinstance(raw_value, str):
             return self._parse_concerns(raw_value)
         return []
 
-    def _concern_followup_steps(self, concerns: list[str]) -> list[str]:
+    @classmethod
+    def _concern_followup_steps(cls, concerns: list[str]) -> list[str]:
+        return list(cls._concern_followup_steps_cached(tuple(concerns)))
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _concern_followup_steps_cached(concerns: tuple[str, ...]) -> tuple[str, ...]:
         steps: list[str] = []
         for concern in concerns:
-            question_set = self.CONCERN_QUESTIONS.get(concern, {})
+            question_set = ChatService.CONCERN_QUESTIONS.get(concern, {})
             for question in question_set.get("questions", []):
-                steps.append(self._concern_field_key(concern, question["id"]))
-        return steps
+                steps.append(ChatService._concern_field_key(concern, question["id"]))
+        return tuple(steps)
 
     @staticmethod
     def _concern_field_key(concern: str, question_id: str) -> str:
         return f"concern|{concern}|{question_id}"
 
     @staticmethod
+    @lru_cache(maxsize=512)
     def _parse_concern_field(field: str) -> tuple[str, str] | None:
         if not field.startswith("concern|"):
             return None
@@ -2605,80 +2882,11 @@ class ChatService:
                 prompt = question["prompt"]
                 
                 # Personalize for family members
-                if responses:
-                    labels = self._person_labels(responses)
-                    is_family = labels.get("is_family", False)
-                    relation = responses.get("relation", "")
-                    family_name = responses.get("family_name", "")
-                    
-                    if is_family:
-                        # Build the reference phrase (e.g., "your son", "your daughter", or family name)
-                        if family_name:
-                            reference = family_name
-                            possessive_ref = f"{family_name}'s"
-                            pronoun = "they"  # Use "they" for name
-                        elif relation:
-                            reference = f"your {relation}"
-                            possessive_ref = f"your {relation}'s"
-                            # Determine pronoun based on relation
-                            relation_lower = relation.lower()
-                            if relation_lower in ["son", "brother", "father", "dad", "husband", "boyfriend"]:
-                                pronoun = "he"
-                            elif relation_lower in ["daughter", "sister", "mother", "mom", "wife", "girlfriend"]:
-                                pronoun = "she"
-                            else:
-                                pronoun = "they"
-                        else:
-                            reference = "your family member"
-                            possessive_ref = "your family member's"
-                            pronoun = "they"
-                        
-                        # Replace "you" with the reference (handling different cases)
-                        import re
-                        
-                        # Pattern 1: "Do you" → "Does {reference}" (handles start and middle of sentence)
-                        prompt = re.sub(r'\bDo you\b', f'Does {reference}', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\bdo you\b', f'does {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 2: "When you" → "When {reference}"
-                        prompt = re.sub(r'\bWhen you\b', f'When {reference}', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\bwhen you\b', f'when {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 3: "How would you" → "How would {reference}"
-                        prompt = re.sub(r'\bHow would you\b', f'How would {reference}', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\bhow would you\b', f'how would {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 4: "Are you" → "Is {reference}"
-                        prompt = re.sub(r'\bAre you\b', f'Is {reference}', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\bare you\b', f'is {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 5: "What would you" → "What would {reference}"
-                        prompt = re.sub(r'\bWhat would you\b', f'What would {reference}', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\bwhat would you\b', f'what would {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 6: "On most nights, how many hours do you sleep" → "On most nights, how many hours does {reference} sleep"
-                        prompt = re.sub(r'\bhow many hours do you\b', f'how many hours does {reference}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 7: Replace "your" with possessive when it refers to the family member's things
-                        # Common patterns: "your skin", "your hair", "your bowel", etc.
-                        common_attributes = ['skin', 'hair', 'nails', 'bowel', 'energy', 'resistance', 'libido', 
-                                            'cycle', 'period', 'mood', 'focus', 'memory', 'days', 'life', 
-                                            'periods', 'training', 'exercise', 'stomach', 'digestion']
-                        for attr in common_attributes:
-                            prompt = re.sub(rf'\byour {attr}\b', f'{possessive_ref} {attr}', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 8: Fix verb agreement
-                        # "When {reference} wake" → "When {reference} wakes"
-                        prompt = re.sub(rf'\bWhen {re.escape(reference)} wake\b', f'When {reference} wakes', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(rf'\bwhen {re.escape(reference)} wake\b', f'when {reference} wakes', prompt, flags=re.IGNORECASE)
-                        
-                        # Pattern 9: Replace remaining "you" with pronoun or reference
-                        prompt = re.sub(r'\byou feel\b', f'{pronoun} feel', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\byou usually\b', f'{reference} usually', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\byou notice\b', f'{reference} notice', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\byou experience\b', f'{reference} experience', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\byou sleep\b', f'{reference} sleeps', prompt, flags=re.IGNORECASE)
-                        prompt = re.sub(r'\byou want\b', f'{reference} wants', prompt, flags=re.IGNORECASE)
+                if responses and responses.get("for_whom") == "family":
+                    reference, possessive_ref, pronoun = _family_refs(
+                        responses.get("family_name", ""), responses.get("relation", "")
+                    )
+                    prompt = _family_concern_prompt(prompt, reference, possessive_ref, pronoun)
                 
                 # Make weight challenge question gender-aware
                 if concern_key == "weight" and question_id == "challenge":
@@ -2695,7 +2903,7 @@ class ChatService:
                 return prompt
         return None
 
-    def _save_response(self, field: str, normalized, responses: dict) -> None:
+    def _save_response(self, field: str, normalized: Any, responses: dict) -> None:
         if field == "concern":
             responses[field] = self._normalize_concerns(normalized)
             return
@@ -2708,23 +2916,188 @@ class ChatService:
             return
         responses[field] = normalized
 
+    async def _find_recommended_products(
+        self,
+        profile_context: dict,
+        previous_products: list[str],
+        previous_concern_resolved: bool | None,
+    ) -> tuple[list, dict]:
+        """
+        Find products for the final recommendation.
+        
+        When the previous concern is unresolved, products from the last session are
+        excluded first, then offered again with caution, and any products are used as
+        a last resort. The excluded and unfiltered picks share one search, so the
+        common fallback does not pay an extra round-trip.
+        """
+        if previous_concern_resolved is not False or not previous_products:
+            return await self.product_service.find_relevant_products(
+                message=None,
+                context=profile_context,
+                limit=10,  # Get more products to filter from
+            )
+        
+        # First, try to find products excluding previous ones; the unfiltered pick comes
+        # from the same search
+        excluded_products, any_products, product_documents = (
+            await self.product_service.find_relevant_products_with_fallback(
+                message=None,
+                context=profile_context,
+                limit=10,
+                exclude_product_titles=previous_products,
+            )
+        )
+        if excluded_products:
+            return excluded_products, product_documents
+        
+        # If no other products found, include previous products with caution
+        included_products, included_documents = await self.product_service.find_relevant_products(
+            message=None,
+            context=profile_context,
+            limit=3,
+            include_product_titles=previous_products,  # Only get these specific products
+        )
+        if included_products:
+            return included_products, included_documents
+        
+        # Always ensure we have products - if still none, use any products
+        return any_products, product_documents
+
+    async def schedule_recommendations(self, session_id: str, user_id: str | None, onboarding_state: dict) -> bool:
+        """
+        Start generating recommendations for a completed onboarding in the background.
+        Only one run per session: the onboarding.recommendations_started_at lease is
+        claimed atomically and is only taken over once stale or after a failed run.
+        Returns True when a task was started.
+        """
+        if session_id in _MATERIALIZING_SESSIONS:
+            return False
+        _MATERIALIZING_SESSIONS.add(session_id)
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=_RECOMMENDATION_LEASE_SECONDS)
+        try:
+            claimed = await self.session_repo.claim_recommendations(session_id, stale_before, user_id=user_id)
+        except Exception:
+            # Left pending without a lease, so the next /useridLogin poll claims it
+            logger.exception("Failed to claim recommendation run for session %s", session_id)
+            claimed = False
+        if not claimed:
+            _MATERIALIZING_SESSIONS.discard(session_id)
+            return False
+        _run_in_background(
+            self._materialize_recommendations(
+                session_id=session_id,
+                user_id=user_id,
+                profile_context=dict(self._profile_context(onboarding_state.get("responses", {}))),
+                previous_products=list(onboarding_state.get("previous_products", [])),
+                previous_concern_resolved=onboarding_state.get("previous_concern_resolved"),
+                previous_concerns=list(onboarding_state.get("previous_concerns", [])),
+            )
+        )
+        return True
+
+    async def _materialize_recommendations(
+        self,
+        session_id: str,
+        user_id: str | None,
+        profile_context: dict,
+        previous_products: list[str],
+        previous_concern_resolved: bool | None,
+        previous_concerns: list[str],
+    ) -> None:
+        """
+        Find and format product recommendations after the final onboarding
+        answer and store them on the session. Runs as a background task, so
+        failures are logged rather than raised; a failed run clears the pending
+        flag and sets recommendations_failed, which /useridLogin retries on.
+        """
+        try:
+            try:
+                recommended_products, product_documents = await self._find_recommended_products(
+                    profile_context, previous_products, previous_concern_resolved
+                )
+            except Exception:
+                logger.exception("Error finding products for medical_treatment")
+                recommended_products = []
+                product_documents = {}
+            
+            messages = []
+            recommendation_message = ""
+            product_titles: list[str] = []
+            if recommended_products:
+                recommendation_message, product_titles = await self._format_product_recommendations(
+                    recommended_products,
+                    profile_context,
+                    product_documents,
+                    previous_concern_resolved=previous_concern_resolved,
+                    previous_concerns=previous_concerns,
+                    previous_products=previous_products if previous_concern_resolved is False else [],
+                )
+                messages.append(ChatMessage(role="assistant", content=recommendation_message))
+            
+            # Mark recommendations as shown and store product titles
+            await self.session_repo.commit_turn(
+                session_id=session_id,
+                messages=messages,
+                metadata_patch={
+                    "onboarding.recommendations_pending": False,
+                    "onboarding.recommendations_failed": False,
+                    "onboarding.recommendations_shown": True,
+                    "onboarding.recommended_product_titles": product_titles,
+                    "last_products": product_titles[:3],
+                    "last_recommendation_text": recommendation_message,
+                },
+                user_id=user_id,
+            )
+        except Exception:
+            logger.exception("Failed to materialize recommendations for session %s", session_id)
+            try:
+                await self.session_repo.commit_turn(
+                    session_id=session_id,
+                    metadata_patch={
+                        "onboarding.recommendations_pending": False,
+                        "onboarding.recommendations_failed": True,
+                    },
+                    user_id=user_id,
+                )
+            except Exception:
+                logger.exception("Failed to record recommendation failure for session %s", session_id)
+        finally:
+            _MATERIALIZING_SESSIONS.discard(session_id)
+
     async def _format_product_recommendations(
         self, products: list, context: dict, product_documents: dict[str, dict] | None = None,
         previous_concern_resolved: bool | None = None, previous_concerns: list[str] | None = None,
         previous_products: list[str] | None = None
-    ) -> str:
-        """Format product recommendations in a concise doctor-style structure."""
+    ) -> tuple[str, list[str]]:
+        """
+        Format product recommendations in a concise doctor-style structure.
+        Returns (message, product titles) so callers don't walk the products again.
+        """
         if not products:
-            return "No products found matching your profile."
+            return "No products found matching your profile.", []
+        titles = [product.title for product in products]
+        cache_key = (
+            hash(repr(sorted(context.items()))),
+            tuple(titles),
+            previous_concern_resolved,
+            tuple(previous_concerns or ()),
+            tuple(previous_products or ()),
+        )
+        cached_message = _RECOMMENDATION_CACHE.get(cache_key)
+        if cached_message is not None:
+            return cached_message, titles
 
         # Primary path: OpenAI-generated doctor-style recommendation narrative.
         # Fallback: local backend formatter below if OpenAI is unavailable/fails.
+        # Only the OpenAI narrative is cached so a transient failure is retried.
         try:
-            return await self._format_product_recommendations_with_openai(
+            message = await self._format_product_recommendations_with_openai(
                 products=products,
                 context=context,
                 product_documents=product_documents,
             )
+            _RECOMMENDATION_CACHE.put(cache_key, message)
+            return message, titles
         except Exception as e:
             logger.warning("OpenAI recommendation formatting failed, using local fallback: %s", e)
 
@@ -2771,21 +3144,16 @@ class ChatService:
             intro_text += "\n\n"
 
         previous_products_set = set((previous_products or []))
+        product_docs = await self._product_documents_for(products[:3], product_documents)
         recommendations = []
-        for idx, product in enumerate(products[:3], start=1):
-            product_name = product.title
+        for idx, (product, product_name, product_doc) in enumerate(zip(products[:3], titles, product_docs), start=1):
             is_previous_product = product_name in previous_products_set
 
             explanation = self._build_clinical_product_explanation(product, concerns)
-            product_text = f"{idx}. {product_name}\nWhy it was recommended: {explanation}"
+            # One line per entry, joined once at the end
+            product_lines = [f"{idx}. {product_name}", f"Why it was recommended: {explanation}"]
             if product.how_to_use:
-                product_text += f"\nHow to take: {product.how_to_use}"
-
-            product_doc = {}
-            if product_documents and product_name in product_documents:
-                product_doc = product_documents[product_name]
-            else:
-                product_doc = await self._get_product_document_by_title(product_name)
+                product_lines.append(f"How to take: {product.how_to_use}")
 
             warnings = self.product_service.get_safety_warnings(product_doc, context)
             if warnings:
@@ -2793,19 +3161,17 @@ class ChatService:
                     "Please consult with your healthcare provider before starting any new supplements, "
                     "especially if you're currently undergoing medical treatment."
                 )
-                filtered_warnings = [w for w in warnings if w != generic_medical_note]
-                if filtered_warnings:
-                    product_text += "\n" + "\n".join([f"Safety note: {w}" for w in filtered_warnings])
+                product_lines.extend(f"Safety note: {w}" for w in warnings if w != generic_medical_note)
 
             if is_previous_product and previous_concern_resolved is False:
-                product_text += (
-                    "\nCaution: This was previously recommended but your concern is still ongoing. "
+                product_lines.append(
+                    "Caution: This was previously recommended but your concern is still ongoing. "
                     "Please consult a healthcare provider before continuing."
                 )
 
-            recommendations.append(product_text)
+            recommendations.append("\n".join(product_lines))
 
-        return intro_text + "\n\n".join(recommendations)
+        return intro_text + "\n\n".join(recommendations), titles
 
     async def _format_product_recommendations_with_openai(
         self,
@@ -2821,13 +3187,8 @@ class ChatService:
         ]
 
         product_payload = []
-        for product in products[:3]:
-            product_doc = {}
-            if product_documents and product.title in product_documents:
-                product_doc = product_documents[product.title]
-            else:
-                product_doc = await self._get_product_document_by_title(product.title)
-
+        product_docs = await self._product_documents_for(products[:3], product_documents)
+        for product, product_doc in zip(products[:3], product_docs):
             warnings = self.product_service.get_safety_warnings(product_doc, context)
             product_payload.append(
                 {
@@ -2895,21 +3256,33 @@ class ChatService:
 
     def _build_clinical_product_explanation(self, product, concerns: list[str]) -> str:
         """Build a clean and non-repetitive clinical reason for recommendation."""
+        return self._clinical_explanation(
+            tuple(concerns),
+            tuple(str(b).strip() for b in (product.benefits or [])),
+            (product.short_description or "").strip(),
+            tuple(str(g).strip() for g in (product.health_goals or [])),
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _clinical_explanation(
+        concerns: tuple[str, ...], benefits: tuple[str, ...], short_description: str, health_goals: tuple[str, ...]
+    ) -> str:
+        """
+        Clinical reason for one product, keyed only on the product fields it reads.
+        The same products come back for the same answers, so repeats are a cache hit.
+        """
         concern_labels = []
         for concern in concerns:
-            label = self.CONCERN_QUESTIONS.get(concern, {}).get("label", concern.replace("_", " ").title())
+            label = ChatService.CONCERN_QUESTIONS.get(concern, {}).get("label", concern.replace("_", " ").title())
             concern_labels.append(label.lower())
 
-        concern_text = ""
-        if len(concern_labels) == 1:
-            concern_text = concern_labels[0]
-        elif len(concern_labels) > 1:
-            concern_text = ", ".join(concern_labels[:-1]) + f" and {concern_labels[-1]}"
+        concern_text = _join_labels(concern_labels)
 
-        benefits = [str(b).strip() for b in (product.benefits or []) if str(b).strip()]
+        benefits = [b for b in benefits if b]
         primary_benefit = benefits[0].rstrip(".") if benefits else ""
-        short_desc = (product.short_description or "").strip().rstrip(".")
-        health_goals = [str(g).strip() for g in (product.health_goals or []) if str(g).strip()]
+        short_desc = short_description.rstrip(".")
+        health_goals = [g for g in health_goals if g]
 
         if concern_text and primary_benefit:
             return (
@@ -2954,22 +3327,24 @@ class ChatService:
         
         # Build explanation based on user's concerns and what they mentioned
         user_concerns_text = []
-        relevant_benefits = []
+        # Insertion-ordered dict as an ordered set of matching benefits
+        relevant_benefits: dict[str, None] = {}
+        product_text_lower = product_text.lower()
+        benefits_lower = [(benefit, benefit.lower()) for benefit in key_benefits]
+        keyword_patterns = self.product_service.CONCERN_KEYWORD_PATTERNS
         
         for concern in concerns:
             concern_label = self.CONCERN_QUESTIONS.get(concern, {}).get("label", concern.replace("_", " ").title())
-            concern_keywords = self.product_service.CONCERN_TO_KEYWORDS.get(concern, [])
+            keyword_re = keyword_patterns.get(concern)
             
             # Check if product addresses this concern
-            if any(keyword in product_text.lower() for keyword in concern_keywords):
+            if keyword_re is not None and keyword_re.search(product_text_lower):
                 user_concerns_text.append(concern_label.lower())
                 
                 # Find specific benefits that match this concern
-                for benefit in key_benefits:
-                    benefit_lower = benefit.lower()
-                    if any(keyword in benefit_lower for keyword in concern_keywords):
-                        if benefit not in relevant_benefits:
-                            relevant_benefits.append(benefit)
+                for benefit, benefit_lower in benefits_lower:
+                    if keyword_re.search(benefit_lower):
+                        relevant_benefits[benefit] = None
         
         # Build the explanation sentence with better grammar and varied phrasing
         if user_concerns_text and relevant_benefits:
@@ -2987,30 +3362,14 @@ class ChatService:
             
             concerns_phrase = ", ".join(concerns_phrases)
             # Get 1-2 most relevant benefits, but vary the phrasing
-            top_benefits = relevant_benefits[:2]
+            top_benefits = list(islice(relevant_benefits, 2))
             if len(top_benefits) == 2:
                 benefits_phrase = f"{top_benefits[0].lower().rstrip('.')} and {top_benefits[1].lower().rstrip('.')}"
             else:
                 benefits_phrase = top_benefits[0].lower().rstrip(".")
             
             # Vary the explanation phrasing to avoid repetition
-            # Fix grammar: ensure benefits_phrase works with "can" (use base form) or use "which/that" instead
-            # Convert benefits to base form if it starts with a verb (e.g., "promotes" -> "promote")
-            benefits_base = benefits_phrase
-            if benefits_phrase.split()[0].endswith('s') and len(benefits_phrase.split()[0]) > 3:
-                # Likely a third-person verb, convert to base form for "can"
-                first_word = benefits_phrase.split()[0]
-                if first_word.endswith('s') and not first_word.endswith('ss'):
-                    benefits_base = benefits_phrase.replace(first_word, first_word[:-1], 1)
-            
-            explanation_variants = [
-                f"This product may help address your {concerns_phrase} through {ingredient_name}, which {benefits_phrase}.",
-                f"Based on your {concerns_phrase}, {ingredient_name} in this product can {benefits_base}.",
-                f"For your {concerns_phrase}, this product offers {ingredient_name} that {benefits_phrase}."
-            ]
-            # Use a simple hash of product name to pick variant (consistent per product)
-            variant_idx = hash(product.title) % len(explanation_variants)
-            explanation = explanation_variants[variant_idx]
+            explanation = _explain(product.title, concerns_phrase, ingredient_name, benefits_phrase, True)
         elif user_concerns_text:
             # Format concerns properly
             concerns_phrases = []
@@ -3028,13 +3387,7 @@ class ChatService:
             # Fallback to general benefits
             if key_benefits:
                 top_benefit = key_benefits[0].lower().rstrip(".")
-                explanation_variants = [
-                    f"This product may support your {concerns_phrase} with {ingredient_name} that {top_benefit}.",
-                    f"For your {concerns_phrase}, this product contains {ingredient_name} which {top_benefit}.",
-                    f"Addressing your {concerns_phrase}, this product includes {ingredient_name} that {top_benefit}."
-                ]
-                variant_idx = hash(product.title) % len(explanation_variants)
-                explanation = explanation_variants[variant_idx]
+                explanation = _explain(product.title, concerns_phrase, ingredient_name, top_benefit, False)
             else:
                 explanation = (
                     f"This product may be beneficial for your {concerns_phrase} as it contains {ingredient_name} "
@@ -3058,6 +3411,11 @@ class ChatService:
     
     def _get_product_text_for_explanation(self, product, product_json: dict | None) -> str:
         """Get searchable text from product for explanation matching."""
+        cache_key = (getattr(product, "id", None) or product.title, bool(product_json))
+        cached = _PRODUCT_TEXT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
         text_parts = []
         
         if product.description:
@@ -3074,7 +3432,7 @@ class ChatService:
             if product_json.get("description"):
                 desc = product_json["description"]
                 if isinstance(desc, dict):
-                    desc_val = desc.get("en", desc.get(list(desc.keys())[0] if desc else "", ""))
+                    desc_val = _pick_lang(desc)
                     if desc_val:
                         text_parts.append(str(desc_val))
                 elif isinstance(desc, str):
@@ -3087,8 +3445,9 @@ class ChatService:
                 text_parts.extend([str(i) for i in product_json["ingredients"]])
         
         # Filter out None values and empty strings, then join
-        text_parts = [part for part in text_parts if part]
-        return " ".join(text_parts)
+        product_text = " ".join(filter(None, text_parts))
+        _PRODUCT_TEXT_CACHE.put(cache_key, product_text)
+        return product_text
     
     def _build_problem_summary(self, concerns: list[str], concern_details: dict, context: dict, product_count: int = 3) -> str:
         """
@@ -3106,11 +3465,8 @@ class ChatService:
         if not concerns:
             return ""
         
-        # Get concern labels
-        concern_labels = []
-        for concern in concerns:
-            label = self.CONCERN_QUESTIONS.get(concern, {}).get("label", concern.replace("_", " ").title())
-            concern_labels.append(label)
+        # Get concern labels (the summary only uses them lowercased)
+        concern_labels = [self._CONCERN_LABELS.get(c, c.replace("_", " ").lower()) for c in concerns]
         
         # Build summary based on concerns and key details
         summary_parts = []
@@ -3118,35 +3474,28 @@ class ChatService:
         # Primary concern statement
         if len(concern_labels) == 1:
             primary_concern = concern_labels[0]
-            summary_parts.append(f"Based on your responses, I've noticed you're experiencing {primary_concern.lower()} concerns.")
+            summary_parts.append(f"Based on your responses, I've noticed you're experiencing {primary_concern} concerns.")
         else:
-            concerns_text = ", ".join(concern_labels[:-1]) + f" and {concern_labels[-1]}"
-            summary_parts.append(f"Based on your responses, I've identified concerns related to {concerns_text.lower()}.")
+            concerns_text = _join_labels(concern_labels)
+            summary_parts.append(f"Based on your responses, I've identified concerns related to {concerns_text}.")
         
         # Add specific details if available
         specific_details = []
         
         # Check for specific concern details that provide context
         for concern in concerns:
-            concern_data = concern_details.get(concern, {})
-            if concern == "brain" and concern_data.get("symptoms"):
-                symptoms = concern_data.get("symptoms", "").lower()
-                if "difficulty focusing" in symptoms or "focus" in symptoms:
-                    specific_details.append("difficulty with focus and concentration")
-                elif "forgetfulness" in symptoms or "memory" in symptoms:
-                    specific_details.append("memory-related challenges")
-                elif "trouble finding words" in symptoms:
-                    specific_details.append("cognitive challenges")
-            elif concern == "sleep" and concern_data.get("fall_asleep"):
-                if "yes" in concern_data.get("fall_asleep", "").lower() or "hard" in concern_data.get("fall_asleep", "").lower():
-                    specific_details.append("trouble falling asleep")
-            elif concern == "stress" and concern_data.get("busy_level"):
-                busy = concern_data.get("busy_level", "").lower()
-                if "a lot" in busy or "very" in busy:
-                    specific_details.append("high levels of daily stress")
-            elif concern == "energy" and concern_data.get("end_day"):
-                if "gone" in concern_data.get("end_day", "").lower() or "tired" in concern_data.get("end_day", "").lower():
-                    specific_details.append("low energy levels by end of day")
+            rule = _CONCERN_DETAIL_RULES.get(concern)
+            if not rule:
+                continue
+            answer_field, details = rule
+            answer = concern_details.get(concern, {}).get(answer_field)
+            if not answer:
+                continue
+            answer = answer.lower()
+            for keywords, detail in details:
+                if any(keyword in answer for keyword in keywords):
+                    specific_details.append(detail)
+                    break
         
         # Build second line with specific details or general statement
         if specific_details:
@@ -3166,10 +3515,34 @@ class ChatService:
         
         return "\n".join(summary_parts)
     
+    async def _product_documents_for(
+        self, products: list, product_documents: dict[str, dict] | None
+    ) -> list[dict]:
+        """
+        Documents for products, in order. Titles not in product_documents are fetched
+        with one exact-title query; any it misses fall back to per-title searches.
+        """
+        known = product_documents or {}
+        missing = list(dict.fromkeys(product.title for product in products if product.title not in known))
+        fetched: dict[str, dict] = {}
+        if missing:
+            try:
+                fetched = await self.product_service.repository.get_by_titles(missing)
+            except Exception:
+                fetched = {}
+        unmatched = [title for title in missing if title not in fetched]
+        fetched.update(zip(unmatched, await asyncio.gather(*map(self._get_product_document_by_title, unmatched))))
+        return [known[product.title] if product.title in known else fetched[product.title] for product in products]
+
     async def _get_product_document_by_title(self, product_title: str) -> dict:
-        """Get full MongoDB product document by title for safety analysis."""
+        """Get MongoDB product document by title for safety analysis."""
         try:
-            # Search for the product in MongoDB
+            # One exact, case-insensitive title lookup covers the usual case
+            product = await self.product_service.repository.get_by_title_exact(product_title)
+            if product:
+                return product
+
+            # Otherwise search by the first word of the title
             products = await self.product_service.repository.search(
                 message_terms=[product_title.split()[0]] if product_title else [],  # Use first word of title
                 health_goals=[],
@@ -3180,7 +3553,7 @@ class ChatService:
             for product in products:
                 title_obj = product.get("title", {})
                 if isinstance(title_obj, dict):
-                    title = title_obj.get("en", title_obj.get(list(title_obj.keys())[0] if title_obj else "", ""))
+                    title = _pick_lang(title_obj)
                 elif isinstance(title_obj, str):
                     title = title_obj
                 else:
@@ -3194,405 +3567,18 @@ class ChatService:
         except Exception:
             return {}
     
-    def _get_question_options(self, field: str) -> tuple[list[QuestionOption] | None, str | None]:
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _get_question_options(field: str) -> tuple[tuple[QuestionOption, ...] | None, str | None]:
         """
         Extract available options for a question field.
-        Returns tuple of (options_list, question_type).
+        Returns tuple of (options, question_type); options is a shared tuple,
+        which the response models accept in place of a list.
         """
-        # Yes/No questions
-        yes_no_fields = {
-            "protein", "conceive", "children", "drinks_alcohol", "alcohol_daily",
-            "alcohol_weekly", "coffee_intake", "smokes", "sunlight_exposure",
-            "iron_advised", "medical_treatment", "previous_concern_followup",
-            "new_product_request", "medical_conditions",
-        }
-        
-        if field in yes_no_fields:
-            return [
-                QuestionOption(value="yes", label="Yes"),
-                QuestionOption(value="no", label="No"),
-            ], "yes_no"
-        
-        # Option-based questions
-        if field == "for_whom":
-            return [
-                QuestionOption(value="me", label="Me"),
-                QuestionOption(value="family", label="Family"),
-            ], "options"
-        
-        if field == "gender":
-            return [
-                QuestionOption(value="male", label="Male"),
-                QuestionOption(value="woman", label="Woman"),
-                QuestionOption(value="gender neutral", label="Gender Neutral"),
-            ], "options"
-        
-        if field == "knowledge":
-            return [
-                QuestionOption(value="well informed", label="Well informed"),
-                QuestionOption(value="curious", label="Curious"),
-                QuestionOption(value="skeptical", label="Skeptical"),
-            ], "options"
-        
-        if field == "vitamin_count":
-            return [
-                QuestionOption(value="no", label="No"),
-                QuestionOption(value="1 to 3", label="1 to 3"),
-                QuestionOption(value="4+", label="4+"),
-            ], "options"
-        
-        if field == "situation":
-            return [
-                QuestionOption(value="to get pregnant in the next 2 years", label="To get pregnant in the next 2 years"),
-                QuestionOption(value="i am pregnant now", label="I am pregnant now"),
-                QuestionOption(value="breastfeeding", label="Breastfeeding"),
-            ], "options"
-        
-        if field == "concern":
-            return [
-                QuestionOption(value="sleep", label="Sleep"),
-                QuestionOption(value="stress", label="Stress"),
-                QuestionOption(value="energy", label="Energy"),
-                QuestionOption(value="stomach_intestines", label="Stomach & Intestines"),
-                QuestionOption(value="skin", label="Skin"),
-                QuestionOption(value="resistance", label="Resistance"),
-                QuestionOption(value="weight", label="Weight"),
-                QuestionOption(value="hormones", label="Hormones"),
-                QuestionOption(value="libido", label="Libido"),
-                QuestionOption(value="brain", label="Brain"),
-                QuestionOption(value="hair_nails", label="Hair & Nails"),
-                QuestionOption(value="fitness", label="Fitness"),
-            ], "options"
-        
-        if field == "lifestyle_status":
-            return [
-                QuestionOption(value="been doing well for a long time", label="Been doing well for a long time"),
-                QuestionOption(value="nice on the way", label="Nice on the way"),
-                QuestionOption(value="ready to start", label="Ready to start"),
-            ], "options"
-        
-        if field in {"fruit_intake", "vegetable_intake", "dairy_intake", "fiber_intake", "protein_intake"}:
-            return [
-                QuestionOption(value="hardly", label="Hardly"),
-                QuestionOption(value="one time", label="One time"),
-                QuestionOption(value="twice or more", label="Twice or more"),
-            ], "options"
-        
-        if field == "eating_habits":
-            return [
-                QuestionOption(value="no preference", label="No preference"),
-                QuestionOption(value="flexitarian", label="Flexitarian"),
-                QuestionOption(value="vegetarian", label="Vegetarian"),
-                QuestionOption(value="vegan", label="Vegan"),
-            ], "options"
-        
-        if field in {"meat_intake", "fish_intake"}:
-            return [
-                QuestionOption(value="never", label="Never"),
-                QuestionOption(value="once or twice", label="Once or twice"),
-                QuestionOption(value="three times or more", label="Three times or more"),
-            ], "options"
-        
-        if field == "allergies":
-            return [
-                QuestionOption(value="no", label="No"),
-                QuestionOption(value="milk", label="Milk"),
-                QuestionOption(value="egg", label="Egg"),
-                QuestionOption(value="fish", label="Fish"),
-                QuestionOption(value="shellfish and crustaceans", label="Shellfish and crustaceans"),
-                QuestionOption(value="peanut", label="Peanut"),
-                QuestionOption(value="nuts", label="Nuts"),
-                QuestionOption(value="soy", label="Soy"),
-                QuestionOption(value="gluten", label="Gluten"),
-                QuestionOption(value="wheat", label="Wheat"),
-                QuestionOption(value="pollen", label="Pollen"),
-                QuestionOption(value="others", label="Others"),
-            ], "options"
-        
-        if field == "dietary_preferences":
-            return [
-                QuestionOption(value="no preference", label="No preference"),
-                QuestionOption(value="lactose-free", label="Lactose-free"),
-                QuestionOption(value="gluten free", label="Gluten free"),
-                QuestionOption(value="paleo", label="Paleo"),
-            ], "options"
-        
-        if field == "ayurveda_view":
-            return [
-                QuestionOption(value="i am convinced", label="I am convinced"),
-                QuestionOption(value="we can learn a lot from ancient medicine", label="We can learn a lot from ancient medicine"),
-                QuestionOption(value="i am open to it", label="I am open to it"),
-                QuestionOption(value="more information needed for an opinion", label="More information needed for an opinion"),
-                QuestionOption(value="i am skeptical", label="I am skeptical"),
-                QuestionOption(value="alternative medicine is nonsense", label="Alternative medicine is nonsense"),
-            ], "options"
-        
-        if field == "new_product_attitude":
-            return [
-                QuestionOption(value="to be the first", label="To be the first"),
-                QuestionOption(value="you are at the forefront of new products", label="You are at the forefront of new products"),
-                QuestionOption(value="learn more", label="Learn more"),
-                QuestionOption(value="you are cautiously optimistic", label="You are cautiously optimistic"),
-                QuestionOption(value="waiting for now", label="Waiting for now"),
-                QuestionOption(value="scientific research takes time", label="Scientific research takes time"),
-            ], "options"
-        
-        # Concern follow-up questions with options
-        if field.startswith("concern|"):
-            concern_detail = self._parse_concern_field(field)
-            if concern_detail:
-                concern_key, question_id = concern_detail
-                
-                # Sleep concern questions
-                if concern_key == "sleep":
-                    if question_id == "fall_asleep":
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                    if question_id == "refreshed":
-                        return [
-                            QuestionOption(value="refreshed", label="Refreshed"),
-                            QuestionOption(value="still tired", label="Still tired"),
-                        ], "options"
-                    if question_id == "hours":
-                        return [
-                            QuestionOption(value="7+ hours", label="7+ hours"),
-                            QuestionOption(value="less than 7", label="Less than 7"),
-                            QuestionOption(value="less than 5", label="Less than 5"),
-                        ], "options"
-                
-                # Stress concern questions
-                if concern_key == "stress":
-                    if question_id == "busy_level":
-                        return [
-                            QuestionOption(value="few things", label="Few things"),
-                            QuestionOption(value="normal", label="Normal"),
-                            QuestionOption(value="a lot", label="A lot"),
-                        ], "options"
-                    if question_id == "after_day":
-                        return [
-                            QuestionOption(value="energized", label="Energized"),
-                            QuestionOption(value="completely drained", label="Completely drained"),
-                        ], "options"
-                    if question_id == "signals":
-                        return [
-                            QuestionOption(value="faster breathing", label="Faster breathing"),
-                            QuestionOption(value="tense muscles", label="Tense muscles"),
-                            QuestionOption(value="trouble sleeping", label="Trouble sleeping"),
-                            QuestionOption(value="sensitive stomach", label="Sensitive stomach"),
-                            QuestionOption(value="head pressure", label="Head pressure"),
-                            QuestionOption(value="fast heartbeat", label="Fast heartbeat"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                
-                # Energy concern questions
-                if concern_key == "energy":
-                    if question_id == "day_load":
-                        return [
-                            QuestionOption(value="very full", label="Very full"),
-                            QuestionOption(value="moderate", label="Moderate"),
-                            QuestionOption(value="not very full", label="Not very full"),
-                        ], "options"
-                    if question_id == "end_day":
-                        return [
-                            QuestionOption(value="still there", label="Still there"),
-                            QuestionOption(value="totally gone", label="Totally gone"),
-                        ], "options"
-                    if question_id == "body_signals":
-                        return [
-                            QuestionOption(value="tired", label="Tired"),
-                            QuestionOption(value="sleepy", label="Sleepy"),
-                            QuestionOption(value="low energy", label="Low energy"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                
-                # Stomach & Intestines concern questions
-                if concern_key == "stomach_intestines":
-                    if question_id == "bowel":
-                        return [
-                            QuestionOption(value="less than once", label="Less than once"),
-                            QuestionOption(value="about once", label="About once"),
-                            QuestionOption(value="more than once", label="More than once"),
-                            QuestionOption(value="irregular", label="Irregular"),
-                        ], "options"
-                    if question_id == "improve":
-                        return [
-                            QuestionOption(value="gas & bloating", label="Gas & bloating"),
-                            QuestionOption(value="that 'balloon' feeling", label="That 'balloon' feeling"),
-                            QuestionOption(value="letting go easily", label="Letting go easily"),
-                            QuestionOption(value="overall digestion", label="Overall digestion"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                
-                # Skin concern questions
-                if concern_key == "skin":
-                    if question_id == "most_days":
-                        return [
-                            QuestionOption(value="pulling", label="Pulling"),
-                            QuestionOption(value="shiny", label="Shiny"),
-                            QuestionOption(value="sensitive", label="Sensitive"),
-                            QuestionOption(value="dull", label="Dull"),
-                            QuestionOption(value="pretty good", label="Pretty good"),
-                        ], "options"
-                    if question_id == "notices":
-                        return [
-                            QuestionOption(value="pimples", label="Pimples"),
-                            QuestionOption(value="discoloration", label="Discoloration"),
-                            QuestionOption(value="lines", label="Lines"),
-                            QuestionOption(value="less elasticity", label="Less elasticity"),
-                            QuestionOption(value="aging", label="Aging"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                    if question_id == "dry":
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                
-                # Resistance concern questions
-                if concern_key == "resistance":
-                    if question_id in ["low", "intense_training", "medical_care"]:
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                
-                # Weight concern questions
-                if concern_key == "weight":
-                    if question_id == "challenge":
-                        return [
-                            QuestionOption(value="movement", label="Movement"),
-                            QuestionOption(value="exercise", label="Exercise"),
-                            QuestionOption(value="nutrition", label="Nutrition"),
-                            QuestionOption(value="discipline", label="Discipline"),
-                            QuestionOption(value="knowledge", label="Knowledge"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                    if question_id in ["binge", "sleep_hours"]:
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                
-                # Hormones concern questions
-                if concern_key == "hormones":
-                    if question_id == "cycle":
-                        return [
-                            QuestionOption(value="regular", label="Regular"),
-                            QuestionOption(value="irregular", label="Irregular"),
-                            QuestionOption(value="very irregular", label="Very irregular"),
-                        ], "options"
-                    if question_id == "physical_changes":
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                    if question_id == "emotions":
-                        return [
-                            QuestionOption(value="moody", label="Moody"),
-                            QuestionOption(value="irritable", label="Irritable"),
-                            QuestionOption(value="sad", label="Sad"),
-                            QuestionOption(value="anxious", label="Anxious"),
-                            QuestionOption(value="fine", label="Fine"),
-                        ], "options"
-                
-                # Libido concern questions
-                if concern_key == "libido":
-                    if question_id == "level":
-                        return [
-                            QuestionOption(value="low", label="Low"),
-                            QuestionOption(value="average", label="Average"),
-                            QuestionOption(value="high", label="High"),
-                        ], "options"
-                    if question_id == "sleep_quality":
-                        return [
-                            QuestionOption(value="excellent", label="Excellent"),
-                            QuestionOption(value="good", label="Good"),
-                            QuestionOption(value="fair", label="Fair"),
-                            QuestionOption(value="poor", label="Poor"),
-                        ], "options"
-                    if question_id == "pressure":
-                        return [
-                            QuestionOption(value="a lot", label="A lot"),
-                            QuestionOption(value="some", label="Some"),
-                            QuestionOption(value="little", label="Little"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                
-                # Brain concern questions
-                if concern_key == "brain":
-                    if question_id == "symptoms":
-                        return [
-                            QuestionOption(value="difficulty focusing", label="Difficulty focusing"),
-                            QuestionOption(value="forgetfulness", label="Forgetfulness"),
-                            QuestionOption(value="trouble finding words", label="Trouble finding words"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                    if question_id == "mood":
-                        return [
-                            QuestionOption(value="yes", label="Yes"),
-                            QuestionOption(value="no", label="No"),
-                        ], "yes_no"
-                    if question_id == "improve":
-                        return [
-                            QuestionOption(value="focus", label="Focus"),
-                            QuestionOption(value="memory", label="Memory"),
-                            QuestionOption(value="mental fitness", label="Mental fitness"),
-                            QuestionOption(value="staying sharp", label="Staying sharp"),
-                        ], "options"
-                
-                # Hair & Nails concern questions
-                if concern_key == "hair_nails":
-                    if question_id == "hair":
-                        return [
-                            QuestionOption(value="dry", label="Dry"),
-                            QuestionOption(value="thin", label="Thin"),
-                            QuestionOption(value="split ends", label="Split ends"),
-                            QuestionOption(value="won't grow long", label="Won't grow long"),
-                            QuestionOption(value="could be fuller", label="Could be fuller"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                    if question_id == "nails":
-                        return [
-                            QuestionOption(value="strength", label="Strength"),
-                            QuestionOption(value="length", label="Length"),
-                            QuestionOption(value="condition", label="Condition"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                
-                # Fitness concern questions
-                if concern_key == "fitness":
-                    if question_id == "frequency":
-                        return [
-                            QuestionOption(value="daily", label="Daily"),
-                            QuestionOption(value="3-5 times a week", label="3-5 times a week"),
-                            QuestionOption(value="1-2 times a week", label="1-2 times a week"),
-                            QuestionOption(value="rarely", label="Rarely"),
-                            QuestionOption(value="never", label="Never"),
-                        ], "options"
-                    if question_id == "training":
-                        return [
-                            QuestionOption(value="strength", label="Strength"),
-                            QuestionOption(value="cardio", label="Cardio"),
-                            QuestionOption(value="hiit", label="HIIT"),
-                            QuestionOption(value="flexibility", label="Flexibility"),
-                            QuestionOption(value="none", label="None"),
-                        ], "options"
-                    if question_id == "priority":
-                        return [
-                            QuestionOption(value="performance", label="Performance"),
-                            QuestionOption(value="sweating", label="Sweating"),
-                            QuestionOption(value="muscle", label="Muscle"),
-                            QuestionOption(value="health", label="Health"),
-                        ], "options"
-        
-        # Text input questions (name, email, age, etc.)
-        text_fields = {"name", "family_name", "relation", "age", "email"}
-        if field in text_fields:
-            return None, "text"
-        
-        # Default: no options (free text)
+        entry = _OPTIONS_TABLE.get(field)
+        if entry:
+            return entry
+        # Text input questions (name, email, age, etc.) and anything unknown are free text
         return None, "text"
     
     async def generate_session_name(self, concern: str, session_id: str | None = None, user_id: str | None = None) -> str:
@@ -3629,8 +3615,7 @@ class ChatService:
                 try:
                     await self._update_session_token_usage(session_id, usage_info, user_id)
                 except Exception as e:
-                    import logging
-                    logging.warning(f"Failed to store token usage for session name generation: {e}")
+                    logger.warning("Failed to store token usage for session name generation: %s", e)
             
             # Clean up the response - remove quotes, extra whitespace, etc.
             session_name = reply_text.strip().strip('"').strip("'").strip()
@@ -3644,8 +3629,7 @@ class ChatService:
             return session_name
         except Exception as e:
             # Fallback to simple format if OpenAI fails
-            import logging
-            logging.warning(f"Failed to generate session name with OpenAI: {e}")
+            logger.warning("Failed to generate session name with OpenAI: %s", e)
             concern_label = concern.replace("_", " ").title()
             return f"{concern_label} Support"
     
@@ -3721,14 +3705,12 @@ class ChatService:
         onboarding_state["awaiting_answer"] = True
         onboarding_state["first_question_shown"] = True  # Mark that first question was shown via GET
         
-        # Save the first question to session
-        await self.session_repo.append_messages(
-            session_id=session.id, messages=[first_reply], user_id=user_id
-        )
-        await self.session_repo.update_metadata(
+        # Save the first question and the onboarding state to session in one write
+        await self.session_repo.commit_turn(
             session_id=session.id,
-            metadata={**(session.metadata or {}), "onboarding": onboarding_state},
+            messages=[first_reply],
             user_id=user_id,
+            metadata_patch={"onboarding": onboarding_state},
         )
         
         return ChatResponse(
@@ -3742,7 +3724,11 @@ class ChatService:
     async def _get_current_question_response(self, session_id: str, session: Session, onboarding_state: dict) -> ChatResponse:
         """Helper method to get current question as ChatResponse."""
         has_previous_sessions = (session.metadata or {}).get("has_previous_sessions", False)
-        ordered_steps = self._ordered_steps(onboarding_state["responses"], has_previous_sessions=has_previous_sessions)
+        ordered_steps = self._ordered_steps(
+            onboarding_state["responses"],
+            has_previous_sessions=has_previous_sessions,
+            should_ask_previous_concern_followup=onboarding_state.get("should_ask_previous_concern_followup", False),
+        )
         
         if onboarding_state["step"] < len(ordered_steps):
             current_field = ordered_steps[onboarding_state["step"]]
@@ -3800,7 +3786,11 @@ class ChatService:
         # Check if user has previous sessions (for returning users)
         has_previous_sessions = (session.metadata or {}).get("has_previous_sessions", False)
         
-        ordered_steps = self._ordered_steps(onboarding_state["responses"], has_previous_sessions=has_previous_sessions)
+        ordered_steps = self._ordered_steps(
+            onboarding_state["responses"],
+            has_previous_sessions=has_previous_sessions,
+            should_ask_previous_concern_followup=onboarding_state.get("should_ask_previous_concern_followup", False),
+        )
         
         if onboarding_state["complete"]:
             return QuestionStateResponse(
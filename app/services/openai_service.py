@@ -3,12 +3,12 @@ from __future__ import annotations
 import logging
 from typing import Iterable
 
-from openai import AsyncOpenAI
+from openai import APIConnectionError, APIError, APITimeoutError, AsyncOpenAI, RateLimitError
 
 from app.config.settings import settings
 from app.schemas.chat import ChatMessage
 from app.utils.error_handler import handle_openai_errors, retry_async
-from app.utils.openai_logger import log_openai_usage
+from app.utils.openai_logger import calculate_cost, log_openai_usage
 
 logger = logging.getLogger(__name__)
 
@@ -46,8 +46,6 @@ class OpenAIChatService:
         }
         
         if usage:
-            from app.utils.openai_logger import calculate_cost
-            
             input_tokens = usage.prompt_tokens or 0
             output_tokens = usage.completion_tokens or 0
             total_tokens = usage.total_tokens or 0
@@ -108,12 +106,10 @@ class OpenAIChatService:
                     }
                 )
 
-            messages.extend([{"role": message.role, "content": message.content} for message in history])
+            messages.extend({"role": message.role, "content": message.content} for message in history)
             messages.append({"role": "user", "content": user_message})
 
             # Retry with exponential backoff for transient errors
-            from openai import APIError, APIConnectionError, APITimeoutError, RateLimitError
-            
             primary_model = settings.openai_model
             fallback_model = settings.openai_fallback_model
 
@@ -1,11 +1,22 @@
 """Product service that loads products from MongoDB and matches them based on user context."""
 from __future__ import annotations
 
+import asyncio
+import logging
 import re
+from functools import lru_cache
 from typing import Any
 
 from app.repositories.product_repository import ProductRepository
 from app.schemas.product import Product, ProductPrice
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# In-flight product searches started ahead of time, keyed by the search criteria.
+# Onboarding starts one when the last question is asked so the completion turn can
+# await the result instead of querying MongoDB from scratch.
+_SEARCH_PREFETCH = TTLCache(ttl_seconds=120.0, max_entries=256)
 
 
 class ProductService:
@@ -24,6 +35,11 @@ class ProductService:
         "fitness": ["fitness", "muscle", "performance", "recovery", "exercise", "strength"],
         "hormones": ["hormone", "hormonal", "menstrual", "cycle", "libido"],
     }
+    # Matches wherever any of a concern's keywords occurs in lowercased text
+    CONCERN_KEYWORD_PATTERNS = {
+        concern: re.compile("|".join(map(re.escape, keywords)))
+        for concern, keywords in CONCERN_TO_KEYWORDS.items()
+    }
     
     # Map concerns to health goals for MongoDB search and scoring
     CONCERN_TO_HEALTH_GOALS = {
@@ -61,150 +77,239 @@ class ProductService:
         Returns tuple of (list of Product objects, dict of product documents by title).
         """
         try:
-            # Extract search criteria from context
-            concerns = self._extract_concerns(context)
-            keywords = self._extract_keywords(concerns, message)
-            
-            # Map concerns to health goals for MongoDB search
-            health_goals = self._concerns_to_health_goals(concerns)
-            
-            # Extract message terms for search
-            message_terms = self._extract_terms(message) if message else []
-            
-            # Search MongoDB for products
-            # Use a higher limit to get more products for filtering
-            search_limit = limit or 20
+            mongo_products, scored_products = await self._search_and_score(
+                message, context, limit, include_product_titles
+            )
+            if not mongo_products:
+                return [], {}
+            result_products = self._select_products(
+                mongo_products, scored_products, context, exclude_product_titles, include_product_titles
+            )
+            # Return both products and their raw documents for safety analysis
+            return result_products, self._documents_by_title(scored_products)
+        except Exception as e:
+            # Log error and return empty list if search fails
+            logger.error("Error finding products: %s", e, exc_info=True)
+            return [], {}
+
+    async def find_relevant_products_with_fallback(
+        self, message: str | None = None, context: dict | None = None, limit: int | None = None,
+        exclude_product_titles: list[str] | None = None,
+    ) -> tuple[list[Product], list[Product], dict[str, dict[str, Any]]]:
+        """
+        Run one search and pick products twice from it: once without the excluded
+        titles and once unfiltered, so a caller that falls back to "any product"
+        does not need a second query.
+        Returns tuple of (products without excluded titles, unfiltered products, documents by title).
+        """
+        try:
+            mongo_products, scored_products = await self._search_and_score(message, context, limit, None)
+            if not mongo_products:
+                return [], [], {}
+            primary = self._select_products(mongo_products, scored_products, context, exclude_product_titles, None)
+            unfiltered = (
+                self._select_products(mongo_products, scored_products, context, None, None)
+                if exclude_product_titles
+                else primary
+            )
+            return primary, unfiltered, self._documents_by_title(scored_products)
+        except Exception as e:
+            logger.error("Error finding products: %s", e, exc_info=True)
+            return [], [], {}
+
+    def prefetch_products(self, context: dict | None, limit: int | None = None) -> None:
+        """
+        Start the MongoDB search for a context-only lookup in the background.
+        Only the query is prefetched; scoring and safety checks still run against the
+        context passed to find_relevant_products, so later answers are honoured.
+        """
+        concern_key = tuple(self._extract_concerns(context))
+        health_goals = self._concerns_to_health_goals(concern_key)
+        search_limit = (limit or 20) * 2
+        key = (health_goals, search_limit)
+        if _SEARCH_PREFETCH.get(key) is not None:
+            return
+        task = asyncio.create_task(self._prefetch_search(list(health_goals), search_limit))
+        _SEARCH_PREFETCH.put(key, task)
+
+    async def _prefetch_search(self, health_goals: list[str], search_limit: int) -> list[dict[str, Any]] | None:
+        try:
+            return await self.repository.search(
+                message_terms=[],
+                health_goals=health_goals,
+                limit=search_limit,
+                include_product_titles=None,
+            )
+        except Exception as e:
+            logger.warning("Product prefetch failed: %s", e)
+            return None
+
+    @staticmethod
+    async def _take_prefetched(key: tuple) -> list[dict[str, Any]] | None:
+        task = _SEARCH_PREFETCH.pop(key)
+        if task is None or task.cancelled():
+            return None
+        return await task
+
+    async def _search_and_score(
+        self, message: str | None, context: dict | None, limit: int | None,
+        include_product_titles: list[str] | None,
+    ) -> tuple[list[dict[str, Any]], list[tuple[float, dict[str, Any]]]]:
+        """Query MongoDB and return (raw documents, (score, document) pairs sorted by score)."""
+        # Extract search criteria from context
+        concerns = self._extract_concerns(context)
+        concern_key = tuple(concerns)
+
+        # Extract message terms for search
+        message_terms = self._extract_terms(message) if message else []
+        keywords = set(self._concern_keywords(concern_key))
+        keywords.update(message_terms)
+
+        # Map concerns to health goals for MongoDB search
+        health_goals = list(self._concerns_to_health_goals(concern_key))
+
+        # Search MongoDB for products
+        # Use a higher limit to get more products for filtering
+        search_limit = limit or 20
+        mongo_products = None
+        if not message_terms and include_product_titles is None:
+            mongo_products = await self._take_prefetched((tuple(health_goals), search_limit * 2))
+        if mongo_products is None:
             mongo_products = await self.repository.search(
                 message_terms=message_terms,
                 health_goals=health_goals,
                 limit=search_limit * 2,  # Get more products to filter from
                 include_product_titles=include_product_titles,
             )
-            
-            if not mongo_products:
-                import logging
-                logging.warning(
-                    f"No products found in MongoDB. "
-                    f"Concerns: {concerns}, Health Goals: {health_goals}, "
-                    f"Message Terms: {message_terms}"
-                )
-                return [], {}
-            
-            # Score and filter products - ensure only Active products are processed
-            scored_products = []
-            # Track if MongoDB search used any criteria (health goals or message terms)
-            # If products were found via search criteria, they deserve a base score even if scoring doesn't match
-            search_used_criteria = bool(health_goals or message_terms or include_product_titles)
-            
-            for product in mongo_products:
-                # Double-check that product status is Active (safety check)
-                # Handle both boolean (true) and string ("Active") formats
-                status = product.get("status")
-                if status is not True and status != "Active":
-                    continue
-                # Also check isDeleted flag
-                if product.get("isDeleted") is True:
-                    continue
-                
-                score = self._score_product(product, keywords, concerns, context)
-                
-                # Give products a base score if they were found by MongoDB search but scoring didn't match
-                # This handles cases where MongoDB found products (via health goals or message terms)
-                # but the scoring logic didn't match keywords
-                if score == 0:
-                    # If MongoDB search used criteria (health goals or message terms) and found products,
-                    # give them a base score so they can still be recommended
-                    if search_used_criteria:
-                        score = 0.5  # Base score for products found by MongoDB search criteria
-                    # If no search criteria at all, also give base score
-                    elif not keywords and not concerns:
-                        score = 0.5  # Base score when no search criteria
-                
-                if score > 0:  # Only include products with positive score
-                    scored_products.append((score, product))
 
-            # Sort by score (highest first) and apply safety/suitability filters
-            scored_products.sort(key=lambda x: x[0], reverse=True)
-            
-            # Filter by safety and suitability, and exclude/include specific products
-            # Use minimum confidence threshold - only recommend products with score >= 0.5
-            # This ensures we only recommend relevant products, not force exactly 3
-            MIN_CONFIDENCE_SCORE = 0.5
-            filtered_products = []
-            exclude_titles = set((exclude_product_titles or []))
-            include_titles = set((include_product_titles or [])) if include_product_titles else None
-            selected_titles: set[str] = set()
-            
-            for score, product in scored_products:
-                # Only include products with minimum confidence score
-                if score < MIN_CONFIDENCE_SCORE:
-                    # If we already have at least 1 product, stop (don't force more)
-                    if len(filtered_products) >= 1:
-                        break
+        if not mongo_products:
+            logger.warning(
+                "No products found in MongoDB. Concerns: %s, Health Goals: %s, Message Terms: %s",
+                concerns,
+                health_goals,
+                message_terms,
+            )
+            return [], []
+
+        # Score and filter products - ensure only Active products are processed
+        scored_products = []
+        # Track if MongoDB search used any criteria (health goals or message terms)
+        # If products were found via search criteria, they deserve a base score even if scoring doesn't match
+        search_used_criteria = bool(health_goals or message_terms or include_product_titles)
+
+        for product in mongo_products:
+            # Double-check that product status is Active (safety check)
+            # Handle both boolean (true) and string ("Active") formats
+            status = product.get("status")
+            if status is not True and status != "Active":
+                continue
+            # Also check isDeleted flag
+            if product.get("isDeleted") is True:
+                continue
+
+            score = self._score_product(product, keywords, concerns, context)
+
+            # Give products a base score if they were found by MongoDB search but scoring didn't match
+            # This handles cases where MongoDB found products (via health goals or message terms)
+            # but the scoring logic didn't match keywords
+            if score == 0:
+                # If MongoDB search used criteria (health goals or message terms) and found products,
+                # give them a base score so they can still be recommended
+                if search_used_criteria:
+                    score = 0.5  # Base score for products found by MongoDB search criteria
+                # If no search criteria at all, also give base score
+                elif not keywords and not concerns:
+                    score = 0.5  # Base score when no search criteria
+
+            if score > 0:  # Only include products with positive score
+                scored_products.append((score, product))
+
+        # Sort by score (highest first) and apply safety/suitability filters
+        scored_products.sort(key=lambda x: x[0], reverse=True)
+        return mongo_products, scored_products
+
+    def _select_products(
+        self,
+        mongo_products: list[dict[str, Any]],
+        scored_products: list[tuple[float, dict[str, Any]]],
+        context: dict | None,
+        exclude_product_titles: list[str] | None,
+        include_product_titles: list[str] | None,
+    ) -> list[Product]:
+        """Pick up to 3 safe, suitable products from the scored search results."""
+        # Filter by safety and suitability, and exclude/include specific products
+        # Use minimum confidence threshold - only recommend products with score >= 0.5
+        # This ensures we only recommend relevant products, not force exactly 3
+        MIN_CONFIDENCE_SCORE = 0.5
+        filtered_products = []
+        exclude_titles = set((exclude_product_titles or []))
+        include_titles = set((include_product_titles or [])) if include_product_titles else None
+        selected_titles: set[str] = set()
+
+        for score, product in scored_products:
+            # Only include products with minimum confidence score
+            if score < MIN_CONFIDENCE_SCORE:
+                # If we already have at least 1 product, stop (don't force more)
+                if len(filtered_products) >= 1:
+                    break
+                continue
+
+            product_obj = self._mongo_to_product(product)
+            product_title = product_obj.title
+
+            # If include_product_titles is specified, only include those products
+            if include_titles is not None:
+                if product_title not in include_titles:
                     continue
-                
+
+            # Exclude previous products if specified
+            if product_title in exclude_titles or product_title in selected_titles:
+                continue
+
+            if self._is_safe_and_suitable(product, context):
+                filtered_products.append(product_obj)
+                selected_titles.add(product_title)
+                # Stop at 3 products max, but don't force exactly 3
+                if len(filtered_products) >= 3:
+                    break
+
+        # Ensure we return at least 3 products when possible by relaxing confidence threshold.
+        # Products are still constrained to search results + safety/suitability checks.
+        if len(filtered_products) < 3:
+            for _score, product in scored_products:
                 product_obj = self._mongo_to_product(product)
                 product_title = product_obj.title
-                
-                # If include_product_titles is specified, only include those products
-                if include_titles is not None:
-                    if product_title not in include_titles:
-                        continue
-                
-                # Exclude previous products if specified
+
+                if include_titles is not None and product_title not in include_titles:
+                    continue
                 if product_title in exclude_titles or product_title in selected_titles:
                     continue
-                
-                if self._is_safe_and_suitable(product, context):
-                    filtered_products.append(product_obj)
-                    selected_titles.add(product_title)
-                    # Stop at 3 products max, but don't force exactly 3
-                    if len(filtered_products) >= 3:
-                        break
-
-            # Ensure we return at least 3 products when possible by relaxing confidence threshold.
-            # Products are still constrained to search results + safety/suitability checks.
-            if len(filtered_products) < 3:
-                for _score, product in scored_products:
-                    product_obj = self._mongo_to_product(product)
-                    product_title = product_obj.title
-
-                    if include_titles is not None and product_title not in include_titles:
-                        continue
-                    if product_title in exclude_titles or product_title in selected_titles:
-                        continue
-                    if not self._is_safe_and_suitable(product, context):
-                        continue
-
-                    filtered_products.append(product_obj)
-                    selected_titles.add(product_title)
-                    if len(filtered_products) >= 3:
-                        break
-
-            if not filtered_products:
-                import logging
-                logging.warning(
-                    f"No products passed filtering. "
-                    f"Found {len(mongo_products)} products from DB, "
-                    f"{len(scored_products)} had positive scores, "
-                    f"but {len(filtered_products)} passed safety/suitability checks."
-                )
-            
-            # Return both products and their raw documents for safety analysis
-            result_products = filtered_products[:3]
-            result_docs = {}
-            # Create a mapping of product titles to documents
-            for score, doc in scored_products:
-                product_obj = self._mongo_to_product(doc)
-                result_docs[product_obj.title] = doc
-            
-            return result_products, result_docs
-        except Exception as e:
-            # Log error and return empty list if search fails
-            import logging
-            import traceback
-            logging.error(f"Error finding products: {e}\n{traceback.format_exc()}")
-            return [], {}
+                if not self._is_safe_and_suitable(product, context):
+                    continue
+
+                filtered_products.append(product_obj)
+                selected_titles.add(product_title)
+                if len(filtered_products) >= 3:
+                    break
+
+        if not filtered_products:
+            logger.warning(
+                "No products passed filtering. Found %d products from DB, %d had positive scores, "
+                "but %d passed safety/suitability checks.",
+                len(mongo_products),
+                len(scored_products),
+                len(filtered_products),
+            )
+
+        return filtered_products[:3]
+
+    def _documents_by_title(self, scored_products: list[tuple[float, dict[str, Any]]]) -> dict[str, dict[str, Any]]:
+        """Map product titles to their raw documents."""
+        result_docs = {}
+        for score, doc in scored_products:
+            product_obj = self._mongo_to_product(doc)
+            result_docs[product_obj.title] = doc
+        return result_docs
 
     def _extract_concerns(self, context: dict | None) -> list[str]:
         """Extract concerns from context."""
@@ -221,21 +326,14 @@ class ProductService:
             return [str(c).lower().replace(" ", "_").replace("&", "_") for c in concerns]
         return []
 
-    def _extract_keywords(self, concerns: list[str], message: str | None) -> set[str]:
-        """Extract keywords from concerns and message."""
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _concern_keywords(concerns: tuple[str, ...]) -> frozenset[str]:
+        """Keywords for a set of concerns. Cached, since the same profile is searched repeatedly."""
         keywords = set()
-        
-        # Add keywords from concerns
         for concern in concerns:
-            concern_keywords = self.CONCERN_TO_KEYWORDS.get(concern, [])
-            keywords.update(concern_keywords)
-        
-        # Add keywords from message
-        if message:
-            message_terms = self._extract_terms(message)
-            keywords.update(message_terms)
-        
-        return keywords
+            keywords.update(ProductService.CONCERN_TO_KEYWORDS.get(concern, []))
+        return frozenset(keywords)
 
     @staticmethod
     def _extract_terms(message: str) -> list[str]:
@@ -290,18 +388,20 @@ class ProductService:
 
         return normalized
 
-    def _concerns_to_health_goals(self, concerns: list[str]) -> list[str]:
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _concerns_to_health_goals(concerns: tuple[str, ...]) -> tuple[str, ...]:
         """Map user concerns to health goals for MongoDB search."""
         health_goals = []
         for concern in concerns:
-            goal = self.CONCERN_TO_HEALTH_GOALS.get(concern)
+            goal = ProductService.CONCERN_TO_HEALTH_GOALS.get(concern)
             if goal:
                 if isinstance(goal, list):
                     health_goals.extend(goal)
                 else:
                     health_goals.append(goal)
         
-        return health_goals
+        return tuple(health_goals)
 
     def _score_product(
         self, product: dict[str, Any], keywords: set[str], concerns: list[str], context: dict | None
@@ -340,11 +440,10 @@ class ProductService:
                         score += 2.0  # Direct match gets higher score
             
             # Also check keyword matching (original logic)
-            concern_keywords = self.CONCERN_TO_KEYWORDS.get(concern, [])
-            for keyword in concern_keywords:
-                if keyword in health_goals_text or keyword in product_text:
-                    score += 1.5
-                    break  # Only count once per concern
+            # Only counts once per concern
+            keyword_re = self.CONCERN_KEYWORD_PATTERNS.get(concern)
+            if keyword_re is not None and (keyword_re.search(health_goals_text) or keyword_re.search(product_text)):
+                score += 1.5
         
         # Check if product is specifically mentioned for user's situation
         if context:
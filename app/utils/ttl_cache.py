@@ -0,0 +1,49 @@
+"""
+Small in-process cache with per-entry expiry and least-recently-used eviction.
+"""
+import time
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    Dict-backed cache whose insertion order doubles as LRU order.
+
+    Entries older than ttl_seconds are treated as missing; once max_entries is
+    reached the least recently used entry is dropped to make room.
+    """
+
+    __slots__ = ("_entries", "_ttl_seconds", "_max_entries")
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the live value for key and mark it as recently used."""
+        entry = self._entries.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] >= self._ttl_seconds:
+            return default
+        self._entries[key] = entry
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full."""
+        self._entries.pop(key, None)
+        if len(self._entries) >= self._max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.monotonic(), value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key and return its value if it had not expired."""
+        entry = self._entries.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] >= self._ttl_seconds:
+            return default
+        return entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,5 @@
+import os
+
+# Settings requires these at import time; tests never reach MongoDB or OpenAI
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("motor")
+
+from app.schemas.chat import ChatMessage  # noqa: E402
+from app.services import chat_service  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_reply_cache():
+    chat_service._REPLY_CACHE.clear()
+    yield
+    chat_service._REPLY_CACHE.clear()
+
+
+def _history(question: str, answer: str) -> list[ChatMessage]:
+    return [ChatMessage(role="user", content=question), ChatMessage(role="assistant", content=answer)]
+
+
+def test_same_message_after_different_history_misses_cache():
+    sleep_history = _history("What helps me sleep?", "Magnesium can help you relax in the evening.")
+    energy_history = _history("What helps with energy?", "Vitamin B12 supports energy metabolism.")
+    key = chat_service._reply_cache_key("user-1", "Tell me more", {}, sleep_history)
+    chat_service._REPLY_CACHE.put(key, "Magnesium calms the nervous system.")
+
+    assert chat_service._REPLY_CACHE.get(
+        chat_service._reply_cache_key("user-1", "Tell me more", {}, energy_history)
+    ) is None
+    assert chat_service._REPLY_CACHE.get(
+        chat_service._reply_cache_key("user-1", "Tell me more", {}, [])
+    ) is None
+
+
+def test_same_message_after_same_history_hits_cache():
+    history = _history("What helps me sleep?", "Magnesium can help you relax in the evening.")
+    key = chat_service._reply_cache_key("user-1", "Tell me more", {}, history)
+    chat_service._REPLY_CACHE.put(key, "Magnesium calms the nervous system.")
+
+    assert chat_service._REPLY_CACHE.get(
+        chat_service._reply_cache_key("user-1", "tell me more!", {}, list(history))
+    ) == "Magnesium calms the nervous system."
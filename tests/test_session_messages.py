@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("motor")
+
+from pydantic import ValidationError  # noqa: E402
+
+from app.repositories.session_repository import SessionRepository  # noqa: E402
+
+_NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_stored_message_keeps_its_fields():
+    message = SessionRepository._message_from_document(
+        {"role": "assistant", "content": "Hello", "created_at": _NOW}, None
+    )
+    assert (message.role, message.content, message.created_at) == ("assistant", "Hello", _NOW)
+
+
+def test_missing_created_at_is_backfilled_from_session():
+    message = SessionRepository._message_from_document({"role": "user", "content": "Hi"}, _NOW)
+    assert message.created_at == _NOW
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        {"role": "bot", "content": "Hi", "created_at": _NOW},
+        {"role": "user", "content": "Hi", "created_at": "not a date"},
+        {"role": "user", "content": "Hi"},
+    ],
+)
+def test_malformed_message_is_rejected(msg):
+    with pytest.raises(ValidationError):
+        SessionRepository._message_from_document(msg, None)
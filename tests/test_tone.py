@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("motor")
+
+from app.services.chat_service import ChatService  # noqa: E402
+
+
+def tone(answer: str, field: str | None = None) -> str:
+    # _tone_from_answer only reads module-level tables, so no repositories are needed
+    return ChatService._tone_from_answer(object.__new__(ChatService), answer, field)
+
+
+@pytest.mark.parametrize("answer", ["not good", "Not good at all", "I don't feel great", "isn't good"])
+def test_negated_positive_is_supportive(answer):
+    assert tone(answer, "age") == "supportive"
+
+
+def test_not_well_is_supportive():
+    assert tone("I'm not well", "age") == "supportive"
+
+
+@pytest.mark.parametrize("answer", ["know", "I know"])
+def test_no_inside_a_word_is_not_a_negative(answer):
+    assert tone(answer, "age") == "neutral"
+
+
+def test_plain_positive_still_celebrates():
+    assert tone("pretty good", "age") == "celebrate"